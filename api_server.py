@@ -1,6 +1,6 @@
 from fastapi import FastAPI, HTTPException, Body, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any, Union
 import os
@@ -68,6 +68,21 @@ except ImportError as e:
     PolicyPulseAdvisor = PlaceholderMFIAgent
     OpsGenieAgent = PlaceholderMFIAgent
 
+# Shared loan database (applications, approved loans, EMI tracking)
+try:
+    from shared_data.loan_database import loan_db
+except ImportError as e:
+    logger.error(f"Failed to import loan database: {e}")
+    loan_db = None
+
+# Shared LLM gateway: every agent's client goes through one pooled connection set
+try:
+    from shared_data.llm_gateway import llm_cache_metrics, llm_scheduler_metrics, llm_usage_metrics
+    from shared_data.prompt_builder import prompt_metrics
+except ImportError as e:
+    logger.error(f"Failed to import LLM gateway: {e}")
+    llm_cache_metrics = llm_scheduler_metrics = llm_usage_metrics = prompt_metrics = None
+
 app = FastAPI(
     title="DhanVyapar AI - Microfinance Platform API",
     description="Comprehensive API for rural microfinance operations with AI agents",
@@ -319,6 +334,17 @@ class LenderRequest(BaseModel):
     region: str = Field(..., description="Region for lender search")
     classification_filter: Optional[str] = Field("", description="Lender classification filter")
     language: Optional[str] = Field("English", description="Preferred language")
+    include_map_html: Optional[bool] = Field(False, description="Also return the rendered HTML map (GeoJSON is always returned)")
+
+class BatchCreditRequest(BaseModel):
+    user_ids: List[str] = Field(..., description="User IDs (e.g. a village or SHG)")
+    scoring_method: Optional[str] = Field("ai_backed", description="ai_backed (several users per LLM call) or rule_based")
+
+class BatchLenderRequest(BaseModel):
+    user_ids: List[str] = Field(..., description="User IDs (e.g. a village or SHG)")
+    loan_type: Optional[str] = Field("personal", description="Type of loan")
+    loan_amount: Optional[float] = Field(0, description="Loan amount")
+    top_k: Optional[int] = Field(10, description="Lenders returned per user")
 
 class ChatRequest(BaseModel):
     user_id: str = Field(..., description="User ID")
@@ -347,6 +373,13 @@ class MFIAnalysisRequest(BaseModel):
     analysis_type: str = Field(..., description="Type of analysis")
     parameters: Optional[Dict[str, Any]] = Field({}, description="Analysis parameters")
 
+class EMIPaymentItem(BaseModel):
+    loan_id: str = Field(..., description="Loan ID")
+    payment_date: Optional[str] = Field(None, description="ISO payment date (defaults to now)")
+
+class BulkEMIPaymentRequest(BaseModel):
+    payments: List[EMIPaymentItem] = Field(..., description="EMI payments collected in the batch")
+
 # --- API Endpoints ---
 
 @app.get("/")
@@ -359,11 +392,23 @@ def root():
         "available_endpoints": [
             "/users/* - User management endpoints",
             "/mfi/* - MFI management endpoints",
+            "/loans/* - Loan servicing endpoints",
             "/agents/* - Agent interaction endpoints",
             "/docs - API documentation"
         ]
     }
 
+@app.get("/llm/metrics")
+def llm_metrics():
+    """Per-agent LLM usage through the shared gateway (requests, retries, errors, tokens, latency,
+    requests coalesced into an identical in-flight call), response cache hits and misses per
+    agent and prompt type, scheduler queue depth, drops and waits per priority class, and built
+    prompt sizes against each agent's token budget"""
+    if not llm_usage_metrics:
+        raise HTTPException(status_code=503, detail="LLM gateway not available")
+    return {"agents": llm_usage_metrics(), "cache": llm_cache_metrics(), "scheduler": llm_scheduler_metrics(),
+            "prompts": prompt_metrics()}
+
 @app.get("/health")
 def health_check():
     """Health check endpoint"""
@@ -560,7 +605,7 @@ def conversational_onboarding(req: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Onboarding error: {str(e)}")
 
 @app.post("/agents/credit_score")
-def get_credit_score(req: UserSelectRequest):
+async def get_credit_score(req: UserSelectRequest):
     """Get user's credit score"""
     user_id = req.user_id
     if user_id not in user_database:
@@ -571,7 +616,7 @@ def get_credit_score(req: UserSelectRequest):
     
     try:
         user_data = user_database[user_id]
-        credit_result = agents['credit'].calculate_credit_score(user_data)
+        credit_result = await agents['credit'].acalculate_credit_score(user_data)
         
         return {
             "user_id": user_id,
@@ -585,8 +630,39 @@ def get_credit_score(req: UserSelectRequest):
         logger.error(f"Error in credit scoring: {e}")
         raise HTTPException(status_code=500, detail=f"Credit scoring error: {str(e)}")
 
+@app.post("/agents/credit_score/batch")
+async def get_credit_scores_batch(req: BatchCreditRequest):
+    """Credit scores for many users at once (the batched LLM calls are awaited concurrently)"""
+    missing = [user_id for user_id in req.user_ids if user_id not in user_database]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Users not found: {', '.join(missing)}")
+    
+    if not agents['credit']:
+        raise HTTPException(status_code=503, detail="Credit scoring agent not available")
+    
+    try:
+        results = await agents['credit'].acalculate_credit_scores_batch(
+            [user_database[user_id] for user_id in req.user_ids], scoring_method=req.scoring_method
+        )
+        
+        return {
+            "credit_scores": {
+                user_id: {
+                    "credit_score": result.get('credit_score'),
+                    "risk_level": result.get('risk_level'),
+                    "recommendation": result.get('recommendation'),
+                    "key_factors": result.get('key_risk_factors', [])
+                }
+                for user_id, result in zip(req.user_ids, results)
+            },
+            "scoring_method": req.scoring_method
+        }
+    except Exception as e:
+        logger.error(f"Error in batch credit scoring: {e}")
+        raise HTTPException(status_code=500, detail=f"Batch credit scoring error: {str(e)}")
+
 @app.post("/agents/loan_recommendation")
-def get_loan_recommendation(req: LoanRequest):
+async def get_loan_recommendation(req: LoanRequest):
     """Get loan recommendation for user"""
     user_id = req.user_id
     if user_id not in user_database:
@@ -604,7 +680,7 @@ def get_loan_recommendation(req: LoanRequest):
             "tenure_months": req.tenure_months
         }
         
-        recommendation = agents['loan_advisor'].provide_detailed_loan_recommendation(
+        recommendation = await agents['loan_advisor'].aprovide_detailed_loan_recommendation(
             user_data, 
             loan_request
         )
@@ -618,6 +694,8 @@ def get_loan_recommendation(req: LoanRequest):
         logger.error(f"Error in loan recommendation: {e}")
         raise HTTPException(status_code=500, detail=f"Loan recommendation error: {str(e)}")
 
+# The lender endpoints make no LLM call: geocoding and NumPy ranking are blocking
+# CPU work, so they stay sync endpoints and run in the threadpool
 @app.post("/agents/lender_recommendation")
 def get_lender_recommendation(req: LenderRequest):
     """Get lender recommendations for user"""
@@ -636,7 +714,9 @@ def get_lender_recommendation(req: LenderRequest):
             "language": req.language
         }
         
-        recommendations = agents['lender'].recommend_lenders(user_data, loan_request)
+        recommendations = agents['lender'].recommend_lenders(
+            user_data, loan_request, include_map_html=bool(req.include_map_html)
+        )
         
         return {
             "user_id": user_id,
@@ -647,8 +727,61 @@ def get_lender_recommendation(req: LenderRequest):
         logger.error(f"Error in lender recommendation: {e}")
         raise HTTPException(status_code=500, detail=f"Lender recommendation error: {str(e)}")
 
+@app.post("/agents/lender_recommendation/batch")
+def get_lender_recommendations_batch(req: BatchLenderRequest):
+    """Top lender matches for many users at once"""
+    missing = [user_id for user_id in req.user_ids if user_id not in user_database]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Users not found: {', '.join(missing)}")
+    
+    if not agents['lender']:
+        raise HTTPException(status_code=503, detail="Lender recommendation agent not available")
+    
+    try:
+        loan_request = {"type": req.loan_type, "amount": req.loan_amount}
+        results = agents['lender'].recommend_lenders_batch(
+            [user_database[user_id] for user_id in req.user_ids], loan_request, top_k=req.top_k
+        )
+        
+        return {
+            "lender_recommendations": dict(zip(req.user_ids, results)),
+            "search_parameters": {**loan_request, "top_k": req.top_k}
+        }
+    except Exception as e:
+        logger.error(f"Error in batch lender recommendation: {e}")
+        raise HTTPException(status_code=500, detail=f"Batch lender recommendation error: {str(e)}")
+
+@app.post("/agents/lender_recommendation/map", response_class=HTMLResponse)
+def get_lender_recommendation_map(req: LenderRequest):
+    """Rendered HTML map of the lender recommendations for user (cached per area and result)"""
+    user_id = req.user_id
+    if user_id not in user_database:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if not agents['lender']:
+        raise HTTPException(status_code=503, detail="Lender recommendation agent not available")
+    
+    try:
+        user_data = user_database[user_id]
+        loan_request = {
+            "region": req.region,
+            "classification_filter": req.classification_filter,
+            "language": req.language
+        }
+        
+        recommendations = agents['lender'].recommend_lenders(user_data, loan_request)
+        map_html = agents['lender'].render_map(recommendations)
+        if not map_html:
+            raise HTTPException(status_code=404, detail=recommendations.get('error', "No map available"))
+        return HTMLResponse(content=map_html)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error rendering lender map: {e}")
+        raise HTTPException(status_code=500, detail=f"Lender map error: {str(e)}")
+
 @app.post("/agents/educational_content")
-def get_educational_content(req: EducationRequest):
+async def get_educational_content(req: EducationRequest):
     """Get educational content for user"""
     user_id = req.user_id
     if user_id not in user_database:
@@ -659,7 +792,9 @@ def get_educational_content(req: EducationRequest):
     
     try:
         user_data = user_database[user_id]
-        content = agents['education'].get_educational_content(user_data, req.topic)
+        content = await agents['education'].acreate_financial_education_content(
+            req.topic, user_data, user_data.get('preferred_language', 'english')
+        )
         
         return {
             "user_id": user_id,
@@ -671,41 +806,70 @@ def get_educational_content(req: EducationRequest):
         raise HTTPException(status_code=500, detail=f"Educational content error: {str(e)}")
 
 @app.post("/agents/chat")
-def chat_with_assistant(req: ChatRequest):
-    """Chat with voice assistant"""
+async def chat_with_assistant(req: ChatRequest):
+    """Chat with voice assistant (translate -> answer -> translate, awaited without holding a worker thread)"""
     user_id = req.user_id
     if user_id not in user_database:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if not agents['voice'] or not agents['translation']:
-        raise HTTPException(status_code=503, detail="Voice or translation agent not available")
+    if not agents['voice']:
+        raise HTTPException(status_code=503, detail="Voice assistant agent not available")
     
     try:
         user_data = user_database[user_id]
         message = req.message
         language = req.language
 
-        # Handle multilingual chat
-        if language.lower() == "hindi":
-            message_in_english = agents['translation'].translate_to_english(message)
-            response_in_english = agents['voice'].chat(message_in_english)
-            response_in_hindi = agents['translation'].translate_to_hindi(response_in_english)
-            final_response = response_in_hindi
-        else:
-            response_in_english = agents['voice'].chat(message)
-            response_in_hindi = agents['translation'].translate_to_hindi(response_in_english)
-            final_response = response_in_hindi
+        # Multilingual chat: the message is translated to English, answered and
+        # translated back to the requested language
+        result = await agents['voice'].aprocess_voice_query(
+            message, {**user_data, "preferred_language": language.lower()}
+        )
 
         return {
             "user_id": user_id,
             "message": message,
             "language": language,
-            "response": final_response
+            "response": result.get("response_text", "")
         }
     except Exception as e:
         logger.error(f"Error in chat: {e}")
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
+@app.post("/agents/chat/stream")
+async def stream_chat_with_assistant(req: ChatRequest):
+    """Chat with voice assistant as server-sent events: `delta` events carry pieces of the
+    response as they are generated (translated per sentence), then one `done` event, or an
+    `error` event if the answer failed part-way"""
+    user_id = req.user_id
+    if user_id not in user_database:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if not agents['voice']:
+        raise HTTPException(status_code=503, detail="Voice assistant agent not available")
+    
+    user_data = user_database[user_id]
+    language = req.language
+    
+    async def events():
+        pieces = []
+        try:
+            async for piece in agents['voice'].astream_voice_query(
+                req.message, {**user_data, "preferred_language": language.lower()}
+            ):
+                pieces.append(piece)
+                yield f"event: delta\ndata: {json.dumps({'text': piece}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"Error in streaming chat: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': f'Chat error: {str(e)}'})}\n\n"
+            return
+        done = {"user_id": user_id, "message": req.message, "language": language, "response": "".join(pieces)}
+        yield f"event: done\ndata: {json.dumps(done, ensure_ascii=False)}\n\n"
+    
+    # No-cache / no proxy buffering, so each event reaches the phone as soon as it is sent
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/agents/document_processing")
 def process_document(req: DocumentProcessRequest):
     """Process user documents"""
@@ -847,6 +1011,31 @@ def analyze_mfi(req: MFIAnalysisRequest):
         logger.error(f"Error in MFI analysis: {e}")
         raise HTTPException(status_code=500, detail=f"MFI analysis error: {str(e)}")
 
+# --- Loan Servicing Endpoints ---
+
+@app.post("/loans/emi/bulk_payment")
+def bulk_emi_payment(req: BulkEMIPaymentRequest):
+    """Post a batch of EMI payments (e.g. a field officer's collections) in one transaction"""
+    if not loan_db:
+        raise HTTPException(status_code=503, detail="Loan database not available")
+    
+    result = loan_db.pay_emis_bulk([item.model_dump() for item in req.payments])
+    if not result.get("success"):
+        raise HTTPException(status_code=500, detail=result.get("message", "Bulk payment failed"))
+    return result
+
+@app.get("/loans/portfolio_aging/{mfi_id}")
+def portfolio_aging(mfi_id: str):
+    """Days-past-due buckets and PAR30/PAR90 for an MFI's active loans"""
+    if not loan_db:
+        raise HTTPException(status_code=503, detail="Loan database not available")
+    
+    return {
+        "mfi_id": mfi_id,
+        "aging": loan_db.get_portfolio_aging(mfi_id),
+        "overdue_loans": loan_db.get_overdue_loans(mfi_id, min_dpd=31)
+    }
+
 # --- Utility Functions ---
 
 def get_user_dashboard(user_id: str) -> str:
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+LoanDatabase Startup Benchmark
+Generates a synthetic portfolio (100k loans by default), then times a cold start
+(no snapshot), a warm start (from the snapshot) and first access to a payment history.
+Each start runs in a fresh interpreter so nothing is shared between measurements.
+
+Usage: python benchmark_startup.py [num_loans] [data_dir]
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add paths
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+START_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+from shared_data.loan_database import LoanDatabase
+db = LoanDatabase({data_dir!r}, 'sqlite')
+ready = time.perf_counter() - start
+loan = db.emi_tracking[{loan_id!r}]
+start = time.perf_counter()
+payments = list(loan['payments'])
+first_access = time.perf_counter() - start
+db.close()
+print(ready, first_access, len(db.emi_tracking), len(payments))
+"""
+
+
+def generate_portfolio(data_dir: str, num_loans: int):
+    """Write legacy JSON files for a synthetic portfolio (migrated into SQLite on first start)"""
+    random.seed(42)
+    applications, approved, emi_tracking = {}, {}, {}
+    mfi_directory = {f"MFI_{i:03d}": {"mfi_id": f"MFI_{i:03d}", "name": f"Benchmark MFI {i}", "status": "active"}
+                     for i in range(50)}
+    base_date = datetime(2025, 1, 1)
+
+    for i in range(num_loans):
+        loan_id = f"APP_{i:07d}"
+        mfi_id = f"MFI_{i % 50:03d}"
+        borrower_id = f"9{i % 40000:09d}"
+        principal = random.choice([20000, 35000, 50000, 75000, 100000])
+        tenure = random.choice([6, 12, 18, 24])
+        rate = random.choice([12.0, 15.0, 18.0, 24.0])
+        r = rate / 12 / 100
+        emi = round(principal * r * (1 + r) ** tenure / ((1 + r) ** tenure - 1), 2)
+        disbursed = base_date + timedelta(days=random.randint(0, 365))
+
+        application = {
+            "application_id": loan_id, "borrower_id": borrower_id, "mfi_id": mfi_id,
+            "loan_amount": principal, "tenure_months": tenure, "status": "approved",
+            "application_date": disbursed.isoformat(), "approval_date": disbursed.isoformat(),
+            "approved_amount": principal, "interest_rate": rate, "emi_amount": emi
+        }
+        applications[loan_id] = application
+        approved[loan_id] = application
+
+        outstanding = float(principal)
+        payments = []
+        for k in range(random.randint(0, min(tenure - 1, 6))):
+            interest = outstanding * r
+            payments.append({
+                "payment_id": f"PAY_{i:07d}_{k}",
+                "payment_date": (disbursed + timedelta(days=30 * (k + 1))).isoformat(),
+                "emi_amount": emi,
+                "principal_component": round(emi - interest, 2),
+                "interest_component": round(interest, 2),
+                "outstanding_before": round(outstanding, 2),
+                "outstanding_after": round(outstanding - (emi - interest), 2)
+            })
+            outstanding -= emi - interest
+
+        emi_tracking[loan_id] = {
+            "loan_id": loan_id, "borrower_id": borrower_id, "mfi_id": mfi_id,
+            "principal_amount": principal, "interest_rate": rate, "tenure_months": tenure,
+            "emi_amount": emi, "disbursement_date": disbursed.isoformat(),
+            "outstanding_balance": round(outstanding, 2), "payments": payments,
+            "next_due_date": (disbursed + timedelta(days=30 * (len(payments) + 1))).isoformat(),
+            "status": "active"
+        }
+
+    files = {
+        "loan_applications.json": {"applications": applications, "approved_loans": approved},
+        "mfi_directory.json": mfi_directory,
+        "emi_tracking.json": emi_tracking,
+    }
+    for filename, data in files.items():
+        with open(os.path.join(data_dir, filename), 'w') as f:
+            json.dump(data, f)
+
+
+def timed_start(data_dir: str, loan_id: str):
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = {k: v for k, v in os.environ.items() if k not in ('LOAN_DB_PATH', 'LOAN_DB_BACKEND')}
+    result = subprocess.run(
+        [sys.executable, "-c", START_SCRIPT.format(root=root, data_dir=data_dir, loan_id=loan_id)],
+        capture_output=True, text=True, env=env
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark start failed:\n{result.stderr}")
+    output = result.stdout.strip().splitlines()[-1]
+    ready, first_access, loans, payments = output.split()
+    return float(ready), float(first_access), int(loans), int(payments)
+
+
+def main():
+    num_loans = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    data_dir = sys.argv[2] if len(sys.argv) > 2 else tempfile.mkdtemp(prefix="loan_benchmark_")
+    os.makedirs(data_dir, exist_ok=True)
+
+    print("⏱️ LOANDATABASE STARTUP BENCHMARK")
+    print("=" * 40)
+    print(f"Data directory: {data_dir}")
+
+    print(f"\n1️⃣ Generating {num_loans:,} loans...")
+    start = time.perf_counter()
+    generate_portfolio(data_dir, num_loans)
+    print(f"✅ Generated in {time.perf_counter() - start:.1f}s")
+
+    print("\n2️⃣ First start (JSON migration + schedule backfill)...")
+    ready, _, loans, _ = timed_start(data_dir, "APP_0000000")
+    print(f"✅ {loans:,} loans ready in {ready:.2f}s")
+
+    # Drop the snapshot written on close to measure a start straight from SQLite
+    snapshot = os.path.join(data_dir, "loan_database.snapshot")
+    if os.path.exists(snapshot):
+        os.remove(snapshot)
+
+    print("\n3️⃣ Cold start from SQLite (no snapshot)...")
+    ready, first_access, loans, payments = timed_start(data_dir, "APP_0000001")
+    print(f"✅ Ready in {ready:.2f}s; first payment history access {first_access * 1000:.2f}ms ({payments} payments)")
+
+    print("\n4️⃣ Warm start from snapshot...")
+    ready, first_access, loans, payments = timed_start(data_dir, "APP_0000002")
+    print(f"✅ Ready in {ready:.2f}s; first payment history access {first_access * 1000:.2f}ms ({payments} payments)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,12 @@ Supports English, Hindi, and Kannada
 
 import os
 import json
-from groq import Groq
 from typing import Dict, Any, Optional, List
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared_data.llm_cache import LRUCache
+from shared_data.llm_gateway import get_llm_client
 from utils.helpers import get_language_prompt, generate_cache_key
 from .credit_scoring_agent import CreditScoringAgent
 from dotenv import load_dotenv
@@ -29,9 +31,9 @@ class CreditMetricsExplainer:
         
         if not self.groq_api_key:
             raise ValueError("GROQ API key is required. Set GROQ_API_KEY environment variable or pass groq_api_key parameter.")
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("CreditMetricsExplainer", self.groq_api_key)
         self.model = "meta-llama/llama-4-maverick-17b-128e-instruct"
-        self.cache = {}
+        self.cache = LRUCache()
         
         # Initialize credit scoring agent to get dynamic model weights
         self.credit_scorer = CreditScoringAgent(groq_api_key)
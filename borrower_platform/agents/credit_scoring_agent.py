@@ -8,10 +8,14 @@ Outputs structured JSON with credit_score, risk_level, recommendation, and key_r
 import os
 import json
 import pickle
-from groq import Groq
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared_data.llm_batching import amap_batched, batch_schema_prompt, map_batched
+from shared_data.llm_cache import LRUCache
+from shared_data.llm_gateway import get_llm_client
+from shared_data.prompt_builder import PromptBuilder, compact_json, count_tokens, prompt_budget
 from utils.helpers import get_language_prompt, generate_cache_key
 from .translation_agent import TranslationAgent
 from dotenv import load_dotenv
@@ -20,14 +24,33 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class CreditScoringAgent:
+    # One result per user in batched AI-backed scoring prompts
+    BATCH_RESULT_SCHEMA = {
+        "id": "user id as given",
+        "credit_score": "score from 300-900",
+        "factor_scores": {
+            "income_stability": "0-100",
+            "repayment_history": "0-100",
+            "social_capital": "0-100",
+            "asset_ownership": "0-100",
+            "financial_behavior": "0-100"
+        },
+        "ai_analysis": {
+            "strengths": ["positive factors"],
+            "concerns": ["risk factors"],
+            "unique_factors": ["special considerations"],
+            "confidence_level": "high/medium/low"
+        }
+    }
+    
     def __init__(self, groq_api_key: str = None):
         self.groq_api_key = groq_api_key or os.getenv('GROQ_API_KEY')
         if not self.groq_api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables or parameters")
             
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("CreditScoringAgent", self.groq_api_key)
         self.model = os.getenv('MODEL_NAME', "meta-llama/llama-4-maverick-17b-128e-instruct")
-        self.cache = {}
+        self.cache = LRUCache()
         self.translator = TranslationAgent(self.groq_api_key)
         
         # Domain-specific scoring weights for rural microfinance (fallback if model loading fails)
@@ -385,7 +408,87 @@ Our microfinance credit scoring system evaluates your loan eligibility based on
         else:
             result = self._rule_based_scoring(user_data)
         
-        # Add risk level and recommendation
+        return self._complete_assessment(result, user_data, cache_key)
+    
+    async def acalculate_credit_score(self, user_data: Dict[str, Any], scoring_method: str = "rule_based") -> Dict[str, Any]:
+        """Async calculate_credit_score (AI-backed scoring does not block the event loop)"""
+        cache_key = generate_cache_key({"data": user_data, "method": scoring_method})
+        if cache_key in self.cache:
+            return self.cache[cache_key]
+        
+        if scoring_method == "ai_backed":
+            result = await self._aai_backed_scoring(user_data)
+        else:
+            result = self._rule_based_scoring(user_data)
+        
+        return self._complete_assessment(result, user_data, cache_key)
+    
+    def calculate_credit_scores_batch(self, users: List[Dict[str, Any]], scoring_method: str = "ai_backed",
+                                      batch_size: int = None) -> List[Dict[str, Any]]:
+        """
+        calculate_credit_score for many users; AI-backed scoring asks about several users per LLM call
+        
+        Users are packed into batches of up to batch_size (LLM_BATCH_SIZE) that fit the
+        CreditScoringAgentBatch prompt budget. Users whose batched result is missing or
+        unreadable are scored with a single call.
+        
+        Returns:
+            List[Dict]: One credit assessment per user, in input order
+        """
+        results, pending = self._scores_from_cache(users, scoring_method)
+        if pending:
+            scored = map_batched(
+                [users[i] for i, _ in pending],
+                ask_batch=self._ask_scores_batch,
+                ask_one=self._ai_backed_scoring,
+                **self._batching_options(batch_size)
+            )
+            for (i, cache_key), result in zip(pending, scored):
+                results[i] = self._complete_assessment(result, users[i], cache_key)
+        
+        return results
+    
+    async def acalculate_credit_scores_batch(self, users: List[Dict[str, Any]], scoring_method: str = "ai_backed",
+                                             batch_size: int = None) -> List[Dict[str, Any]]:
+        """Async calculate_credit_scores_batch: the batched LLM calls are made concurrently"""
+        results, pending = self._scores_from_cache(users, scoring_method)
+        if pending:
+            scored = await amap_batched(
+                [users[i] for i, _ in pending],
+                ask_batch=self._aask_scores_batch,
+                ask_one=self._aai_backed_scoring,
+                **self._batching_options(batch_size)
+            )
+            for (i, cache_key), result in zip(pending, scored):
+                results[i] = self._complete_assessment(result, users[i], cache_key)
+        
+        return results
+    
+    def _scores_from_cache(self, users: List[Dict[str, Any]], scoring_method: str) -> Tuple[List[Optional[Dict[str, Any]]], List[Tuple[int, str]]]:
+        """Cached and rule-based results by position, and the (position, cache key) pairs still to ask the LLM about"""
+        results = [None] * len(users)
+        pending = []
+        for i, user_data in enumerate(users):
+            cache_key = generate_cache_key({"data": user_data, "method": scoring_method})
+            if cache_key in self.cache:
+                results[i] = self.cache[cache_key]
+            elif scoring_method == "ai_backed":
+                pending.append((i, cache_key))
+            else:
+                results[i] = self._complete_assessment(self._rule_based_scoring(user_data), user_data, cache_key)
+        return results, pending
+    
+    def _batching_options(self, batch_size: Optional[int]) -> Dict[str, Any]:
+        """map_batched arguments shared by the sync and async batch scoring"""
+        return {
+            "convert": lambda result, user_data: self._normalize_ai_result(result),
+            "size": batch_size,
+            "max_tokens": prompt_budget("CreditScoringAgentBatch") - count_tokens(self._batch_instructions()),
+            "cost": lambda user_data: count_tokens(self._batch_entry("B000", user_data))
+        }
+    
+    def _complete_assessment(self, result: Dict[str, Any], user_data: Dict[str, Any], cache_key: str) -> Dict[str, Any]:
+        """Add risk level and recommendation to a scoring result and cache it"""
         result["risk_level"] = self._determine_risk_level(result["credit_score"])
         result["recommendation"] = self._generate_recommendation(result)
         result["key_risk_factors"] = self._identify_key_risk_factors(result, user_data)
@@ -459,6 +562,27 @@ Our microfinance credit scoring system evaluates your loan eligibility based on
         AI-backed credit scoring using LLM analysis
         """
         
+        try:
+            response = self.client.chat.completions.create(**self._ai_scoring_request(user_data))
+            return self._ai_scoring_result(response)
+            
+        except Exception as e:
+            print(f"Error in AI-backed scoring: {e}")
+            # Fallback to rule-based scoring
+            return self._rule_based_scoring(user_data)
+    
+    async def _aai_backed_scoring(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Async _ai_backed_scoring"""
+        try:
+            response = await self.client.aio.chat.completions.create(**self._ai_scoring_request(user_data))
+            return self._ai_scoring_result(response)
+            
+        except Exception as e:
+            print(f"Error in AI-backed scoring: {e}")
+            return self._rule_based_scoring(user_data)
+    
+    def _ai_scoring_request(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Chat completion arguments for AI-backed scoring of one user"""
         system_prompt = """You are an expert credit analyst for rural microfinance in India. 
         Analyze the user profile and provide a comprehensive credit assessment."""
         
@@ -489,38 +613,81 @@ Our microfinance credit scoring system evaluates your loan eligibility based on
         Analyze and return ONLY the JSON:
         """
         
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": analysis_prompt}
-                ],
-                max_tokens=1000,
-                temperature=0  # Deterministic output
-            )
-            
-            result_text = response.choices[0].message.content.strip()
-            
-            if result_text.startswith('```json'):
-                result_text = result_text.split('```json')[1].split('```')[0]
-            elif result_text.startswith('```'):
-                result_text = result_text.split('```')[1]
-                
-            ai_result = json.loads(result_text)
-            
-            # Convert AI score to 300-900 range if it's in 0-100 range
-            if "credit_score" in ai_result:
-                score = float(ai_result["credit_score"])
-                if score <= 100:  # If score is in 0-100 range, convert to 300-900
-                    ai_result["credit_score"] = round(300 + (score * 6.0), 0)
-            
-            return ai_result
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": analysis_prompt}
+            ],
+            "max_tokens": 1000,
+            "temperature": 0  # Deterministic output
+        }
+    
+    def _ai_scoring_result(self, response) -> Dict[str, Any]:
+        """AI-backed scoring result from the model's answer (raises if it is not JSON)"""
+        result_text = response.choices[0].message.content.strip()
+        
+        if result_text.startswith('```json'):
+            result_text = result_text.split('```json')[1].split('```')[0]
+        elif result_text.startswith('```'):
+            result_text = result_text.split('```')[1]
             
-        except Exception as e:
-            print(f"Error in AI-backed scoring: {e}")
-            # Fallback to rule-based scoring
-            return self._rule_based_scoring(user_data)
+        ai_result = json.loads(result_text)
+        
+        # Convert AI score to 300-900 range if it's in 0-100 range
+        if "credit_score" in ai_result:
+            score = float(ai_result["credit_score"])
+            if score <= 100:  # If score is in 0-100 range, convert to 300-900
+                ai_result["credit_score"] = round(300 + (score * 6.0), 0)
+        
+        return ai_result
+    
+    def _batch_instructions(self) -> str:
+        return f"""Analyze each rural user profile below for microfinance credit scoring. Each line is one user as JSON.
+Score income stability (occupation, income regularity), repayment history (past loans, payment behavior),
+social capital (group membership, community ties), asset ownership (land, property) and financial
+behavior (savings, banking habits).
+
+{batch_schema_prompt(self.BATCH_RESULT_SCHEMA)}"""
+    
+    def _batch_entry(self, key: str, user_data: Dict[str, Any]) -> str:
+        return compact_json({"id": key, **user_data})
+    
+    def _ask_scores_batch(self, keyed: List[Tuple[str, Dict[str, Any]]]) -> str:
+        response = self.client.chat.completions.create(**self._scores_batch_request(keyed))
+        return response.choices[0].message.content
+    
+    async def _aask_scores_batch(self, keyed: List[Tuple[str, Dict[str, Any]]]) -> str:
+        response = await self.client.aio.chat.completions.create(**self._scores_batch_request(keyed))
+        return response.choices[0].message.content
+    
+    def _scores_batch_request(self, keyed: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """Chat completion arguments for scoring a batch of (id, user) pairs"""
+        builder = PromptBuilder("CreditScoringAgentBatch")
+        builder.add(self._batch_instructions())
+        builder.add("\n".join(self._batch_entry(key, user_data) for key, user_data in keyed), heading="USERS:")
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": "You are an expert credit analyst for rural microfinance in India."},
+                {"role": "user", "content": builder.build()}
+            ],
+            "max_tokens": min(8000, 400 * len(keyed)),
+            "temperature": 0,  # Deterministic output
+            "priority": "batch"
+        }
+    
+    def _normalize_ai_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Batched result object as an AI-backed scoring result (raises if it has no usable score)"""
+        ai_result = {key: value for key, value in result.items() if key != "id"}
+        score = float(ai_result["credit_score"])
+        if score <= 100:  # If score is in 0-100 range, convert to 300-900
+            score = round(300 + (score * 6.0), 0)
+        ai_result["credit_score"] = score
+        ai_result["scoring_method"] = "ai_backed"
+        if not isinstance(ai_result.get("factor_scores"), dict):
+            raise ValueError("no factor scores")
+        return ai_result
     
     def _score_income_stability(self, user_data: Dict[str, Any]) -> int:
         """Score income stability (0-100)"""
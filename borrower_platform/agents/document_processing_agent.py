@@ -8,12 +8,14 @@ Uses rule-based logic to identify document type and flag mismatches with user-re
 import os
 import json
 import base64
-from groq import Groq
 from typing import Dict, Any, Optional, List
 from PIL import Image
 import requests
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared_data.llm_cache import LRUCache
+from shared_data.llm_gateway import get_llm_client
 from utils.helpers import get_language_prompt, generate_cache_key
 from dotenv import load_dotenv
 
@@ -26,9 +28,9 @@ class DocumentProcessingAgent:
         
         if not self.groq_api_key:
             raise ValueError("GROQ API key is required. Set GROQ_API_KEY environment variable or pass groq_api_key parameter.")
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("DocumentProcessingAgent", self.groq_api_key)
         self.model = "meta-llama/llama-4-maverick-17b-128e-instruct"
-        self.cache = {}
+        self.cache = LRUCache()
         
         # Document types we can process
         self.supported_documents = [
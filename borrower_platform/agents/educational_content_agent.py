@@ -7,10 +7,12 @@ Provides personalized advice and increases financial literacy among SHG members
 
 import os
 import json
-from groq import Groq
 from typing import Dict, Any, Optional, List
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared_data.llm_cache import LRUCache
+from shared_data.llm_gateway import get_llm_client
 from utils.helpers import get_language_prompt, generate_cache_key
 from dotenv import load_dotenv
 
@@ -23,9 +25,9 @@ class EducationalContentAgent:
         
         if not self.groq_api_key:
             raise ValueError("GROQ API key is required. Set GROQ_API_KEY environment variable or pass groq_api_key parameter.")
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("EducationalContentAgent", self.groq_api_key)
         self.model = "meta-llama/llama-4-maverick-17b-128e-instruct"
-        self.cache = {}
+        self.cache = LRUCache()
         
         # Educational content categories
         self.content_categories = {
@@ -106,7 +108,8 @@ Keep it conversational and under 200 words:
                     {"role": "system", "content": explanation_prompt}
                 ],
                 max_tokens=800,
-                temperature=0.3
+                temperature=0.3,
+                prompt_type="score_explanation"
             )
             
             explanation = response.choices[0].message.content.strip()
@@ -198,7 +201,8 @@ Create practical improvement advice as JSON with this structure:
                     {"role": "system", "content": advice_prompt}
                 ],
                 max_tokens=1200,
-                temperature=0.2
+                temperature=0.2,
+                prompt_type="improvement_advice"
             )
             
             result_text = response.choices[0].message.content.strip()
@@ -230,6 +234,29 @@ Create practical improvement advice as JSON with this structure:
         if topic not in self.content_categories:
             topic = "credit_score_basics"
         
+        try:
+            response = self.client.chat.completions.create(**self._education_content_request(topic, user_context, language))
+            return response.choices[0].message.content.strip()
+            
+        except Exception as e:
+            print(f"Error creating educational content: {e}")
+            return f"Unable to create content about {topic}. Please try again."
+    
+    async def acreate_financial_education_content(self, topic: str, user_context: Dict[str, Any], language: str = "english") -> str:
+        """Async create_financial_education_content (does not block the event loop while waiting for the LLM)"""
+        if topic not in self.content_categories:
+            topic = "credit_score_basics"
+        
+        try:
+            response = await self.client.aio.chat.completions.create(**self._education_content_request(topic, user_context, language))
+            return response.choices[0].message.content.strip()
+            
+        except Exception as e:
+            print(f"Error creating educational content: {e}")
+            return f"Unable to create content about {topic}. Please try again."
+    
+    def _education_content_request(self, topic: str, user_context: Dict[str, Any], language: str) -> Dict[str, Any]:
+        """Chat completion arguments for educational content on a known topic"""
         system_prompt = self._get_educational_system_prompt(language)
         
         content_prompt = f"""
@@ -250,21 +277,15 @@ Create content that:
 Keep it conversational and under 300 words:
 """
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": content_prompt}
-                ],
-                max_tokens=1000,
-                temperature=0.4
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            print(f"Error creating educational content: {e}")
-            return f"Unable to create content about {topic}. Please try again."
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": content_prompt}
+            ],
+            "max_tokens": 1000,
+            "temperature": 0.4,
+            "prompt_type": "education_content"
+        }
     
     def generate_seasonal_financial_tips(self, user_data: Dict[str, Any], current_season: str, language: str = "english") -> List[str]:
         """
@@ -310,7 +331,8 @@ Provide tips as a simple list, each under 50 words:
                     {"role": "system", "content": tips_prompt}
                 ],
                 max_tokens=600,
-                temperature=0.3
+                temperature=0.3,
+                prompt_type="seasonal_tips"
             )
             
             tips_text = response.choices[0].message.content.strip()
@@ -7,22 +7,33 @@ Loads NBFC/ARC data from Excel file and provides map visualization
 
 import os
 import json
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 import requests
 from typing import Dict, Any, Optional, List, Tuple
-from geopy.distance import geodesic
 from geopy.geocoders import Nominatim
 import folium
-from groq import Groq
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared_data.llm_cache import LRUCache
+from shared_data.llm_gateway import get_llm_client
 from utils.helpers import get_language_prompt, generate_cache_key
+from utils.lender_index import LenderSpatialIndex, haversine_km
+from utils.geocoding import OfflineGeocoder
+from utils.lender_register import LOAN_TYPE_BITS, LOAN_TYPE_KEYWORDS, load_lender_register, loan_type_codes
 from .translation_agent import TranslationAgent
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Rendered map cache: grid cell size for the user position and number of maps kept
+MAP_CELL_DEGREES = 0.01
+MAP_CACHE_SIZE = 256
+
 class LenderRecommendationAgent:
     def __init__(self, groq_api_key: str = None):
         """
@@ -37,13 +48,15 @@ class LenderRecommendationAgent:
         if not self.groq_api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables or parameters")
         
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("LenderRecommendationAgent", self.groq_api_key)
         self.model = os.getenv('MODEL_NAME', "meta-llama/llama-4-maverick-17b-128e-instruct")
-        self.cache = {}
+        self.cache = LRUCache()
         self.translator = TranslationAgent(self.groq_api_key)
         
-        # Initialize geocoder
+        # Initialize geocoder: offline gazetteer + persistent cache, with
+        # Nominatim as an opt-in fallback (GEOCODE_ONLINE=1)
         self.geolocator = Nominatim(user_agent="microfinance_lender_agent")
+        self.geocoder = OfflineGeocoder(self.geolocator)
         
         # Load NBFC/ARC data with sample fallback
         self.lender_data = self._load_lender_data()
@@ -60,150 +73,35 @@ class LenderRecommendationAgent:
         total_with_coords = len(self.lender_data[self.lender_data['latitude'].notna()])
         print(f"Total lenders with coordinates: {total_with_coords}")
         
+        # Spatial index, NumPy scoring columns and row records, built once for all searches
+        self.spatial_index = self._build_spatial_index()
+        self.lender_columns = self._build_lender_columns()
+        self.loan_type_index = self._build_loan_type_index()
+        self.lender_records = self.lender_data.to_dict('records')
+        
         # Loan type mappings
-        self.loan_type_mapping = {
-            "agriculture": ["agricultural", "farm", "crop", "kisan", "rural"],
-            "micro_business": ["micro", "business", "sme", "msme", "enterprise"],
-            "housing": ["housing", "home", "property", "real estate"],
-            "education": ["education", "student", "study"],
-            "vehicle": ["vehicle", "auto", "car", "bike", "transport"],
-            "personal": ["personal", "individual", "consumer"],
-            "gold": ["gold", "jewel", "ornament"],
-            "equipment": ["equipment", "machinery", "tools"]
-        }
+        self.loan_type_mapping = LOAN_TYPE_KEYWORDS
+        
+        # Rendered folium maps, least recently used evicted first
+        self._map_cache = OrderedDict()
+        self._map_cache_lock = threading.Lock()
     
     def _load_lender_data(self) -> pd.DataFrame:
-        """Load NBFC and ARC data from Excel file with improved parsing"""
+        """Load NBFC and ARC data from the preprocessed register artifact (rebuilt from Excel when stale)"""
         try:
             excel_path = "NBFCsandARCs10012023.XLSX"
             if not os.path.exists(excel_path):
                 print(f"Warning: {excel_path} not found. Creating sample data.")
                 return self._create_sample_lender_data()
             
-            # Try to read the Excel file
-            try:
-                # First, try to read and inspect the file structure
-                xl = pd.ExcelFile(excel_path)
-                print(f"Available sheets in Excel file: {xl.sheet_names}")
-                
-                # Read the first sheet (or main sheet)
-                df = pd.read_excel(excel_path, sheet_name=xl.sheet_names[0])
-                print(f"Original columns: {list(df.columns)}")
-                
-            except Exception as e:
-                print(f"Error reading Excel file: {e}")
-                return self._create_sample_lender_data()
-            
-            # Clean and standardize column names
-            df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_').str.replace('/', '_').str.replace('-', '_')
-            print(f"Cleaned columns: {list(df.columns)}")
-            
-            # Map common column name variations to standard names
-            column_mapping = {
-                'entity_name': 'name',
-                'company_name': 'name',
-                'nbfc_name': 'name',
-                'institution_name': 'name',
-                'entity_type': 'type',
-                'company_type': 'type',
-                'classification': 'type',
-                'registered_office_address': 'address',
-                'address': 'address',
-                'registered_office': 'address',
-                'place': 'city',
-                'location': 'city',
-                'head_office': 'city',
-                'registration_date': 'registration_date',
-                'date_of_registration': 'registration_date'
-            }
-            
-            # Apply column mapping
-            for old_name, new_name in column_mapping.items():
-                if old_name in df.columns and new_name not in df.columns:
-                    df[new_name] = df[old_name]
-                    print(f"Mapped column '{old_name}' to '{new_name}'")
-            
-            # Extract city/state from address if not present
-            if 'address' in df.columns and ('city' not in df.columns or df['city'].isna().all()):
-                print("Extracting city information from address...")
-                df['city'] = df['address'].apply(self._extract_city_from_address)
-            
-            # Add state information if missing
-            if 'state' not in df.columns:
-                df['state'] = 'Karnataka'  # Default state
-                print("Added default state: Karnataka")
-            
-            # Add default loan amounts and interest rates if missing
-            if 'min_loan_amount' not in df.columns:
-                df['min_loan_amount'] = 10000
-            if 'max_loan_amount' not in df.columns:
-                df['max_loan_amount'] = 1000000
-            if 'interest_rate_min' not in df.columns:
-                df['interest_rate_min'] = 10.0
-            if 'interest_rate_max' not in df.columns:
-                df['interest_rate_max'] = 18.0
-            
-            # Add specialization based on type
-            if 'specialization' not in df.columns:
-                df['specialization'] = df['type'].apply(self._determine_specialization)
-            
-            # Add coordinates if not present
-            if 'latitude' not in df.columns or 'longitude' not in df.columns:
-                print("Adding coordinates to lender data...")
-                df = self._add_coordinates_to_lenders(df)
-            
-            # Clean up the data
-            df = df.dropna(subset=['name'])  # Remove entries without names
-            df = df[df['name'].str.strip() != '']  # Remove entries with empty names
-            
+            df = load_lender_register(excel_path, self.geocoder)
             print(f"Loaded {len(df)} lenders from Excel file")
-            print(f"Sample data:\n{df[['name', 'city', 'type']].head()}")
-            
             return df
             
         except Exception as e:
             print(f"Error loading lender data: {e}")
             return self._create_sample_lender_data()
     
-    def _extract_city_from_address(self, address: str) -> str:
-        """Extract city name from address string"""
-        if pd.isna(address) or not isinstance(address, str):
-            return 'Unknown'
-        
-        # Common patterns to extract city
-        address = address.strip()
-        
-        # Split by comma and look for city-like patterns
-        parts = [part.strip() for part in address.split(',')]
-        
-        # Look for known cities
-        known_cities = ['bangalore', 'bengaluru', 'mysore', 'tumkur', 'mandya', 'hassan', 
-                       'nellore', 'guntur', 'hyderabad', 'chennai', 'coimbatore']
-        
-        for part in parts:
-            for city in known_cities:
-                if city in part.lower():
-                    return part.title()
-        
-        # If no known city found, return the first part
-        return parts[0].title() if parts else 'Unknown'
-    
-    def _determine_specialization(self, entity_type: str) -> str:
-        """Determine specialization based on entity type"""
-        if pd.isna(entity_type):
-            return 'General'
-        
-        entity_type = str(entity_type).lower()
-        
-        if any(word in entity_type for word in ['bank', 'cooperative', 'rural']):
-            return 'Agriculture,Rural Development,MSME'
-        elif 'nbfc' in entity_type:
-            return 'Personal,Business,Vehicle'
-        elif 'arc' in entity_type:
-            return 'Asset Reconstruction,Recovery'
-        else:
-            return 'General,Personal,Business'
-    
     def _create_sample_lender_data(self) -> pd.DataFrame:
         """Create sample lender data for testing"""
         sample_data = [
@@ -406,38 +304,34 @@ class LenderRecommendationAgent:
         ]
         
         df = pd.DataFrame(sample_data)
+        df['loan_type_codes'] = loan_type_codes(df['specialization'])
         print(f"Created sample lender data with {len(df)} lenders")
         return df
     
-    def _add_coordinates_to_lenders(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Add latitude and longitude coordinates to lender data"""
-        df['latitude'] = None
-        df['longitude'] = None
-        
-        for idx, row in df.iterrows():
-            try:
-                # Try to find location using city and state
-                city = row.get('city', '')
-                state = row.get('state', '')
-                
-                if city and state:
-                    location_query = f"{city}, {state}, India"
-                elif city:
-                    location_query = f"{city}, Karnataka, India"
-                else:
-                    continue
-                
-                location = self.geolocator.geocode(location_query, timeout=10)
-                if location:
-                    df.at[idx, 'latitude'] = location.latitude
-                    df.at[idx, 'longitude'] = location.longitude
-                    print(f"Added coordinates for {row.get('name', 'Unknown')}: {location.latitude}, {location.longitude}")
-                
-            except Exception as e:
-                print(f"Error geocoding {row.get('name', 'Unknown')}: {e}")
-                continue
+    def _build_spatial_index(self) -> LenderSpatialIndex:
+        """Build the grid index over lender_data rows (rows without coordinates are skipped)"""
+        latitudes = pd.to_numeric(self.lender_data['latitude'], errors='coerce').to_numpy(dtype=float)
+        longitudes = pd.to_numeric(self.lender_data['longitude'], errors='coerce').to_numpy(dtype=float)
+        return LenderSpatialIndex(latitudes, longitudes)
+    
+    def _build_lender_columns(self) -> Dict[str, np.ndarray]:
+        """Lender fields used for scoring as NumPy columns aligned with lender_data rows"""
+        def numeric(column: str, default: float) -> np.ndarray:
+            if column not in self.lender_data.columns:
+                return np.full(len(self.lender_data), default, dtype=float)
+            return pd.to_numeric(self.lender_data[column], errors='coerce').to_numpy(dtype=float)
         
-        return df
+        return {
+            'min_loan_amount': numeric('min_loan_amount', 0),
+            'max_loan_amount': numeric('max_loan_amount', float('inf')),
+            'interest_rate_min': numeric('interest_rate_min', 20),
+            'loan_type_codes': self.lender_data['loan_type_codes'].to_numpy(dtype=np.int64)
+        }
+    
+    def _build_loan_type_index(self) -> Dict[str, np.ndarray]:
+        """Inverted index: loan type -> row bitmap of lenders whose specialization mentions it"""
+        codes = self.lender_columns['loan_type_codes']
+        return {loan_type: (codes & bit) != 0 for loan_type, bit in LOAN_TYPE_BITS.items()}
     
     def get_user_coordinates(self, user_location: str) -> Tuple[Optional[float], Optional[float]]:
         """
@@ -452,36 +346,12 @@ class LenderRecommendationAgent:
         try:
             print(f"Geocoding location: {user_location}")
             
-            # First try with the complete address as provided
-            location = self.geolocator.geocode(user_location, timeout=15)
-            if location:
-                print(f"Found coordinates: {location.latitude}, {location.longitude}")
-                return location.latitude, location.longitude
+            # Gazetteer and cache first; the network geocoder only if enabled
+            latitude, longitude = self.geocoder.geocode(user_location)
+            if latitude is not None and longitude is not None:
+                print(f"Found coordinates: {latitude}, {longitude}")
+                return latitude, longitude
             
-            # If that fails, try parsing and reconstructing the address
-            parts = [part.strip() for part in user_location.split(',') if part.strip()]
-            
-            # Try different combinations
-            for i in range(len(parts)):
-                if i == 0:
-                    continue  # Skip first attempt as we already tried full address
-                
-                partial_address = ", ".join(parts[i:])
-                print(f"Trying partial address: {partial_address}")
-                location = self.geolocator.geocode(partial_address, timeout=10)
-                if location:
-                    print(f"Found coordinates with partial address: {location.latitude}, {location.longitude}")
-                    return location.latitude, location.longitude
-            
-            # Last resort: try just the first part (usually city/village) + India
-            if parts:
-                simple_address = f"{parts[0]}, India"
-                print(f"Trying simple address: {simple_address}")
-                location = self.geolocator.geocode(simple_address, timeout=10)
-                if location:
-                    print(f"Found coordinates with simple address: {location.latitude}, {location.longitude}")
-                    return location.latitude, location.longitude
-                
             print(f"Could not geocode any variation of: {user_location}")
             return None, None
             
@@ -490,33 +360,30 @@ class LenderRecommendationAgent:
             return None, None
     
     def calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calculate distance between two coordinates in kilometers"""
+        """Calculate distance between two coordinates in kilometers (same haversine as the search)"""
         try:
-            return geodesic((lat1, lon1), (lat2, lon2)).kilometers
-        except:
+            distance = float(haversine_km(lat1, lon1, np.array([lat2], dtype=float), np.array([lon2], dtype=float))[0])
+        except (TypeError, ValueError):
             return float('inf')
+        return distance if np.isfinite(distance) else float('inf')
     
     def filter_lenders_by_loan_type(self, loan_type: str) -> pd.DataFrame:
         """Filter lenders based on loan type specialization"""
-        if loan_type.lower() not in self.loan_type_mapping:
-            return self.lender_data  # Return all if type not recognized
-        
-        keywords = self.loan_type_mapping[loan_type.lower()]
-        
-        # Filter lenders that specialize in this loan type
-        filtered_lenders = []
-        for idx, row in self.lender_data.iterrows():
-            specialization = str(row.get('specialization', '')).lower()
-            if any(keyword in specialization for keyword in keywords):
-                filtered_lenders.append(row)
-        
-        if filtered_lenders:
-            return pd.DataFrame(filtered_lenders)
-        else:
-            # If no specific lenders found, return all (they might still offer the loan)
-            return self.lender_data
+        mask = self._loan_type_mask(loan_type)
+        if mask is None:
+            return self.lender_data  # Type not recognized or no specialists: all lenders
+        return self.lender_data[mask]
+    
+    def _loan_type_mask(self, loan_type: str) -> Optional[np.ndarray]:
+        """Row bitmap of lenders specializing in a loan type, or None if every lender qualifies"""
+        mask = self.loan_type_index.get(loan_type.lower())
+        if mask is None or not mask.any():
+            # If no specific lenders found, use all (they might still offer the loan)
+            return None
+        return mask
     
-    def recommend_lenders(self, user_data: Dict[str, Any], loan_request: Dict[str, Any], max_distance: float = 50) -> Dict[str, Any]:
+    def recommend_lenders(self, user_data: Dict[str, Any], loan_request: Dict[str, Any], max_distance: float = 50,
+                          include_map_html: bool = False) -> Dict[str, Any]:
         """
         Recommend nearby lenders based on user location and loan requirements
         Dynamically expands search radius to find minimum 10 lenders
@@ -525,6 +392,8 @@ class LenderRecommendationAgent:
             user_data: User profile data
             loan_request: Loan requirements (amount, type, purpose)
             max_distance: Initial maximum distance in kilometers (default 50km)
+            include_map_html: Also render the folium map (otherwise map_html is None;
+                use map_geojson or render_map(result) instead)
             
         Returns:
             Dict containing recommended lenders and analysis
@@ -535,6 +404,7 @@ class LenderRecommendationAgent:
             return {
                 "error": "User location not found in profile",
                 "recommendations": [],
+                "map_geojson": None,
                 "map_html": None
             }
         
@@ -544,92 +414,41 @@ class LenderRecommendationAgent:
             return {
                 "error": f"Could not geocode location: {user_location}",
                 "recommendations": [],
+                "map_geojson": None,
                 "map_html": None
             }
         
-        # Filter lenders by loan type
+        # Loan requirements
         loan_type = loan_request.get('type', 'personal')
         loan_amount = loan_request.get('amount', 0)
         
-        relevant_lenders = self.filter_lenders_by_loan_type(loan_type)
-        
-        # Dynamic radius expansion to find minimum 10 lenders
+        # Dynamic radius expansion to find minimum 10 lenders: one index query
+        # returns the smallest radius holding enough lenders, nearest first
         min_lenders_required = 10
         search_radiuses = [50, 100, 200, 300, 500, 1000]  # Progressive expansion
-        final_recommendations = []
-        final_radius = max_distance
         
-        for radius in search_radiuses:
-            if len(final_recommendations) >= min_lenders_required:
-                break
-                
-            final_radius = radius
-            recommendations = []
-            
-            # Calculate distances and filter by amount and distance
-            for idx, lender in relevant_lenders.iterrows():
-                lender_lat = lender.get('latitude')
-                lender_lon = lender.get('longitude')
-                
-                if lender_lat is None or lender_lon is None:
-                    continue
-                
-                distance = self.calculate_distance(user_lat, user_lon, lender_lat, lender_lon)
-                
-                # Filter by current radius
-                if distance > radius:
-                    continue
-                
-                # Filter by loan amount (if available)
-                min_amount = lender.get('min_loan_amount', 0)
-                max_amount = lender.get('max_loan_amount', float('inf'))
-                
-                amount_suitable = min_amount <= loan_amount <= max_amount
-                
-                recommendation = {
-                    'name': lender.get('name', 'Unknown'),
-                    'type': lender.get('type', 'NBFC'),
-                    'city': lender.get('city', 'Unknown'),
-                    'distance': round(distance, 2),
-                    'distance_km': round(distance, 2),
-                    'specialization': lender.get('specialization', ''),
-                    'min_loan_amount': min_amount,
-                    'max_loan_amount': max_amount,
-                    'interest_rate_range': f"{lender.get('interest_rate_min', 0)}% - {lender.get('interest_rate_max', 0)}%",
-                    'amount_suitable': amount_suitable,
-                    'latitude': lender_lat,
-                    'longitude': lender_lon,
-                    'regional_office': lender.get('city', 'Unknown'),
-                    'classification': lender.get('type', 'NBFC'),
-                    'suitability_score': self._calculate_suitability_score(lender, loan_request, distance)
-                }
-                
-                recommendations.append(recommendation)
-            
-            final_recommendations = recommendations
-            
-            # Print search progress
-            print(f"Search radius {radius}km: Found {len(recommendations)} lenders")
-            
-            if len(recommendations) >= min_lenders_required:
-                break
+        # The loan-type bitmap restricts the spatial query directly
+        rows, distances, final_radius = self.spatial_index.nearest(
+            user_lat, user_lon, min_lenders_required, search_radiuses, self._loan_type_mask(loan_type)
+        )
+        print(f"Search radius {final_radius}km: Found {len(rows)} lenders")
         
-        # Sort by distance first (closest first), then by suitability score
-        final_recommendations.sort(key=lambda x: (x['distance_km'], -x['suitability_score']))
+        # Score and rank all candidates as NumPy columns
+        scores = self._calculate_suitability_scores(rows, distances, loan_request)
+        order = self._rank_lenders(rows, distances, scores)
+        final_recommendations = self._build_recommendations(rows[order], distances[order], scores[order], loan_amount)
         
         # Ensure we return at least 10, or all available if less than 10
         recommended_count = max(min_lenders_required, len(final_recommendations))
         top_recommendations = final_recommendations[:recommended_count]
         
-        # Generate map with all found lenders
-        map_html = self._generate_map(user_lat, user_lon, top_recommendations, user_location)
-        
-        return {
+        result = {
             "user_location": user_location,
             "user_coordinates": [user_lat, user_lon],
             "total_lenders_found": len(final_recommendations),
             "recommendations": top_recommendations,
-            "map_html": map_html,
+            "map_geojson": self._map_geojson(user_lat, user_lon, top_recommendations),
+            "map_html": None,
             "search_criteria": {
                 "loan_type": loan_type,
                 "loan_amount": loan_amount,
@@ -637,8 +456,98 @@ class LenderRecommendationAgent:
                 "min_lenders_required": min_lenders_required
             }
         }
+        
+        # HTML map only on demand (rendered maps are cached)
+        if include_map_html:
+            result["map_html"] = self.render_map(result)
+        
+        return result
+    
+    def recommend_lenders_batch(self, borrowers: List[Dict[str, Any]], loan_requests: Any,
+                                top_k: int = 10, max_distance: float = 1000) -> List[Dict[str, Any]]:
+        """
+        Recommend the top_k lenders for many borrowers at once (e.g. a village or SHG)
+        
+        Addresses are resolved through the offline geocoder, whose memo makes repeated
+        villages a dict hit, and each loan type is searched with one batched index query.
+        
+        Args:
+            borrowers: User profile dicts
+            loan_requests: One loan request shared by all borrowers, or a list with one per borrower
+            top_k: Number of lenders returned per borrower
+            max_distance: Largest search radius in kilometers
+            
+        Returns:
+            One result per borrower, in input order
+        """
+        if isinstance(loan_requests, dict):
+            loan_requests = [loan_requests] * len(borrowers)
+        if len(loan_requests) != len(borrowers):
+            raise ValueError("loan_requests must be a dict or have one entry per borrower")
+        
+        search_radiuses = [radius for radius in (50, 100, 200, 300, 500) if radius < max_distance] + [max_distance]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(borrowers)
+        locations: List[Optional[str]] = [None] * len(borrowers)
+        latitudes = np.full(len(borrowers), np.nan)
+        longitudes = np.full(len(borrowers), np.nan)
+        
+        # Geocode every borrower (gazetteer and cache only unless GEOCODE_ONLINE is set)
+        for i, user_data in enumerate(borrowers):
+            user_location = self._extract_user_location(user_data, verbose=False)
+            if not user_location:
+                results[i] = {"error": "User location not found in profile", "recommendations": []}
+                continue
+            user_lat, user_lon = self.geocoder.geocode(user_location)
+            if user_lat is None or user_lon is None:
+                results[i] = {"error": f"Could not geocode location: {user_location}", "recommendations": []}
+                continue
+            locations[i] = user_location
+            latitudes[i], longitudes[i] = user_lat, user_lon
+        
+        # One spatial query per loan type for all borrowers asking for it
+        loan_types = np.array([str(request.get('type', 'personal')).lower() for request in loan_requests])
+        loan_amounts = np.array([request.get('amount', 0) for request in loan_requests], dtype=float)
+        located = np.isfinite(latitudes)
+        for loan_type in np.unique(loan_types[located]):
+            members = np.flatnonzero(located & (loan_types == loan_type))
+            # Lenders tied with the k-th at ranking resolution (10 m) come back too,
+            # so the score tie-break below picks the same lenders as recommend_lenders
+            rows, distances = self.spatial_index.nearest_many(
+                latitudes[members], longitudes[members], top_k, search_radiuses,
+                self._loan_type_mask(loan_type), tie_km=0.01
+            )
+            
+            # Score every (borrower, lender) pair in one vectorized pass
+            found = rows >= 0
+            scores = np.zeros(rows.shape, dtype=np.int64)
+            scores[found] = self._calculate_suitability_scores(
+                rows[found], distances[found],
+                {'type': loan_type, 'amount': np.repeat(loan_amounts[members], found.sum(axis=1))}
+            )
+            
+            for member, member_rows, member_distances, member_scores, count in zip(
+                members, rows, distances, scores, found.sum(axis=1)
+            ):
+                order = self._rank_lenders(member_rows[:count], member_distances[:count], member_scores[:count], top_k)
+                recommendations = self._build_recommendations(
+                    member_rows[order], member_distances[order], member_scores[order], loan_amounts[member]
+                )
+                results[member] = {
+                    "user_location": locations[member],
+                    "user_coordinates": [float(latitudes[member]), float(longitudes[member])],
+                    "total_lenders_found": len(recommendations),
+                    "recommendations": recommendations,
+                    "search_criteria": {
+                        "loan_type": loan_requests[member].get('type', 'personal'),
+                        "loan_amount": loan_requests[member].get('amount', 0),
+                        "max_search_radius_km": max_distance,
+                        "top_k": top_k
+                    }
+                }
+        
+        return results
     
-    def _extract_user_location(self, user_data: Dict[str, Any]) -> Optional[str]:
+    def _extract_user_location(self, user_data: Dict[str, Any], verbose: bool = True) -> Optional[str]:
         """Extract user location from profile data with comprehensive address hierarchy"""
         
         # Build comprehensive address from available fields (most specific to most general)
@@ -703,7 +612,8 @@ class LenderRecommendationAgent:
         # Join with commas for final address
         if len(address_parts) > 1:  # More than just "India"
             full_address = ", ".join(address_parts)
-            print(f"Constructed detailed address for geocoding: {full_address}")
+            if verbose:
+                print(f"Constructed detailed address for geocoding: {full_address}")
             return full_address
         
         # Fallback to any available location field
@@ -713,56 +623,147 @@ class LenderRecommendationAgent:
             value = user_data.get(field, '').strip()
             if value:
                 fallback_address = f"{value}, Karnataka, India"
-                print(f"Using fallback address from {field}: {fallback_address}")
+                if verbose:
+                    print(f"Using fallback address from {field}: {fallback_address}")
                 return fallback_address
         
         return None
     
-    def _calculate_suitability_score(self, lender: pd.Series, loan_request: Dict[str, Any], distance: float) -> float:
-        """Calculate suitability score for a lender (0-100)"""
-        score = 50  # Base score
+    def _calculate_suitability_scores(self, rows: np.ndarray, distances: np.ndarray, loan_request: Dict[str, Any]) -> np.ndarray:
+        """Suitability scores (0-100) for many lender rows at once"""
+        columns = self.lender_columns
+        loan_amount = loan_request.get('amount', 0)
+        min_amount = columns['min_loan_amount'][rows]
+        max_amount = columns['max_loan_amount'][rows]
+        interest_min = columns['interest_rate_min'][rows]
+        
+        score = np.full(len(rows), 50)
         
         # Distance factor (closer is better)
-        if distance <= 10:
-            score += 20
-        elif distance <= 25:
-            score += 15
-        elif distance <= 50:
-            score += 10
-        elif distance <= 100:
-            score += 5
+        score += np.select([distances <= 10, distances <= 25, distances <= 50, distances <= 100], [20, 15, 10, 5], 0)
         
         # Loan amount suitability
-        loan_amount = loan_request.get('amount', 0)
-        min_amount = lender.get('min_loan_amount', 0)
-        max_amount = lender.get('max_loan_amount', float('inf'))
-        
-        if min_amount <= loan_amount <= max_amount:
-            score += 20
-        elif loan_amount < min_amount:
-            score -= 10
-        elif loan_amount > max_amount:
-            score -= 15
+        suitable = (min_amount <= loan_amount) & (loan_amount <= max_amount)
+        score += np.where(suitable, 20, np.where(loan_amount < min_amount, -10, np.where(loan_amount > max_amount, -15, 0)))
         
         # Specialization match
         loan_type = loan_request.get('type', '').lower()
-        specialization = str(lender.get('specialization', '')).lower()
-        
         if loan_type in self.loan_type_mapping:
-            keywords = self.loan_type_mapping[loan_type]
-            if any(keyword in specialization for keyword in keywords):
-                score += 15
+            score += np.where(self.loan_type_index[loan_type][rows], 15, 0)
         
         # Interest rate (lower is better)
-        interest_min = lender.get('interest_rate_min', 20)
-        if interest_min <= 12:
-            score += 10
-        elif interest_min <= 15:
-            score += 5
-        elif interest_min >= 20:
-            score -= 5
-        
-        return min(100, max(0, score))
+        score += np.select([interest_min <= 12, interest_min <= 15, interest_min >= 20], [10, 5, -5], 0)
+        
+        return np.clip(score, 0, 100)
+    
+    @staticmethod
+    def _rank_lenders(rows: np.ndarray, distances: np.ndarray, scores: np.ndarray, k: int = None) -> np.ndarray:
+        """Positions ordered by distance (to 10 m), then by higher score, then by lender row
+        
+        The lender row makes the order total, so it does not depend on the order
+        candidates arrive in; with k, only the top k (plus rows tied with the
+        k-th) are sorted.
+        """
+        centi_km = np.rint(distances * 100).astype(np.int64)
+        candidates = np.arange(len(rows))
+        if k is not None and k < len(rows):
+            # Distance and score as one integer key; keep everything tied at the boundary
+            key = centi_km * 101 + (100 - scores)
+            candidates = np.flatnonzero(key <= np.partition(key, k - 1)[k - 1])
+        order = np.lexsort((rows[candidates], -scores[candidates], centi_km[candidates]))
+        return candidates[order][:k]
+    
+    def _build_recommendations(self, rows: np.ndarray, distances: np.ndarray, scores: np.ndarray, loan_amount: float) -> List[Dict]:
+        """Recommendation dicts for already ranked lender rows"""
+        columns = self.lender_columns
+        amount_suitable = (columns['min_loan_amount'][rows] <= loan_amount) & (loan_amount <= columns['max_loan_amount'][rows])
+        
+        recommendations = []
+        for row, distance, score, suitable in zip(rows, distances, scores, amount_suitable):
+            lender = self.lender_records[row]
+            recommendations.append({
+                'lender_id': int(row),
+                'name': lender.get('name', 'Unknown'),
+                'type': lender.get('type', 'NBFC'),
+                'city': lender.get('city', 'Unknown'),
+                'distance': round(float(distance), 2),
+                'distance_km': round(float(distance), 2),
+                'specialization': lender.get('specialization', ''),
+                'min_loan_amount': lender.get('min_loan_amount', 0),
+                'max_loan_amount': lender.get('max_loan_amount', float('inf')),
+                'interest_rate_range': f"{lender.get('interest_rate_min', 0)}% - {lender.get('interest_rate_max', 0)}%",
+                'amount_suitable': bool(suitable),
+                'latitude': lender.get('latitude'),
+                'longitude': lender.get('longitude'),
+                'regional_office': lender.get('city', 'Unknown'),
+                'classification': lender.get('type', 'NBFC'),
+                'suitability_score': int(score)
+            })
+        return recommendations
+    
+    @staticmethod
+    def _marker_color(score: float) -> str:
+        """Marker color by suitability score"""
+        if score >= 80:
+            return 'green'
+        elif score >= 60:
+            return 'orange'
+        return 'blue'
+    
+    def _map_geojson(self, user_lat: float, user_lon: float, recommendations: List[Dict]) -> Dict[str, Any]:
+        """Lightweight GeoJSON FeatureCollection of the user and recommended lenders"""
+        features = [{
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [user_lon, user_lat]},
+            "properties": {"role": "user", "label": "Your Location"}
+        }]
+        for lender in recommendations:
+            if lender.get('latitude') and lender.get('longitude'):
+                features.append({
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [lender['longitude'], lender['latitude']]},
+                    "properties": {
+                        "role": "lender",
+                        "lender_id": lender.get('lender_id'),
+                        "name": lender['name'],
+                        "distance_km": lender['distance_km'],
+                        "suitability_score": lender.get('suitability_score', 0),
+                        "marker_color": self._marker_color(lender.get('suitability_score', 0))
+                    }
+                })
+        return {"type": "FeatureCollection", "features": features}
+    
+    def render_map(self, result: Dict[str, Any]) -> Optional[str]:
+        """
+        Folium HTML map for a recommend_lenders result, rendered on demand
+        
+        Maps are cached by (user grid cell, loan type, lender ids and scores), so
+        borrowers in the same ~1 km cell asking for the same loan type share one
+        render. A cached map is centred on the cell rather than the exact address
+        and carries no address text.
+        """
+        coordinates = result.get('user_coordinates')
+        recommendations = result.get('recommendations') or []
+        if not coordinates:
+            return None
+        
+        cell = (round(coordinates[0] / MAP_CELL_DEGREES), round(coordinates[1] / MAP_CELL_DEGREES))
+        key = (
+            cell,
+            result.get('search_criteria', {}).get('loan_type'),
+            tuple((lender.get('lender_id'), lender.get('suitability_score')) for lender in recommendations)
+        )
+        with self._map_cache_lock:
+            if key in self._map_cache:
+                self._map_cache.move_to_end(key)
+                return self._map_cache[key]
+        
+        map_html = self._generate_map(cell[0] * MAP_CELL_DEGREES, cell[1] * MAP_CELL_DEGREES, recommendations, "")
+        with self._map_cache_lock:
+            self._map_cache[key] = map_html
+            while len(self._map_cache) > MAP_CACHE_SIZE:
+                self._map_cache.popitem(last=False)
+        return map_html
     
     def _generate_map(self, user_lat: float, user_lon: float, recommendations: List[Dict], user_location: str) -> str:
         """Generate HTML map with user location and lender recommendations"""
@@ -786,12 +787,7 @@ class LenderRecommendationAgent:
                 if lender.get('latitude') and lender.get('longitude'):
                     # Choose marker color based on suitability score
                     score = lender.get('suitability_score', 0)
-                    if score >= 80:
-                        color = 'green'
-                    elif score >= 60:
-                        color = 'orange'
-                    else:
-                        color = 'blue'
+                    color = self._marker_color(score)
                     
                     popup_text = f"""
                     <b>{lender['name']}</b><br>
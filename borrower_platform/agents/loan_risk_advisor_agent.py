@@ -6,12 +6,16 @@ Supports English, Hindi, and Kannada
 
 import os
 import json
-from groq import Groq
 from typing import Dict, Any, Optional, List
 import sys
 import numpy as np
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared_data.llm_cache import LRUCache
+from shared_data.llm_gateway import get_llm_client
+from shared_data.prompt_builder import DEFAULT_DROP_FIELDS, PromptBuilder, compact_json
 from utils.helpers import get_language_prompt, generate_cache_key
+from shared_data.amortization import calculate_emi
 from .lender_recommendation_agent import LenderRecommendationAgent
 from dotenv import load_dotenv
 
@@ -32,14 +36,17 @@ class NumpyEncoder(json.JSONEncoder):
         return super(NumpyEncoder, self).default(obj)
 
 class LoanRiskAdvisorAgent:
+    # Left out of assessment prompts: identifiers, and the list of fields a profile does have
+    PROMPT_DROP_FIELDS = DEFAULT_DROP_FIELDS | {"provided_field_names"}
+    
     def __init__(self, groq_api_key: str = None):
         self.groq_api_key = groq_api_key or os.getenv("GROQ_API_KEY")
         
         if not self.groq_api_key:
             raise ValueError("GROQ API key is required. Set GROQ_API_KEY environment variable or pass groq_api_key parameter.")
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("LoanRiskAdvisorAgent", self.groq_api_key)
         self.model = "meta-llama/llama-4-maverick-17b-128e-instruct"
-        self.cache = {}
+        self.cache = LRUCache()
         
         # Initialize lender recommendation agent
         try:
@@ -192,13 +199,8 @@ class LoanRiskAdvisorAgent:
             tenure_max = loan_params["typical_tenure"][0] * 1.5
         
         # Calculate EMI
-        monthly_interest = interest_rate / 12 / 100
         tenure_months = min(tenure_max, 36)
-        
-        if monthly_interest > 0:
-            emi = approved_amount * monthly_interest * ((1 + monthly_interest) ** tenure_months) / (((1 + monthly_interest) ** tenure_months) - 1)
-        else:
-            emi = approved_amount / tenure_months
+        emi = calculate_emi(approved_amount, interest_rate, tenure_months)
         
         recommendations = {
             "recommended_amount": round(approved_amount, 2),
@@ -331,141 +333,166 @@ Format as a professional loan officer's recommendation:
             Dict: Detailed loan recommendation with comprehensive analysis
         """
         
+        request = self._detailed_recommendation_request(user_data, credit_result, property_verification, language)
+        try:
+            response = self.client.chat.completions.create(**request)
+            return self._detailed_recommendation_result(response, user_data, credit_result, language)
+            
+        except Exception as e:
+            print(f"Error generating detailed loan recommendation: {e}")
+            return self._fallback_detailed_recommendation(user_data, credit_result, language)
+    
+    async def aprovide_detailed_loan_recommendation(self, user_data: Dict[str, Any], credit_result: Dict[str, Any],
+                                                    property_verification: Dict[str, Any] = None,
+                                                    language: str = "english") -> Dict[str, Any]:
+        """Async provide_detailed_loan_recommendation (does not block the event loop while waiting for the LLM)"""
+        request = self._detailed_recommendation_request(user_data, credit_result, property_verification, language)
+        try:
+            response = await self.client.aio.chat.completions.create(**request)
+            return self._detailed_recommendation_result(response, user_data, credit_result, language)
+            
+        except Exception as e:
+            print(f"Error generating detailed loan recommendation: {e}")
+            return self._fallback_detailed_recommendation(user_data, credit_result, language)
+    
+    def _detailed_recommendation_request(self, user_data: Dict[str, Any], credit_result: Dict[str, Any],
+                                         property_verification: Optional[Dict[str, Any]], language: str) -> Dict[str, Any]:
+        """Chat completion arguments for a detailed loan recommendation"""
         system_prompt = get_language_prompt(language, "risk_advisor_system")
         
-        # Prepare comprehensive analysis prompt
-        analysis_prompt = f"""
-{system_prompt}
-
-As an MFI Risk Advisor, provide comprehensive loan recommendation with detailed analysis.
-
-USER PROFILE: {json.dumps(user_data, indent=2)}
-CREDIT ASSESSMENT: {json.dumps(credit_result, indent=2)}
-PROPERTY VERIFICATION: {json.dumps(property_verification or {}, indent=2)}
+        # Prepare comprehensive analysis prompt: compact data (no empty fields, identifiers or
+        # field-name lists), trimmed to the agent's budget if it still does not fit
+        builder = PromptBuilder("LoanRiskAdvisorAgent")
+        builder.add(f"""{system_prompt}
 
-Provide detailed analysis as JSON:
-{{
-    "loan_recommendation": {{
+As an MFI Risk Advisor, provide comprehensive loan recommendation with detailed analysis.""")
+        builder.add_flexible(compact_json(user_data), heading="USER PROFILE:", trim_order=2, min_tokens=300)
+        builder.add_flexible(compact_json(credit_result, drop=self.PROMPT_DROP_FIELDS),
+                             heading="CREDIT ASSESSMENT:", trim_order=1, min_tokens=150)
+        if property_verification:
+            builder.add_flexible(compact_json(property_verification, drop=self.PROMPT_DROP_FIELDS),
+                                 heading="PROPERTY VERIFICATION:", trim_order=0, min_tokens=100)
+        builder.add("""Provide detailed analysis as JSON:
+{
+    "loan_recommendation": {
         "decision": "APPROVE/CONDITIONAL_APPROVE/REJECT",
         "confidence": "high/medium/low",
         "maximum_loan_amount": "recommended amount in rupees",
         "interest_rate_suggestion": "suggested rate percentage",
         "repayment_period": "recommended months",
         "collateral_requirement": "required/not_required/optional"
-    }},
-    "detailed_risk_analysis": {{
+    },
+    "detailed_risk_analysis": {
         "overall_risk_score": "numerical score 0-100",
         "risk_category": "very_low/low/medium/high/very_high",
         "key_risk_factors": [
-            {{
+            {
                 "factor": "specific risk factor",
                 "impact": "high/medium/low",
                 "explanation": "detailed explanation of why this is risky",
                 "mitigation_strategy": "how to reduce this risk"
-            }}
+            }
         ],
         "positive_factors": [
-            {{
+            {
                 "factor": "positive aspect",
                 "impact": "high/medium/low", 
                 "explanation": "why this reduces risk"
-            }}
+            }
         ]
-    }},
-    "financial_health_assessment": {{
-        "income_stability": {{
+    },
+    "financial_health_assessment": {
+        "income_stability": {
             "rating": "excellent/good/fair/poor",
             "reasoning": "detailed assessment of income consistency",
             "seasonal_considerations": "impact of seasonal variations"
-        }},
-        "debt_capacity": {{
+        },
+        "debt_capacity": {
             "current_debt_to_income": "calculated ratio",
             "recommended_max_emi": "amount in rupees",
             "debt_servicing_ability": "strong/moderate/weak"
-        }},
-        "savings_pattern": {{
+        },
+        "savings_pattern": {
             "assessment": "disciplined/irregular/poor",
             "emergency_fund_status": "adequate/inadequate/none",
             "recommendation": "specific advice for savings improvement"
-        }}
-    }},
-    "detailed_recommendation_reasoning": {{
+        }
+    },
+    "detailed_recommendation_reasoning": {
         "primary_reasons_for_decision": [
             "main factor 1 with detailed explanation",
             "main factor 2 with detailed explanation"
         ],
         "conditions_if_conditional_approval": [
-            {{
+            {
                 "condition": "specific requirement",
                 "rationale": "why this condition is necessary",
                 "impact_if_not_met": "consequences"
-            }}
+            }
         ],
         "monitoring_requirements": [
-            {{
+            {
                 "parameter": "what to monitor",
                 "frequency": "how often",
                 "action_triggers": "when to take action"
-            }}
+            }
         ]
-    }},
-    "alternative_recommendations": {{
+    },
+    "alternative_recommendations": {
         "if_rejected": [
-            {{
+            {
                 "option": "alternative solution",
                 "requirements": "what user needs to do",
                 "timeline": "when to reapply"
-            }}
+            }
         ],
         "product_alternatives": [
-            {{
+            {
                 "product": "alternative loan product",
                 "suitability": "why this might be better",
                 "terms": "different terms offered"
-            }}
+            }
         ]
-    }},
-    "final_summary": {{
+    },
+    "final_summary": {
         "executive_summary": "concise 2-3 sentence summary of recommendation",
         "key_next_steps": ["immediate actions for MFI"],
         "borrower_communication": "how to communicate decision to borrower"
-    }}
-}}
+    }
+}
 
 Provide comprehensive, actionable analysis:
-"""
+""")
 
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": builder.build()}
+            ],
+            "max_tokens": 3000,
+            "temperature": 0.1
+        }
+    
+    def _detailed_recommendation_result(self, response, user_data: Dict[str, Any], credit_result: Dict[str, Any],
+                                        language: str) -> Dict[str, Any]:
+        """Detailed loan recommendation from the model's answer, or the fallback if it is not JSON"""
+        result_text = response.choices[0].message.content.strip()
+        
+        # Parse JSON response
+        if result_text.startswith('```json'):
+            result_text = result_text.split('```json')[1].split('```')[0]
+        elif result_text.startswith('```'):
+            result_text = result_text.split('```')[1]
+        
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": analysis_prompt}
-                ],
-                max_tokens=3000,
-                temperature=0.1
-            )
-            
-            result_text = response.choices[0].message.content.strip()
+            detailed_analysis = json.loads(result_text)
             
-            # Parse JSON response
-            if result_text.startswith('```json'):
-                result_text = result_text.split('```json')[1].split('```')[0]
-            elif result_text.startswith('```'):
-                result_text = result_text.split('```')[1]
+            # Add quantitative metrics
+            detailed_analysis = self._add_quantitative_metrics(detailed_analysis, user_data, credit_result)
             
-            try:
-                detailed_analysis = json.loads(result_text)
-                
-                # Add quantitative metrics
-                detailed_analysis = self._add_quantitative_metrics(detailed_analysis, user_data, credit_result)
-                
-                return detailed_analysis
-            except json.JSONDecodeError:
-                print("Warning: Could not parse JSON response, generating fallback recommendation")
-                return self._fallback_detailed_recommendation(user_data, credit_result, language)
-            
-        except Exception as e:
-            print(f"Error generating detailed loan recommendation: {e}")
+            return detailed_analysis
+        except json.JSONDecodeError:
+            print("Warning: Could not parse JSON response, generating fallback recommendation")
             return self._fallback_detailed_recommendation(user_data, credit_result, language)
     
     def _add_quantitative_metrics(self, analysis: Dict[str, Any], user_data: Dict[str, Any], credit_result: Dict[str, Any]) -> Dict[str, Any]:
@@ -840,7 +867,7 @@ Provide comprehensive, actionable analysis:
                         loan_request,
                         language
                     )
-                    map_html = lender_recommendations.get('map_html')
+                    map_html = self.lender_agent.render_map(lender_recommendations)
                     
             except Exception as e:
                 print(f"Error getting lender recommendations: {e}")
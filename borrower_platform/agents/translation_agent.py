@@ -5,20 +5,32 @@ Supports English, Hindi, and Kannada with fallback mechanisms
 """
 
 import os
-from groq import Groq
-from typing import Dict, Any, Optional
+import re
+import sys
+import asyncio
+from collections import deque
+from typing import Dict, Any, Optional, Tuple, List, AsyncIterable, AsyncIterator
 from dotenv import load_dotenv
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared_data.llm_gateway import get_llm_client
 
 # Load environment variables
 load_dotenv()
 
+# A sentence ends with . ! ? or a danda followed by whitespace (but not after "Rs."
+# and similar abbreviations), or at a line break
+SENTENCE_END = re.compile(r'(?<=[.!?\u0964])(?<!Rs\.)(?<!No\.)(?<!Dr\.)(?<!Mr\.)(?<!Ms\.)\s+|\n+')
+
+# Streamed text is cut into sentences of at least this many characters
+MIN_SENTENCE_CHARS = 40
+
 class TranslationAgent:
     def __init__(self, groq_api_key: str = None):
         self.groq_api_key = groq_api_key or os.getenv('GROQ_API_KEY')
         if not self.groq_api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables or parameters")
             
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("TranslationAgent", self.groq_api_key, priority="interactive")
         self.model = os.getenv('MODEL_NAME', "meta-llama/llama-4-maverick-17b-128e-instruct")
         
         self.supported_languages = {
@@ -91,8 +103,32 @@ class TranslationAgent:
         Returns:
             Dict: Translation result with metadata
         """
+        source_language, shortcut = self._to_english_shortcut(text, source_language)
+        if shortcut:
+            return shortcut
+        
+        try:
+            response = self.client.chat.completions.create(**self._to_english_request(text, source_language))
+            return self._translation_result(response, source_language, "english")
+        except Exception as e:
+            return self._translation_failure(text, e, source_language=source_language)
+
+    async def atranslate_to_english(self, text: str, source_language: str = "auto") -> Dict[str, Any]:
+        """Async translate_to_english (does not block the event loop while waiting for the LLM)"""
+        source_language, shortcut = self._to_english_shortcut(text, source_language)
+        if shortcut:
+            return shortcut
+        
+        try:
+            response = await self.client.aio.chat.completions.create(**self._to_english_request(text, source_language))
+            return self._translation_result(response, source_language, "english")
+        except Exception as e:
+            return self._translation_failure(text, e, source_language=source_language)
+
+    def _to_english_shortcut(self, text: str, source_language: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Resolved source language, and the result if no LLM call is needed"""
         if not text or not text.strip():
-            return {
+            return source_language, {
                 "success": False,
                 "translated_text": "",
                 "source_language": "unknown",
@@ -105,15 +141,16 @@ class TranslationAgent:
         
         # If already English, return as-is
         if source_language == "english":
-            return {
+            return source_language, {
                 "success": True,
                 "translated_text": text,
                 "source_language": "english",
                 "target_language": "english"
             }
-        
-        try:
-            prompt = f"""
+        return source_language, None
+
+    def _to_english_request(self, text: str, source_language: str) -> Dict[str, Any]:
+        prompt = f"""
 You are a professional translator for a rural microfinance system in Karnataka, India.
 
 Task: Translate the following {source_language} text to English.
@@ -129,29 +166,13 @@ Rules:
 
 English translation:"""
 
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500,
-                temperature=0  # Deterministic output
-            )
-            
-            translated_text = response.choices[0].message.content.strip()
-            
-            return {
-                "success": True,
-                "translated_text": translated_text,
-                "source_language": source_language,
-                "target_language": "english"
-            }
-            
-        except Exception as e:
-            return {
-                "success": False,
-                "translated_text": text,  # Fallback to original
-                "source_language": source_language,
-                "error": str(e)
-            }
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 500,
+            "temperature": 0,  # Deterministic output
+            "prompt_type": "translation"
+        }
 
     def translate_from_english(self, text: str, target_language: str) -> Dict[str, Any]:
         """
@@ -164,6 +185,30 @@ English translation:"""
         Returns:
             Dict: Translation result with metadata
         """
+        shortcut = self._from_english_shortcut(text, target_language)
+        if shortcut:
+            return shortcut
+        
+        try:
+            response = self.client.chat.completions.create(**self._from_english_request(text, target_language))
+            return self._translation_result(response, "english", target_language)
+        except Exception as e:
+            return self._translation_failure(text, e, target_language=target_language)
+
+    async def atranslate_from_english(self, text: str, target_language: str) -> Dict[str, Any]:
+        """Async translate_from_english (does not block the event loop while waiting for the LLM)"""
+        shortcut = self._from_english_shortcut(text, target_language)
+        if shortcut:
+            return shortcut
+        
+        try:
+            response = await self.client.aio.chat.completions.create(**self._from_english_request(text, target_language))
+            return self._translation_result(response, "english", target_language)
+        except Exception as e:
+            return self._translation_failure(text, e, target_language=target_language)
+
+    def _from_english_shortcut(self, text: str, target_language: str) -> Optional[Dict[str, Any]]:
+        """Result for empty text, English targets and common phrases (no LLM call), else None"""
         if not text or not text.strip():
             return {
                 "success": False,
@@ -191,15 +236,16 @@ English translation:"""
                         "source_language": "english",
                         "target_language": target_language
                     }
+        return None
+
+    def _from_english_request(self, text: str, target_language: str) -> Dict[str, Any]:
+        # Cultural context for better translations
+        context_info = {
+            "hindi": "Use respectful Hindi suitable for rural banking customers in Karnataka. Use formal 'aap' forms.",
+            "kannada": "Use respectful Kannada suitable for rural banking customers in Karnataka. Use appropriate honorifics."
+        }
         
-        try:
-            # Cultural context for better translations
-            context_info = {
-                "hindi": "Use respectful Hindi suitable for rural banking customers in Karnataka. Use formal 'aap' forms.",
-                "kannada": "Use respectful Kannada suitable for rural banking customers in Karnataka. Use appropriate honorifics."
-            }
-            
-            prompt = f"""
+        prompt = f"""
 You are a professional translator for a rural microfinance system in Karnataka, India.
 
 Task: Translate the following English text to {target_language.title()}.
@@ -219,29 +265,31 @@ English text: {text}
 
 Provide only the {target_language.title()} translation:"""
 
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500,
-                temperature=0  # Deterministic output
-            )
-            
-            translated_text = response.choices[0].message.content.strip()
-            
-            return {
-                "success": True,
-                "translated_text": translated_text,
-                "source_language": "english",
-                "target_language": target_language
-            }
-            
-        except Exception as e:
-            return {
-                "success": False,
-                "translated_text": text,  # Fallback to original
-                "target_language": target_language,
-                "error": str(e)
-            }
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 500,
+            "temperature": 0,  # Deterministic output
+            "prompt_type": "translation"
+        }
+
+    @staticmethod
+    def _translation_result(response, source_language: str, target_language: str) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "translated_text": response.choices[0].message.content.strip(),
+            "source_language": source_language,
+            "target_language": target_language
+        }
+
+    @staticmethod
+    def _translation_failure(text: str, error: Exception, **languages) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "translated_text": text,  # Fallback to original
+            **languages,
+            "error": str(error)
+        }
 
     def get_user_preferred_language(self, user_data: Dict[str, Any]) -> str:
         """
@@ -322,6 +370,74 @@ Provide only the {target_language.title()} translation:"""
             # Fallback to original English text
             return response
 
+    async def atranslate_user_input_to_english(self, user_input: str, user_data: Dict[str, Any]) -> str:
+        """Async translate_user_input_to_english"""
+        user_language = self.get_user_preferred_language(user_data)
+        if user_language == "english":
+            return user_input
+        
+        result = await self.atranslate_to_english(user_input, user_language)
+        return result["translated_text"] if result["success"] else user_input
+
+    async def atranslate_response_to_user_language(self, response: str, user_data: Dict[str, Any]) -> str:
+        """Async translate_response_to_user_language"""
+        user_language = self.get_user_preferred_language(user_data)
+        if user_language == "english":
+            return response
+        
+        result = await self.atranslate_from_english(response, user_language)
+        return result["translated_text"] if result["success"] else response
+
+    async def atranslate_stream(self, deltas: AsyncIterable[str], target_language: str) -> AsyncIterator[str]:
+        """
+        Translate streamed English text sentence by sentence
+        
+        Each sentence is sent for translation as soon as it is complete, while the
+        stream is still being read; translations are yielded in order (followed by
+        the whitespace that ended the sentence). English text passes straight through.
+        """
+        if target_language == "english":
+            async for delta in deltas:
+                yield delta
+            return
+        
+        pending = deque()
+        buffer = ""
+        try:
+            async for delta in deltas:
+                buffer += delta
+                sentences, buffer = self._pop_sentences(buffer)
+                for sentence, separator in sentences:
+                    pending.append((asyncio.ensure_future(self.atranslate_from_english(sentence, target_language)), separator))
+                while pending and pending[0][0].done():
+                    task, separator = pending.popleft()
+                    yield task.result()["translated_text"] + separator
+            
+            if buffer.strip():
+                pending.append((asyncio.ensure_future(self.atranslate_from_english(buffer.strip(), target_language)), ""))
+            while pending:
+                task, separator = pending[0]
+                result = await task
+                pending.popleft()
+                yield result["translated_text"] + separator
+        finally:
+            for task, _ in pending:
+                task.cancel()
+
+    @staticmethod
+    def _pop_sentences(buffer: str) -> Tuple[List[Tuple[str, str]], str]:
+        """Complete sentences at the start of buffer (each with its trailing whitespace) and the rest"""
+        sentences = []
+        start = 0
+        while True:
+            match = SENTENCE_END.search(buffer, start + MIN_SENTENCE_CHARS)
+            if not match:
+                break
+            if buffer[start:match.start()].strip():
+                sentences.append((buffer[start:match.start()].strip(), match.group()))
+            start = match.end()
+        return sentences, buffer[start:]
+
 # Example usage
 if __name__ == "__main__":
     translator = TranslationAgent()
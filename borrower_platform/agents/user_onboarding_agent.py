@@ -9,10 +9,12 @@ Works offline/low-connectivity with voice + translation + memory
 import os
 import json
 import time
-from groq import Groq
 from typing import Dict, Any, Optional, List
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared_data.llm_cache import LRUCache
+from shared_data.llm_gateway import get_llm_client
 from utils.helpers import get_language_prompt, validate_user_data, extract_language_from_text, generate_cache_key
 from .translation_agent import TranslationAgent
 from dotenv import load_dotenv
@@ -33,9 +35,9 @@ class UserOnboardingAgent:
         if not self.groq_api_key:
             raise ValueError("GROQ API key is required. Set GROQ_API_KEY environment variable or pass groq_api_key parameter.")
         
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("UserOnboardingAgent", self.groq_api_key, priority="interactive")
         self.model = "meta-llama/llama-4-maverick-17b-128e-instruct"
-        self.cache = {}
+        self.cache = LRUCache()
         self.translator = TranslationAgent(self.groq_api_key)
         
         # Standardized user data schema
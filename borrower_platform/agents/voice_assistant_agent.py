@@ -7,11 +7,13 @@ Supports English, Hindi, and Kannada
 import os
 import json
 import time
-from groq import Groq
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncIterator
 import requests
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared_data.llm_cache import LRUCache
+from shared_data.llm_gateway import get_llm_client
 from utils.helpers import get_language_prompt, extract_language_from_text, generate_cache_key
 from .translation_agent import TranslationAgent
 from dotenv import load_dotenv
@@ -54,7 +56,7 @@ class VoiceAssistantAgent:
             raise ValueError("AssemblyAI API key is required. Set ASSEMBLYAI_API_KEY environment variable or pass assemblyai_key parameter.")
         
         # Initialize clients
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("VoiceAssistantAgent", self.groq_api_key, priority="interactive")
         self.model = "meta-llama/llama-4-maverick-17b-128e-instruct"
         self.translator = TranslationAgent(self.groq_api_key)
         
@@ -62,7 +64,7 @@ class VoiceAssistantAgent:
         if self.assemblyai_key and AAI_AVAILABLE:
             aai.settings.api_key = self.assemblyai_key
         
-        self.cache = {}
+        self.cache = LRUCache()
         self.conversation_history = []
         
         # Language-specific voice settings for gTTS
@@ -236,15 +238,93 @@ class VoiceAssistantAgent:
             user_language = self.translator.get_user_preferred_language(user_data)
         else:
             user_language = language
+        language_profile = user_data or {"preferred_language": user_language}
         
         # Translate user query to English for processing
-        english_query = self.translator.translate_user_input_to_english(query_text, user_data or {"preferred_language": user_language})
+        english_query = self.translator.translate_user_input_to_english(query_text, language_profile)
         
         # Check cache
         cache_key = generate_cache_key({"query": english_query, "context": context, "lang": user_language})
         if cache_key in self.cache:
             return self.cache[cache_key]
         
+        try:
+            response = self.client.chat.completions.create(**self._voice_query_request(english_query, context, user_language))
+            english_response = response.choices[0].message.content.strip()
+            
+            # Translate response back to user's preferred language
+            final_response = self.translator.translate_response_to_user_language(english_response, language_profile)
+            return self._voice_query_result(query_text, final_response, user_language, cache_key)
+            
+        except Exception as e:
+            return self._voice_query_failure(e, user_language)
+    
+    async def aprocess_voice_query(self, query_text: str, user_data: Dict[str, Any] = None, context: str = "", language: str = "english") -> Dict[str, Any]:
+        """Async process_voice_query: translate -> answer -> translate without blocking the event loop"""
+        if user_data:
+            user_language = self.translator.get_user_preferred_language(user_data)
+        else:
+            user_language = language
+        language_profile = user_data or {"preferred_language": user_language}
+        
+        english_query = await self.translator.atranslate_user_input_to_english(query_text, language_profile)
+        
+        cache_key = generate_cache_key({"query": english_query, "context": context, "lang": user_language})
+        if cache_key in self.cache:
+            return self.cache[cache_key]
+        
+        try:
+            response = await self.client.aio.chat.completions.create(**self._voice_query_request(english_query, context, user_language))
+            english_response = response.choices[0].message.content.strip()
+            
+            final_response = await self.translator.atranslate_response_to_user_language(english_response, language_profile)
+            return self._voice_query_result(query_text, final_response, user_language, cache_key)
+            
+        except Exception as e:
+            return self._voice_query_failure(e, user_language)
+    
+    async def astream_voice_query(self, query_text: str, user_data: Dict[str, Any] = None, context: str = "", language: str = "english") -> AsyncIterator[str]:
+        """
+        Streaming aprocess_voice_query: yields the response in pieces as it is generated,
+        translated sentence by sentence for non-English users. A failure before the
+        first piece yields the usual apology; a failure after it is raised
+        """
+        if user_data:
+            user_language = self.translator.get_user_preferred_language(user_data)
+        else:
+            user_language = language
+        language_profile = user_data or {"preferred_language": user_language}
+        
+        english_query = await self.translator.atranslate_user_input_to_english(query_text, language_profile)
+        
+        cache_key = generate_cache_key({"query": english_query, "context": context, "lang": user_language})
+        if cache_key in self.cache:
+            yield self.cache[cache_key]["response_text"]
+            return
+        
+        pieces = []
+        try:
+            english_deltas = self.client.aio.stream_text(**self._voice_query_request(english_query, context, user_language))
+            async for piece in self.translator.atranslate_stream(english_deltas, user_language):
+                # Like the non-streaming answer, skip leading whitespace
+                if not pieces:
+                    piece = piece.lstrip()
+                if piece:
+                    pieces.append(piece)
+                    yield piece
+        except Exception as e:
+            failure = self._voice_query_failure(e, user_language)
+            if pieces:
+                # Part of the answer is already out: fail the stream rather than end it
+                # as if that part were the whole answer
+                raise
+            yield failure["response_text"]
+            return
+        
+        self._voice_query_result(query_text, "".join(pieces).strip(), user_language, cache_key)
+    
+    def _voice_query_request(self, english_query: str, context: str, user_language: str) -> Dict[str, Any]:
+        """Chat completion arguments for a voice query"""
         system_prompt = get_language_prompt(user_language, "voice_system")
         
         # Enhanced prompt with microfinance context
@@ -269,53 +349,48 @@ User Query: {english_query}
 Provide a helpful response:
 """
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": enhanced_prompt}
-                ],
-                max_tokens=300,
-                temperature=0  # Deterministic output
-            )
-            
-            english_response = response.choices[0].message.content.strip()
-            
-            # Translate response back to user's preferred language
-            final_response = self.translator.translate_response_to_user_language(
-                english_response, 
-                user_data or {"preferred_language": user_language}
-            )
-            
-            # Add to conversation history
-            self.conversation_history.append({
-                "timestamp": time.time(),
-                "user_query": query_text,
-                "assistant_response": final_response,
-                "language": user_language
-            })
-            
-            result = {
-                "success": True,
-                "response_text": final_response,
-                "language": user_language,
-                "response_length": len(final_response),
-                "processing_time": time.time()
-            }
-            
-            # Cache result
-            self.cache[cache_key] = result
-            
-            return result
-            
-        except Exception as e:
-            print(f"Error processing voice query: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "response_text": "Sorry, I couldn't process your request. Please try again.",
-                "language": user_language
-            }
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": enhanced_prompt}
+            ],
+            "max_tokens": 300,
+            "temperature": 0,  # Deterministic output
+            "prompt_type": "voice_query"
+        }
+    
+    def _voice_query_result(self, query_text: str, final_response: str, user_language: str, cache_key: str) -> Dict[str, Any]:
+        """Record the answer in history and cache, and build the result"""
+        # Add to conversation history
+        self.conversation_history.append({
+            "timestamp": time.time(),
+            "user_query": query_text,
+            "assistant_response": final_response,
+            "language": user_language
+        })
+        
+        result = {
+            "success": True,
+            "response_text": final_response,
+            "language": user_language,
+            "response_length": len(final_response),
+            "processing_time": time.time()
+        }
+        
+        # Cache result
+        self.cache[cache_key] = result
+        
+        return result
+    
+    @staticmethod
+    def _voice_query_failure(error: Exception, user_language: str) -> Dict[str, Any]:
+        print(f"Error processing voice query: {error}")
+        return {
+            "success": False,
+            "error": str(error),
+            "response_text": "Sorry, I couldn't process your request. Please try again.",
+            "language": user_language
+        }
     
     def text_to_speech(self, text: str, language: str = "english", output_path: str = None) -> Dict[str, Any]:
         """
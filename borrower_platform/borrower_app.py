@@ -21,6 +21,7 @@ from agents.educational_content_agent import EducationalContentAgent
 from agents.document_processing_agent import DocumentProcessingAgent
 from agents.voice_assistant_agent import VoiceAssistantAgent
 from agents.translation_agent import TranslationAgent
+from shared_data.amortization import principal_from_emi
 
 # Import shared loan database
 try:
@@ -470,15 +471,8 @@ def calculate_loan_eligibility(user_data: Dict[str, Any], credit_score: int) ->
     tenure_months = tenure_years * 12
     
     # Calculate maximum principal using EMI formula
-    # EMI = P * r * (1+r)^n / ((1+r)^n - 1)
     # Rearranged: P = EMI * ((1+r)^n - 1) / (r * (1+r)^n)
-    monthly_interest_rate = interest_rate / 100 / 12
-    
-    if monthly_interest_rate > 0:
-        emi_factor = ((1 + monthly_interest_rate) ** tenure_months - 1) / (monthly_interest_rate * (1 + monthly_interest_rate) ** tenure_months)
-        income_based_amount = int(safe_emi_limit * emi_factor)
-    else:
-        income_based_amount = int(safe_emi_limit * tenure_months)
+    income_based_amount = int(principal_from_emi(safe_emi_limit, interest_rate, tenure_months))
     
     # 5️⃣ Calculate Collateral Value & LTV-Based Amount
     collateral_value = 0
@@ -1314,6 +1308,8 @@ def view_active_loans() -> str:
             
             if loan['status'] == 'active' and loan['next_due_date']:
                 loan_list += f"- **Next Due**: {loan['next_due_date'][:10]}\n"
+                for installment in loan.get('upcoming_installments', []):
+                    loan_list += f"  - EMI #{installment['installment_no']} due {installment['due_date']}: ₹{installment['emi_amount']:,.0f}\n"
             
             loan_list += "---\n"
         
@@ -1410,6 +1406,25 @@ def get_rag_chat_response(message: str, history: list = None) -> str:
     except Exception as e:
         return f"📚 **Financial Education Assistant**\n\nI apologize, but I'm having some technical difficulties right now. Please try asking your question again.\n\n**Common topics I can help with:**\n• Loan applications and requirements\n• Savings and investment options\n• Government financial schemes\n• Financial planning and budgeting\n• Business loans and microfinance\n\nError: {str(e)}"
 
+def stream_rag_chat_response(message: str):
+    """Yield the RAG chat response as it grows (formatted like get_rag_chat_response)"""
+    if not rag_system:
+        yield get_rag_chat_response(message)
+        return
+    
+    header = "📚 **Financial Education Assistant**\n\n"
+    response = ""
+    try:
+        for piece in rag_system.stream_response(message, user_type="borrower"):
+            response += piece
+            yield header + response
+    except Exception as e:
+        if not response:
+            yield get_rag_chat_response(message)
+        else:
+            # Keep what was shown, but do not let it pass for the whole answer
+            yield header + response + f"\n\n⚠️ *The answer was cut off by an error ({e}). Please ask again.*"
+
 def get_suggested_questions() -> list:
     """Get suggested questions for the chat"""
     if rag_system:
@@ -1733,19 +1748,19 @@ with gr.Blocks(title="Microfinance Agents System", theme=gr.themes.Soft()) as ap
 
 **Or ask your own question!**"""
             
-            # Chat functionality
+            # Chat functionality (streamed: the answer appears as it is generated)
             def respond_to_financial_query(message, history):
                 if not message.strip():
-                    return history, ""
-                
-                # Get response from RAG system
-                response = get_rag_chat_response(message)
+                    yield history, ""
+                    return
                 
-                # Update history
                 history = history or []
-                history.append([message, response])
+                history.append([message, ""])
                 
-                return history, ""
+                # Update the last reply with each new piece from the RAG system
+                for response in stream_rag_chat_response(message):
+                    history[-1][1] = response
+                    yield history, ""
             
             def clear_financial_chat():
                 if rag_system:
@@ -0,0 +1,257 @@
+"""
+Offline Geocoding
+Resolves Indian addresses to coordinates from a bundled gazetteer of cities, districts
+and pincode regions, with a persistent SQLite cache in front of the (opt-in) network geocoder
+"""
+
+import csv
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+GAZETTEER_PATH = os.path.join(DATA_DIR, 'india_gazetteer.csv')
+DEFAULT_CACHE_PATH = os.path.join(DATA_DIR, 'geocode_cache.db')
+
+# Words that qualify an address part rather than name a place ("Tumkur District")
+QUALIFIER_WORDS = {'district', 'dist', 'taluk', 'taluka', 'tehsil', 'mandal', 'city', 'town', 'village'}
+
+# Six digits, possibly written as 'NNN NNN' or glued to the city name ('Delhi110002')
+PINCODE_PATTERN = re.compile(r'(?<!\d)(\d{3}) ?(\d{3})(?!\d)')
+
+# Upper bound on remembered lookups before the in-memory table is reset
+MEMO_LIMIT = 100000
+
+# How long a network miss is trusted before the address is tried again
+MISS_TTL = timedelta(days=7)
+
+Coordinates = Tuple[Optional[float], Optional[float]]
+
+
+def normalize_address(address: str) -> str:
+    """Cache key for an address: lower case, punctuation folded to spaces, trailing 'India' dropped"""
+    parts = []
+    for part in str(address or '').lower().split(','):
+        part = ' '.join(re.sub(r'[^\w\u0900-\u0DFF ]+', ' ', part).split())
+        if part:
+            parts.append(part)
+    while parts and parts[-1] == 'india':
+        parts.pop()
+    return ', '.join(parts)
+
+
+class Gazetteer:
+    """Bundled place names and pincode prefixes with approximate coordinates"""
+
+    def __init__(self, path: str = GAZETTEER_PATH):
+        self.places: Dict[str, Tuple[float, float]] = {}
+        self.pincodes: Dict[str, Tuple[float, float]] = {}
+        try:
+            with open(path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    target = self.pincodes if row['kind'] == 'pincode' else self.places
+                    target[row['key']] = (float(row['latitude']), float(row['longitude']))
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Could not load gazetteer {path}: {e}")
+
+    @staticmethod
+    def _place_name(part: str) -> str:
+        return ' '.join(word for word in part.split() if word not in QUALIFIER_WORDS)
+
+    def lookup(self, normalized: str) -> Optional[Tuple[float, float, str]]:
+        """Coordinates for a normalized address, or None if no known place or pincode is in it"""
+        return self.lookup_place(normalized) or self.lookup_pincode(normalized)
+
+    def lookup_place(self, normalized: str) -> Optional[Tuple[float, float, str]]:
+        """Coordinates of a known city or district named in the address"""
+        # Whole address parts naming a known place, most specific part first
+        for part in normalized.split(', '):
+            coordinates = self.places.get(self._place_name(part))
+            if coordinates:
+                return coordinates + ('gazetteer',)
+
+        # Place names inside free text, scanning from the (more general) end
+        words = normalized.replace(',', ' ').split()
+        for end in range(len(words), 0, -1):
+            for size in (3, 2, 1):
+                if end - size >= 0:
+                    coordinates = self.places.get(' '.join(words[end - size:end]))
+                    if coordinates:
+                        return coordinates + ('gazetteer',)
+        return None
+
+    def lookup_pincode(self, normalized: str) -> Optional[Tuple[float, float, str]]:
+        """Centroid of the pincode region (longest known 2-3 digit prefix); coarse"""
+        match = PINCODE_PATTERN.search(normalized)
+        if match:
+            pincode = match.group(1) + match.group(2)
+            for length in (3, 2):
+                coordinates = self.pincodes.get(pincode[:length])
+                if coordinates:
+                    return coordinates + ('pincode',)
+        return None
+
+
+class GeocodeCache:
+    """Persistent normalized address -> coordinates table, mirrored in memory
+
+    Network misses (source 'miss') expire after ``miss_ttl`` so the address is
+    tried again; answers are kept.
+    """
+
+    def __init__(self, path: str, miss_ttl: timedelta = MISS_TTL):
+        self.path = path
+        self.miss_ttl = miss_ttl
+        self._entries: Dict[str, Tuple] = {}
+        self._lock = threading.Lock()
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocodes (
+                    address TEXT PRIMARY KEY,
+                    latitude REAL,
+                    longitude REAL,
+                    source TEXT,
+                    updated_at TEXT
+                )
+            """)
+            self._conn.commit()
+            for address, latitude, longitude, source, updated_at in self._conn.execute(
+                "SELECT address, latitude, longitude, source, updated_at FROM geocodes"
+            ):
+                self._entries[address] = (latitude, longitude, source, updated_at)
+        except sqlite3.Error as e:
+            print(f"Geocode cache unavailable at {path}: {e}")
+            self._conn = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, address: str) -> Optional[Tuple]:
+        """(latitude, longitude, source), or None if unknown or an expired miss"""
+        entry = self._entries.get(address)
+        if entry is None:
+            return None
+        latitude, longitude, source, updated_at = entry
+        if source == 'miss' and self._expired(updated_at):
+            return None
+        return latitude, longitude, source
+
+    def _expired(self, updated_at: Optional[str]) -> bool:
+        try:
+            return datetime.now() - datetime.fromisoformat(updated_at) > self.miss_ttl
+        except (TypeError, ValueError):
+            return True
+
+    def put(self, address: str, latitude: Optional[float], longitude: Optional[float], source: str):
+        updated_at = datetime.now().isoformat()
+        self._entries[address] = (latitude, longitude, source, updated_at)
+        if self._conn is None:
+            return
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?)",
+                    (address, latitude, longitude, source, updated_at)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing geocode cache: {e}")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class OfflineGeocoder:
+    """Address -> coordinates without depending on the network
+
+    Sources are tried from most to least precise: earlier network answers in
+    the persistent cache, gazetteer city/district names, the network geocoder
+    (only with ``online=True`` or GEOCODE_ONLINE=1), and last the centroid of
+    the address's pincode region. Network answers and misses are cached, misses
+    for MISS_TTL. Settled lookups are remembered in memory, so repeat lookups
+    are a dict hit.
+    """
+
+    def __init__(self, geolocator=None, online: bool = None, cache_path: str = None,
+                 gazetteer_path: str = GAZETTEER_PATH):
+        if online is None:
+            online = os.getenv('GEOCODE_ONLINE', '').lower() in ('1', 'true', 'yes')
+        self.geolocator = geolocator
+        self.online = bool(online and geolocator is not None)
+        self.gazetteer = Gazetteer(gazetteer_path)
+        self.cache = GeocodeCache(cache_path or os.getenv('GEOCODE_CACHE_PATH', DEFAULT_CACHE_PATH))
+        self._memo: Dict[str, Tuple] = {}
+
+    def geocode(self, address: str) -> Coordinates:
+        """(latitude, longitude) for an address, or (None, None) if it cannot be placed"""
+        latitude, longitude, _ = self.locate(address)
+        return latitude, longitude
+
+    def locate(self, address: str) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+        """(latitude, longitude, source); source is 'network', 'gazetteer', 'pincode' or a miss"""
+        key = normalize_address(address)
+        if not key:
+            return None, None, None
+        found = self._memo.get(key)
+        if found is None:
+            found, settled = self._resolve(key, address)
+            if settled:
+                if len(self._memo) >= MEMO_LIMIT:
+                    self._memo.clear()
+                self._memo[key] = found
+        return found
+
+    def _resolve(self, key: str, address: str) -> Tuple[Tuple, bool]:
+        """Best available coordinates, and whether they are final for this process
+
+        Lookups that depend on a network miss or failure are not final, so they
+        are retried once the miss expires (or on the next call after a failure).
+        """
+        cached = self.cache.get(key)
+        if cached is not None and cached[2] == 'network':
+            return cached, True
+        found = self.gazetteer.lookup_place(key)
+        if found:
+            return found, True
+
+        settled = True
+        if self.online:
+            settled = False
+            if cached is None:
+                try:
+                    location = self._geocode_online(address)
+                except Exception as e:
+                    print(f"Network geocoding failed for '{address}': {e}")
+                    location = False
+                if location:
+                    self.cache.put(key, location[0], location[1], 'network')
+                    return self.cache.get(key), True
+                if location is None:
+                    self.cache.put(key, None, None, 'miss')
+
+        # Region centroid only when nothing more precise places the address
+        found = self.gazetteer.lookup_pincode(key)
+        if found:
+            return found, settled
+        return (None, None, 'miss' if self.online else 'offline'), settled
+
+    def _geocode_online(self, address: str) -> Optional[Tuple[float, float]]:
+        """Full address, then shorter trailing parts, then first part + India"""
+        parts = [part.strip() for part in address.split(',') if part.strip()]
+        queries = [address] + [', '.join(parts[i:]) for i in range(1, len(parts))]
+        if parts:
+            queries.append(f"{parts[0]}, India")
+        for query in queries:
+            location = self.geolocator.geocode(query, timeout=10)
+            if location:
+                return location.latitude, location.longitude
+        return None
+
+    def close(self):
+        self.cache.close()
@@ -0,0 +1,160 @@
+"""
+Lender Spatial Index
+Grid index over lender coordinates that answers "lenders within R km of a point,
+nearest first" with one vectorized haversine pass over the nearby grid cells only
+"""
+
+import numpy as np
+from typing import Optional, Sequence, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km from one point to arrays of points (degrees)"""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class LenderSpatialIndex:
+    """Fixed-size lat/lon grid over lender rows
+
+    Rows are sorted by grid cell once at build time. A radius query selects the
+    cells whose extent can reach the circle, expands them back to row ids with a
+    single ``np.repeat`` and computes exact haversine distances for those rows
+    only. Rows without coordinates are never returned.
+    """
+
+    def __init__(self, latitudes: Sequence[float], longitudes: Sequence[float], cell_degrees: float = 0.5):
+        lats = np.asarray(latitudes, dtype=float)
+        lons = np.asarray(longitudes, dtype=float)
+        self.size = len(lats)
+        self.cell_degrees = cell_degrees
+        self.latitudes = lats
+        self.longitudes = lons
+
+        valid = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+        cell_lat = np.floor(lats[valid] / cell_degrees).astype(np.int64)
+        cell_lon = np.floor(lons[valid] / cell_degrees).astype(np.int64)
+        order = np.lexsort((cell_lon, cell_lat))
+        self._rows = valid[order]
+
+        # One entry per occupied cell: its centre and how many rows it holds
+        keys = np.stack([cell_lat[order], cell_lon[order]], axis=1)
+        cells, counts = np.unique(keys, axis=0, return_counts=True)
+        self._cell_centre_lat = (cells[:, 0] + 0.5) * cell_degrees
+        self._cell_centre_lon = (cells[:, 1] + 0.5) * cell_degrees
+        self._cell_counts = counts
+
+    @property
+    def indexed_count(self) -> int:
+        return len(self._rows)
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Row ids in grid cells that may hold points within radius_km"""
+        half_cell = self.cell_degrees / 2
+        dlat = radius_km / KM_PER_DEGREE
+        near = np.abs(self._cell_centre_lat - lat) <= dlat + half_cell
+
+        # Longitude degrees shrink towards the poles; use the most poleward latitude reached
+        max_lat = min(abs(lat) + dlat, 90.0)
+        if max_lat < 89.0:
+            dlon = dlat / np.cos(np.radians(max_lat))
+            if dlon < 180:
+                delta = (self._cell_centre_lon - lon + 180) % 360 - 180
+                near &= np.abs(delta) <= dlon + half_cell
+
+        return self._rows[np.repeat(near, self._cell_counts)]
+
+    def query_radius(self, lat: float, lon: float, radius_km: float,
+                     mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows within radius_km (optionally restricted to a boolean row mask), nearest first"""
+        rows = self._candidates(lat, lon, radius_km)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        distances = haversine_km(lat, lon, self.latitudes[rows], self.longitudes[rows])
+        keep = distances <= radius_km
+        rows, distances = rows[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return rows[order], distances[order]
+
+    def nearest(self, lat: float, lon: float, k: int, radii: Sequence[float],
+                mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, float]:
+        """Smallest radius in ``radii`` holding at least k rows, and all rows within it
+
+        One query at the largest radius; the returned radius is the first that
+        reaches k rows (or the largest if none does).
+        """
+        rows, distances = self.query_radius(lat, lon, max(radii), mask)
+        counts = np.searchsorted(distances, radii, side='right')
+        reached = np.flatnonzero(counts >= k)
+        pick = int(reached[0]) if len(reached) else len(radii) - 1
+        return rows[:counts[pick]], distances[:counts[pick]], radii[pick]
+
+    def nearest_many(self, latitudes: Sequence[float], longitudes: Sequence[float], k: int,
+                     radii: Sequence[float], mask: Optional[np.ndarray] = None,
+                     tie_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """The k nearest rows within max(radii) for many points at once
+
+        Points are grouped by grid cell; each group shares one candidate set and
+        one distance matrix, trying the radii in order until every point in the
+        group has k rows (or the largest radius is reached). With ``tie_km``, rows
+        whose distance rounds (to tie_km) to the k-th distance are kept as well,
+        so callers can break distance ties on their own key. Returns (n, width)
+        arrays of rows and distances, nearest first, padded with -1 and inf.
+        """
+        lats = np.asarray(latitudes, dtype=float)
+        lons = np.asarray(longitudes, dtype=float)
+        points = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+        if not len(points):
+            return np.full((len(lats), k), -1, dtype=np.int64), np.full((len(lats), k), np.inf)
+
+        cells = np.stack([np.floor(lats[points] / self.cell_degrees),
+                          np.floor(lons[points] / self.cell_degrees)], axis=1)
+        _, group_of = np.unique(cells, axis=0, return_inverse=True)
+        group_of = group_of.ravel()
+        order = np.argsort(group_of, kind='stable')
+        groups = np.split(points[order], np.flatnonzero(np.diff(group_of[order])) + 1)
+
+        # Farthest a point can be from its cell centre
+        slack_km = self.cell_degrees * KM_PER_DEGREE / np.sqrt(2)
+        found = []
+        for group in groups:
+            centre_lat = (np.floor(lats[group[0]] / self.cell_degrees) + 0.5) * self.cell_degrees
+            centre_lon = (np.floor(lons[group[0]] / self.cell_degrees) + 0.5) * self.cell_degrees
+            for radius in radii:
+                rows = self._candidates(centre_lat, centre_lon, radius + slack_km)
+                if mask is not None:
+                    rows = rows[mask[rows]]
+                distances = haversine_km(lats[group, None], lons[group, None],
+                                         self.latitudes[rows], self.longitudes[rows])
+                distances[distances > radius] = np.inf
+                if radius == radii[-1] or np.isfinite(distances).sum(axis=1).min() >= k:
+                    break
+
+            width = min(k, len(rows))
+            if tie_km and len(rows) > k:
+                kth = np.partition(distances, k - 1, axis=1)[:, k - 1:k]
+                distances[np.rint(distances / tie_km) > np.rint(kth / tie_km)] = np.inf
+                width = max(k, int(np.isfinite(distances).sum(axis=1).max()))
+
+            if width < len(rows):
+                top = np.argpartition(distances, width - 1, axis=1)[:, :width]
+            else:
+                top = np.broadcast_to(np.arange(len(rows)), (len(group), len(rows)))
+            top_distances = np.take_along_axis(distances, top, axis=1)
+            ranked = np.argsort(top_distances, axis=1, kind='stable')
+            top_distances = np.take_along_axis(top_distances, ranked, axis=1)
+            top_rows = np.where(np.isfinite(top_distances), rows[np.take_along_axis(top, ranked, axis=1)], -1)
+            found.append((group, top_rows, top_distances))
+
+        width = max(k, max(top_rows.shape[1] for _, top_rows, _ in found))
+        rows_out = np.full((len(lats), width), -1, dtype=np.int64)
+        distances_out = np.full((len(lats), width), np.inf)
+        for group, top_rows, top_distances in found:
+            rows_out[group, :top_rows.shape[1]] = top_rows
+            distances_out[group, :top_rows.shape[1]] = top_distances
+        return rows_out, distances_out
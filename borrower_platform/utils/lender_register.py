@@ -0,0 +1,256 @@
+"""
+Lender Register Artifact
+Converts the RBI NBFC/ARC register (XLSX) into a compact columnar artifact with
+coordinates and loan-type codes, rebuilt only when the source file changes
+
+Build ahead of time with: python borrower_platform/utils/lender_register.py [register.xlsx]
+"""
+
+import glob
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.geocoding import DATA_DIR, GAZETTEER_PATH, OfflineGeocoder
+
+# Bump when the parsing or the artifact layout changes
+REGISTER_FORMAT = 2
+
+# Loan types and the specialization keywords that indicate them
+LOAN_TYPE_KEYWORDS = {
+    "agriculture": ["agricultural", "farm", "crop", "kisan", "rural"],
+    "micro_business": ["micro", "business", "sme", "msme", "enterprise"],
+    "housing": ["housing", "home", "property", "real estate"],
+    "education": ["education", "student", "study"],
+    "vehicle": ["vehicle", "auto", "car", "bike", "transport"],
+    "personal": ["personal", "individual", "consumer"],
+    "gold": ["gold", "jewel", "ornament"],
+    "equipment": ["equipment", "machinery", "tools"]
+}
+
+# One bit per loan type in the loan_type_codes column
+LOAN_TYPE_BITS = {loan_type: 1 << i for i, loan_type in enumerate(LOAN_TYPE_KEYWORDS)}
+
+# Register column name variations mapped to standard names
+COLUMN_MAPPING = {
+    'entity_name': 'name',
+    'company_name': 'name',
+    'nbfc_name': 'name',
+    'institution_name': 'name',
+    'entity_type': 'type',
+    'company_type': 'type',
+    'classification': 'type',
+    'registered_office_address': 'address',
+    'address': 'address',
+    'registered_office': 'address',
+    'place': 'city',
+    'location': 'city',
+    'head_office': 'city',
+    'registration_date': 'registration_date',
+    'date_of_registration': 'registration_date',
+    'email_id': 'email'
+}
+
+KNOWN_CITIES = ['bangalore', 'bengaluru', 'mysore', 'tumkur', 'mandya', 'hassan',
+                'nellore', 'guntur', 'hyderabad', 'chennai', 'coimbatore']
+
+
+def _clean_column(name) -> str:
+    return str(name).strip().lower().replace(' ', '_').replace('/', '_').replace('-', '_')
+
+
+def extract_city_from_address(address: str) -> str:
+    """Extract city name from address string"""
+    if pd.isna(address) or not isinstance(address, str):
+        return 'Unknown'
+
+    # Split by comma and look for known cities
+    parts = [part.strip() for part in address.strip().split(',')]
+    for part in parts:
+        for city in KNOWN_CITIES:
+            if city in part.lower():
+                return part.title()
+
+    # If no known city found, return the first part
+    return parts[0].title() if parts else 'Unknown'
+
+
+def determine_specialization(entity_type: str) -> str:
+    """Determine specialization based on entity type"""
+    if pd.isna(entity_type):
+        return 'General'
+
+    entity_type = str(entity_type).lower()
+    if any(word in entity_type for word in ['bank', 'cooperative', 'rural']):
+        return 'Agriculture,Rural Development,MSME'
+    elif 'nbfc' in entity_type:
+        return 'Personal,Business,Vehicle'
+    elif 'arc' in entity_type:
+        return 'Asset Reconstruction,Recovery'
+    else:
+        return 'General,Personal,Business'
+
+
+def loan_type_codes(specialization: pd.Series) -> pd.Series:
+    """Bitmask of LOAN_TYPE_BITS per lender whose specialization mentions that loan type"""
+    text = specialization.astype(str).str.lower()
+    codes = pd.Series(0, index=specialization.index, dtype='int64')
+    for loan_type, keywords in LOAN_TYPE_KEYWORDS.items():
+        matches = pd.Series(False, index=specialization.index)
+        for keyword in keywords:
+            matches |= text.str.contains(keyword, regex=False)
+        codes[matches] |= LOAN_TYPE_BITS[loan_type]
+    return codes
+
+
+def read_register(excel_path: str) -> pd.DataFrame:
+    """Parse the first sheet of the register into standard columns (no coordinates yet)"""
+    raw = pd.read_excel(excel_path, sheet_name=0, header=None)
+
+    # The sheet starts with a title row; the header is the first row naming known columns
+    header_row = 0
+    for i in range(min(len(raw), 10)):
+        if any(_clean_column(value) in COLUMN_MAPPING for value in raw.iloc[i]):
+            header_row = i
+            break
+    df = raw.iloc[header_row + 1:].reset_index(drop=True)
+    df.columns = [_clean_column(value) for value in raw.iloc[header_row]]
+
+    for old_name, new_name in COLUMN_MAPPING.items():
+        if old_name in df.columns and new_name not in df.columns:
+            df = df.rename(columns={old_name: new_name})
+
+    df = df.dropna(subset=['name'])
+    df = df[df['name'].astype(str).str.strip() != ''].reset_index(drop=True)
+
+    if 'address' in df.columns and ('city' not in df.columns or df['city'].isna().all()):
+        df['city'] = df['address'].apply(extract_city_from_address)
+    if 'state' not in df.columns:
+        df['state'] = 'Karnataka'  # Default state
+
+    # Default loan amounts and interest rates if missing
+    defaults = {'min_loan_amount': 10000, 'max_loan_amount': 1000000,
+                'interest_rate_min': 10.0, 'interest_rate_max': 18.0}
+    for column, value in defaults.items():
+        if column not in df.columns:
+            df[column] = value
+
+    if 'specialization' not in df.columns:
+        df['specialization'] = df['type'].apply(determine_specialization)
+    df['loan_type_codes'] = loan_type_codes(df['specialization'])
+    return df
+
+
+def add_coordinates(df: pd.DataFrame, geocoder: OfflineGeocoder) -> pd.DataFrame:
+    """Latitude/longitude per lender from its address, falling back to city and state
+    when the address cannot be placed or only by its pincode region"""
+    latitudes, longitudes = [], []
+    addresses = df['address'] if 'address' in df.columns else pd.Series(None, index=df.index)
+    for address, city, state in zip(addresses, df['city'], df['state']):
+        latitude, longitude, source = geocoder.locate(address) if isinstance(address, str) else (None, None, None)
+        if (latitude is None or source == 'pincode') and isinstance(city, str) and city:
+            city_latitude, city_longitude, city_source = geocoder.locate(f"{city}, {state}, India")
+            if city_latitude is not None and (latitude is None or city_source != 'pincode'):
+                latitude, longitude = city_latitude, city_longitude
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+    df['latitude'] = pd.Series(latitudes, index=df.index, dtype='float64')
+    df['longitude'] = pd.Series(longitudes, index=df.index, dtype='float64')
+    return df
+
+
+def register_key(excel_path: str) -> str:
+    """Hash of the register, the gazetteer and REGISTER_FORMAT (changes if any of them do)"""
+    digest = hashlib.sha256(f"format={REGISTER_FORMAT}".encode())
+    for path in (excel_path, GAZETTEER_PATH):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def artifact_path(key: str, artifact_dir: str = DATA_DIR) -> str:
+    return os.path.join(artifact_dir, f"lender_register.{key}.marshal")
+
+
+def _plain(value):
+    # marshal only handles builtin types (NaN floats are fine)
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def write_artifact(df: pd.DataFrame, path: str):
+    """Columnar dump (column name -> list of builtin values), written atomically
+
+    The temp file gets a unique name, so processes building the artifact at the
+    same time do not write (and rename) the same file.
+    """
+    columns: Dict[str, List] = {}
+    for column in df.columns:
+        values = df[column].tolist()
+        columns[column] = values if df[column].dtype != object else [_plain(value) for value in values]
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or '.', prefix=f"{os.path.basename(path)}.", suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(marshal.dumps({'format': REGISTER_FORMAT, 'columns': list(df.columns), 'data': columns}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)  # mkstemp creates the file private
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_artifact(path: str) -> Optional[pd.DataFrame]:
+    try:
+        with open(path, 'rb') as f:
+            state = marshal.loads(f.read())
+        if state.get('format') != REGISTER_FORMAT:
+            return None
+        return pd.DataFrame(state['data'], columns=state['columns'])
+    except (OSError, EOFError, ValueError, TypeError, KeyError) as e:
+        print(f"Ignoring unreadable lender register artifact {path}: {e}")
+        return None
+
+
+def build_lender_register(excel_path: str, geocoder: OfflineGeocoder = None, artifact_dir: str = DATA_DIR) -> pd.DataFrame:
+    """Parse and geocode the register, write its artifact and remove stale ones"""
+    key = register_key(excel_path)
+    df = add_coordinates(read_register(excel_path), geocoder or OfflineGeocoder())
+    path = artifact_path(key, artifact_dir)
+    write_artifact(df, path)
+    for stale in glob.glob(os.path.join(artifact_dir, "lender_register.*.marshal")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass  # removed by another process building the same artifact
+    return df
+
+
+def load_lender_register(excel_path: str, geocoder: OfflineGeocoder = None, artifact_dir: str = DATA_DIR) -> pd.DataFrame:
+    """Lender register from its artifact, rebuilding it first if the source changed"""
+    df = read_artifact(artifact_path(register_key(excel_path), artifact_dir))
+    if df is None:
+        print(f"Building lender register artifact from {excel_path}...")
+        df = build_lender_register(excel_path, geocoder, artifact_dir)
+    return df
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "NBFCsandARCs10012023.XLSX"
+    register = build_lender_register(source)
+    located = int(register['latitude'].notna().sum())
+    print(f"Built lender register artifact: {len(register)} lenders, {located} with coordinates")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Async Chat Load Test
+Starts a mock OpenAI-compatible LLM server that answers after a fixed delay, points the
+shared LLM gateway at it and sends waves of concurrent /agents/chat requests to the API
+(in-process over ASGI). Each Hindi chat makes three LLM calls: translate, answer, translate
+back. For comparison the same waves are run through the blocking agent method on the
+40-thread pool that sync endpoints get.
+
+Usage: python load_test_async.py [llm_latency_ms] [concurrency ...]
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import zlib
+from typing import List
+
+import anyio
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+
+# Add paths
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_LEVELS = [1, 10, 50, 100, 200, 400]
+
+
+def mock_llm_app(latency: float) -> FastAPI:
+    """Chat completions endpoint that answers after `latency` seconds (distinct prompts, distinct replies)"""
+    mock = FastAPI()
+
+    @mock.post("/openai/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        content = body["messages"][-1]["content"]
+        return {
+            "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f"mock reply {zlib.crc32(content.encode()):08x}"}}],
+            "usage": {"prompt_tokens": len(content) // 4, "completion_tokens": 4, "total_tokens": len(content) // 4 + 4}
+        }
+
+    return mock
+
+
+def start_mock_server(latency: float) -> subprocess.Popen:
+    """Run the mock LLM server in its own process (so it does not share the GIL with the API)"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--mock-server", str(port), str(latency)])
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            httpx.get(url, timeout=0.5)
+            break
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    process.url = url
+    return process
+
+
+def summarize(label: str, concurrency: int, elapsed: float, latencies: List[float]):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"{label:<6} {concurrency:>6} {concurrency / elapsed:>10.1f} "
+          f"{1000 * statistics.median(latencies):>10.0f} {1000 * p95:>10.0f}")
+
+
+async def async_wave(client: httpx.AsyncClient, user_id: str, concurrency: int, wave: int):
+    async def chat(i: int) -> float:
+        start = time.perf_counter()
+        response = await client.post("/agents/chat", json={
+            "user_id": user_id, "message": f"Loan question {wave}-{i}", "language": "hindi"
+        })
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(chat(i) for i in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+async def sync_wave(agent, concurrency: int, wave: int):
+    profile = {"preferred_language": "hindi"}
+
+    async def chat(i: int) -> float:
+        start = time.perf_counter()
+        # Same thread pool (40 workers) that FastAPI uses for plain `def` endpoints
+        await anyio.to_thread.run_sync(agent.process_voice_query, f"Sync loan question {wave}-{i}", profile)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(chat(i) for i in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+async def run(levels: List[int]):
+    import api_server
+
+    # Per-request INFO lines from httpx would dominate the output (and the CPU time)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if not api_server.agents.get('voice'):
+        print("Voice assistant agent could not be initialized; see the log above")
+        return
+
+    user_id = "load_test_user"
+    api_server.user_database[user_id] = {"user_id": user_id, "name": "Load Test", "preferred_language": "hindi"}
+
+    print(f"{'mode':<6} {'conc.':>6} {'chats/s':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    transport = httpx.ASGITransport(app=api_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=300) as client:
+        for wave, concurrency in enumerate(levels):
+            elapsed, latencies = await async_wave(client, user_id, concurrency, wave)
+            summarize("async", concurrency, elapsed, latencies)
+    for wave, concurrency in enumerate(levels):
+        elapsed, latencies = await sync_wave(api_server.agents['voice'], concurrency, wave)
+        summarize("sync", concurrency, elapsed, latencies)
+
+    print("\nLLM usage per agent:", api_server.llm_usage_metrics())
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--mock-server":
+        uvicorn.run(mock_llm_app(float(sys.argv[3])), host="127.0.0.1", port=int(sys.argv[2]),
+                    log_level="warning", backlog=4096, timeout_keep_alive=300)
+        return
+
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.2
+    levels = [int(level) for level in sys.argv[2:]] or DEFAULT_LEVELS
+
+    # Point every agent at the mock server before the API (and its agents) are imported
+    mock_server = start_mock_server(latency)
+    os.environ["LLM_BASE_URL"] = mock_server.url
+    os.environ.setdefault("GROQ_API_KEY", "mock-key")
+    os.environ.setdefault("ASSEMBLYAI_API_KEY", "mock-key")
+    # Measure LLM calls, not cache hits (and keep mock answers out of the response cache)
+    os.environ["LLM_CACHE"] = "0"
+    print(f"Mock LLM at {mock_server.url} answering in {latency * 1000:.0f} ms\n")
+
+    try:
+        asyncio.run(run(levels))
+    finally:
+        mock_server.terminate()
+
+
+if __name__ == "__main__":
+    main()
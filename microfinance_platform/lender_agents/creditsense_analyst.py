@@ -8,7 +8,6 @@ import json
 import sys
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
-from groq import Groq
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -16,14 +15,35 @@ load_dotenv()
 
 # Add borrower platform to path for data access
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'borrower_platform'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from shared_data.amortization import calculate_emi
+from shared_data.llm_batching import batch_schema_prompt, map_batched
+from shared_data.llm_gateway import get_llm_client
+from shared_data.prompt_builder import (PromptBuilder, compact_json, count_tokens, format_fields, prompt_budget,
+                                        truncate_text)
+
+
+def _rupees(value):
+    return f"₹{value:,}" if isinstance(value, (int, float)) else value
 
 class CreditSenseAnalyst:
+    # One result per borrower in batched recommendation prompts
+    RECOMMENDATION_SCHEMA = {
+        "id": "borrower id as given",
+        "decision": "Approve/Conditional/Reject",
+        "suggested_loan_amount": "amount in rupees, or null if not approved",
+        "rationale": "one or two sentences",
+        "risk_mitigation": ["specific action to reduce risk"],
+        "monitoring": ["what to track post-disbursement"]
+    }
+    
     def __init__(self, groq_api_key: str = None):
         self.groq_api_key = groq_api_key or os.getenv('GROQ_API_KEY')
         if not self.groq_api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables")
             
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("CreditSenseAnalyst", self.groq_api_key)
         self.model = os.getenv('MODEL_NAME', "meta-llama/llama-4-maverick-17b-128e-instruct")
         
         # Risk thresholds and weights
@@ -306,43 +326,31 @@ class CreditSenseAnalyst:
         """Generate AI-powered recommendations using LLM"""
         
         try:
-            prompt = f"""
-You are a senior credit analyst at a microfinance institution with 15+ years of experience in rural lending in India. 
-
-Analyze this borrower profile and provide actionable recommendations:
-
-BORROWER PROFILE:
-- Name: {borrower_data.get('personal_details', {}).get('name', 'N/A')}
-- Monthly Income: ₹{borrower_data.get('personal_details', {}).get('monthly_income', 0):,}
-- Loan Amount: ₹{borrower_data.get('loan_application', {}).get('loan_amount', 0):,}
-- Collateral Value: ₹{borrower_data.get('loan_application', {}).get('collateral_value', 0):,}
-- Age: {borrower_data.get('personal_details', {}).get('age', 'N/A')}
-- Occupation: {borrower_data.get('personal_details', {}).get('occupation', 'N/A')}
-- Location: {borrower_data.get('personal_details', {}).get('location', 'N/A')}
-- Previous Loans: {borrower_data.get('credit_history', {}).get('previous_loans', 0)}
-- Repayment Score: {borrower_data.get('credit_history', {}).get('repayment_score', 0)}%
-
-RISK ASSESSMENT:
-- Composite Risk Score: {risk_score:.2f}/1.00
-- Risk Category: {risk_category}
-- Risk Flags: {', '.join(risk_flags) if risk_flags else 'None'}
-
-MFI PERFORMANCE NOTES:
-{borrower_data.get('mfi_comments', {}).get('performance_notes', 'No performance notes available')}
-
-Please provide:
+            # Only the fields this borrower has; long MFI notes are cut to fit the prompt budget
+            builder = PromptBuilder("CreditSenseAnalyst")
+            builder.add("""You are a senior credit analyst at a microfinance institution with 15+ years of experience in rural lending in India.
+
+Analyze this borrower profile and provide actionable recommendations:""")
+            builder.add(format_fields(self._profile_fields(borrower_data)), heading="BORROWER PROFILE:")
+            builder.add(format_fields({
+                "Composite Risk Score": f"{risk_score:.2f}/1.00",
+                "Risk Category": risk_category,
+                "Risk Flags": ', '.join(risk_flags) if risk_flags else 'None'
+            }), heading="RISK ASSESSMENT:")
+            builder.add_flexible(borrower_data.get('mfi_comments', {}).get('performance_notes') or '',
+                                 heading="MFI PERFORMANCE NOTES:", min_tokens=60)
+            builder.add("""Please provide:
 1. LENDING RECOMMENDATION (Approve/Conditional/Reject with rationale)
 2. SUGGESTED LOAN AMOUNT (if approval recommended)
 3. RISK MITIGATION STRATEGIES (specific actions to reduce risk)
 4. MONITORING REQUIREMENTS (what to track post-disbursement)
 5. ALTERNATIVE PRODUCTS (if standard loan not suitable)
 
-Keep recommendations practical and specific to Indian microfinance context.
-"""
+Keep recommendations practical and specific to Indian microfinance context.""")
 
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}],
+                messages=[{"role": "user", "content": builder.build()}],
                 max_tokens=800,
                 temperature=0.7
             )
@@ -352,6 +360,104 @@ Keep recommendations practical and specific to Indian microfinance context.
         except Exception as e:
             return f"Unable to generate AI recommendations: {str(e)}"
     
+    def _profile_fields(self, borrower_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Borrower fields the recommendation prompts show (empty ones are left out later)"""
+        personal = borrower_data.get('personal_details', {})
+        loan = borrower_data.get('loan_application', {})
+        credit = borrower_data.get('credit_history', {})
+        repayment_score = credit.get('repayment_score')
+        return {
+            "Name": personal.get('name'),
+            "Monthly Income": _rupees(personal.get('monthly_income')),
+            "Loan Amount": _rupees(loan.get('loan_amount')),
+            "Collateral Value": _rupees(loan.get('collateral_value')),
+            "Age": personal.get('age'),
+            "Occupation": personal.get('occupation'),
+            "Location": personal.get('location'),
+            "Previous Loans": credit.get('previous_loans'),
+            "Repayment Score": f"{repayment_score}%" if repayment_score is not None else None
+        }
+    
+    def generate_recommendations_batch(self, assessments: List[Dict[str, Any]], batch_size: int = None) -> List[str]:
+        """
+        generate_recommendations for many borrowers, several borrowers per LLM call
+        
+        Borrowers are packed into batches of up to batch_size (LLM_BATCH_SIZE) that fit the
+        CreditSenseAnalystBatch prompt budget, and the model answers with one JSON result per
+        borrower. Borrowers whose result is missing or unreadable get a single call.
+        
+        Args:
+            assessments: Dicts with borrower_data, risk_score, risk_category and risk_flags
+            batch_size: Borrowers per call
+            
+        Returns:
+            One recommendation text per assessment, in input order
+        """
+        entries_budget = prompt_budget("CreditSenseAnalystBatch") - count_tokens(self._batch_instructions())
+        return map_batched(
+            assessments,
+            ask_batch=self._ask_recommendations_batch,
+            convert=self._format_batch_recommendation,
+            ask_one=lambda assessment: self.generate_recommendations(
+                assessment['borrower_data'], assessment['risk_score'],
+                assessment['risk_category'], assessment['risk_flags']),
+            size=batch_size,
+            max_tokens=entries_budget,
+            cost=lambda assessment: count_tokens(self._batch_entry("B000", assessment))
+        )
+    
+    def _batch_instructions(self) -> str:
+        return f"""You are a senior credit analyst at a microfinance institution with 15+ years of experience in rural lending in India.
+
+Give an actionable lending recommendation for each borrower below. Each line is one borrower as JSON, with its risk assessment.
+
+{batch_schema_prompt(self.RECOMMENDATION_SCHEMA)}
+
+Keep recommendations practical and specific to Indian microfinance context."""
+    
+    def _batch_entry(self, key: str, assessment: Dict[str, Any]) -> str:
+        notes = assessment['borrower_data'].get('mfi_comments', {}).get('performance_notes') or ''
+        return compact_json({
+            "id": key,
+            **self._profile_fields(assessment['borrower_data']),
+            "Risk Score": f"{assessment['risk_score']:.2f}/1.00",
+            "Risk Category": assessment['risk_category'],
+            "Risk Flags": assessment['risk_flags'],
+            "MFI Notes": truncate_text(notes, 60)
+        })
+    
+    def _ask_recommendations_batch(self, keyed: List[Tuple[str, Dict[str, Any]]]) -> str:
+        builder = PromptBuilder("CreditSenseAnalystBatch")
+        builder.add(self._batch_instructions())
+        builder.add("\n".join(self._batch_entry(key, assessment) for key, assessment in keyed), heading="BORROWERS:")
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": builder.build()}],
+            max_tokens=min(4000, 250 * len(keyed)),
+            temperature=0.3,
+            priority="batch"
+        )
+        return response.choices[0].message.content
+    
+    def _format_batch_recommendation(self, result: Dict[str, Any], assessment: Dict[str, Any]) -> str:
+        """Batched result object as recommendation text"""
+        decision = result["decision"]
+        if not isinstance(decision, str) or not decision.strip():
+            raise ValueError("no decision")
+        lines = [f"**Lending Recommendation**: {decision.strip()}"]
+        amount = result.get("suggested_loan_amount")
+        if amount not in (None, "", 0):
+            lines.append(f"**Suggested Loan Amount**: {_rupees(amount)}")
+        if result.get("rationale"):
+            lines.append(f"**Rationale**: {result['rationale']}")
+        for title, field in (("Risk Mitigation", "risk_mitigation"), ("Monitoring", "monitoring")):
+            actions = result.get(field) or []
+            if isinstance(actions, str):
+                actions = [actions]
+            if actions:
+                lines.append(f"**{title}**:\n" + "\n".join(f"- {action}" for action in actions))
+        return "\n".join(lines)
+    
     def simulate_what_if_scenario(self, borrower_data: Dict[str, Any], scenario: str, change_value: float) -> Dict[str, Any]:
         """Simulate what-if scenarios for risk assessment"""
         
@@ -485,7 +591,8 @@ Your Score: {"█" * int(risk_score * 16)}{"░" * (16 - int(risk_score * 16))}
         
         for borrower in all_borrowers:
             try:
-                risk_score = self.calculate_risk_score(borrower)
+                risk_factors = self.calculate_risk_factors(borrower)
+                risk_score, _ = self.calculate_composite_risk_score(risk_factors)
                 
                 if risk_score >= self.risk_thresholds['low']:
                     risk_category = 'LOW'
@@ -504,7 +611,8 @@ Your Score: {"█" * int(risk_score * 16)}{"░" * (16 - int(risk_score * 16))}
                 borrower_analyses.append({
                     'borrower': borrower,
                     'risk_score': risk_score,
-                    'risk_category': risk_category
+                    'risk_category': risk_category,
+                    'risk_flags': self.identify_risk_flags(borrower, risk_factors)
                 })
                 
             except Exception as e:
@@ -535,7 +643,15 @@ Your Score: {"█" * int(risk_score * 16)}{"░" * (16 - int(risk_score * 16))}
 
 """
         
-        for analysis in borrower_analyses[:10]:  # Show top 10 for brevity
+        # AI recommendations for the borrowers shown, several per LLM call
+        shown = borrower_analyses[:10]  # Show top 10 for brevity
+        recommendations = self.generate_recommendations_batch([
+            {'borrower_data': analysis['borrower'], 'risk_score': analysis['risk_score'],
+             'risk_category': f"{analysis['risk_category'].title()} Risk", 'risk_flags': analysis['risk_flags']}
+            for analysis in shown
+        ])
+        
+        for analysis, recommendation in zip(shown, recommendations):
             borrower = analysis['borrower']
             risk_score = analysis['risk_score']
             risk_category = analysis['risk_category']
@@ -559,6 +675,9 @@ Your Score: {"█" * int(risk_score * 16)}{"░" * (16 - int(risk_score * 16))}
 **MFI Notes**: {mfi_notes.get('performance_notes', 'No notes available')}  
 **Last Updated**: {mfi_notes.get('last_updated', 'Never')} by {mfi_notes.get('updated_by', 'Unknown')}
 
+**AI Recommendation**:
+{recommendation}
+
 ---
 """
         
@@ -578,7 +697,7 @@ Your Score: {"█" * int(risk_score * 16)}{"░" * (16 - int(risk_score * 16))}
 2. **Risk Mitigation**: Focus on high-risk borrowers for intervention
 3. **Portfolio Growth**: Leverage low-risk borrowers for business expansion
 """
-        return analysis_text
+        return report
 
     def analyze_loan_application(self, borrower_data: Dict[str, Any], loan_amount: float, loan_purpose: str, collateral: str = "", credit_score: int = 650) -> Dict[str, Any]:
         """Comprehensive analysis of a loan application for MFI decision-making"""
@@ -589,8 +708,7 @@ Your Score: {"█" * int(risk_score * 16)}{"░" * (16 - int(risk_score * 16))}
             net_income = monthly_income - monthly_expenses
             
             # Calculate affordability (assuming 12% annual interest, 12 months)
-            monthly_rate = 0.12 / 12
-            estimated_emi = loan_amount * monthly_rate * (1 + monthly_rate)**12 / ((1 + monthly_rate)**12 - 1)
+            estimated_emi = calculate_emi(loan_amount, 12.0, 12)
             
             # Risk assessment
             if credit_score >= 750 and estimated_emi <= net_income * 0.3:
@@ -8,7 +8,6 @@ import json
 import sys
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
-from groq import Groq
 from dotenv import load_dotenv
 import random
 import calendar
@@ -16,13 +15,21 @@ import calendar
 # Load environment variables
 load_dotenv()
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from shared_data.llm_gateway import get_llm_client
+
+try:
+    from shared_data.loan_database import loan_db
+except ImportError:
+    loan_db = None
+
 class FundFlowForecaster:
     def __init__(self, groq_api_key: str = None):
         self.groq_api_key = groq_api_key or os.getenv('GROQ_API_KEY')
         if not self.groq_api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables")
             
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("FundFlowForecaster", self.groq_api_key)
         self.model = os.getenv('MODEL_NAME', "meta-llama/llama-4-maverick-17b-128e-instruct")
         
         # Seasonal factors for Indian microfinance (based on agricultural cycles)
@@ -55,7 +62,14 @@ class FundFlowForecaster:
     def load_portfolio_data(self, mfi_id: str) -> Dict[str, Any]:
         """Load real portfolio data from shared EMI tracking"""
         try:
-            # Load actual EMI tracking data
+            if loan_db:
+                # Materialized aggregates: no per-loan work on refresh
+                summary = loan_db.get_portfolio_summary(mfi_id)
+                if not summary['total_loans']:
+                    return self._generate_sample_portfolio(mfi_id)
+                return self._portfolio_from_aggregates(summary, mfi_id)
+            
+            # Fall back to the legacy EMI tracking file
             emi_file = os.path.join(os.path.dirname(__file__), '..', '..', 'shared_data', 'emi_tracking.json')
             
             if not os.path.exists(emi_file):
@@ -126,11 +140,79 @@ class FundFlowForecaster:
             },
             'loan_cohorts': cohorts,
             'borrower_segments': self._analyze_borrower_segments(mfi_loans),
-            'geographic_distribution': self._analyze_geographic_distribution(mfi_loans),
+            'geographic_distribution': self._analyze_geographic_distribution(len(mfi_loans)),
             'repayment_patterns': self._analyze_repayment_patterns(mfi_loans),
             'last_updated': current_date.isoformat()
         }
     
+    def _portfolio_from_aggregates(self, summary: Dict, mfi_id: str) -> Dict[str, Any]:
+        """Portfolio structure from the loan database's materialized per-MFI aggregates"""
+        current_date = datetime.now()
+        aging = loan_db.get_portfolio_aging(mfi_id)
+        
+        expected_payments = summary['expected_payments']
+        collection_rate = (summary['payments_made'] / expected_payments * 100) if expected_payments > 0 else 100
+        
+        cohorts = []
+        for cohort in summary['cohorts']:
+            loan_count = cohort['loan_count']
+            cohorts.append({
+                'cohort_id': f"COH_{cohort['cohort'].replace('-', '_')}",
+                'disbursement_date': f"{cohort['cohort']}-01",
+                'loan_count': loan_count,
+                'total_disbursed': cohort['total_disbursed'],
+                'current_outstanding': cohort['current_outstanding'],
+                'total_payments': cohort['total_payments'],
+                'average_loan_size': cohort['total_disbursed'] / loan_count,
+                'collection_rate': (cohort['total_payments'] / (loan_count * 12)) * 100,
+                'par_amount': cohort['current_outstanding'] * 0.1  # Estimate
+            })
+        
+        return {
+            'mfi_id': mfi_id,
+            'portfolio_summary': {
+                'total_loans': summary['total_loans'],
+                'active_loans': summary['active_loans'],
+                'completed_loans': summary['completed_loans'],
+                'total_disbursed': summary['principal_disbursed'],
+                'total_outstanding': summary['outstanding'],
+                'total_collected': summary['collected'],
+                'average_loan_size': summary['average_loan_size'],
+                'average_emi': summary['average_emi'],
+                'collection_rate': collection_rate,
+                'par_30_rate': aging['par_30_rate'],
+                'par_90_rate': aging['par_90_rate'],
+                'overdue_amount': aging['overdue_amount']
+            },
+            'loan_cohorts': cohorts,
+            'borrower_segments': {
+                'by_loan_size': summary['loans_by_size'],
+                'by_status': {
+                    'active': summary['active_loans'],
+                    'completed': summary['completed_loans'],
+                    'overdue': aging['overdue_loans']
+                },
+                'by_days_past_due': {bucket: data['loans'] for bucket, data in aging['buckets'].items()}
+            },
+            'geographic_distribution': self._analyze_geographic_distribution(summary['total_loans']),
+            'repayment_patterns': self._repayment_pattern_rates(summary['payments_made']),
+            'scheduled_collections': self._scheduled_collections(mfi_id, current_date),
+            'last_updated': current_date.isoformat()
+        }
+    
+    def _scheduled_collections(self, mfi_id: str, current_date: datetime, months_ahead: int = 12) -> List[float]:
+        """Unpaid EMI amounts due in each of the next months, from the stored amortization schedules"""
+        if not loan_db:
+            return []
+        
+        collections = []
+        for month in range(months_ahead):
+            start = current_date + timedelta(days=30 * month)
+            end = start + timedelta(days=29)
+            due = loan_db.get_installments_due(start.date().isoformat(), end.date().isoformat(), mfi_id=mfi_id)
+            collections.append(sum(row['emi_amount'] for row in due))
+        return collections
+    
     def _generate_cohorts_from_real_data(self, mfi_loans: Dict) -> List[Dict]:
         """Generate cohort analysis from real loan data"""
         cohorts = {}
@@ -192,32 +274,28 @@ class FundFlowForecaster:
             }
         }
     
-    def _analyze_geographic_distribution(self, mfi_loans: Dict) -> Dict:
+    def _analyze_geographic_distribution(self, total_loans: int) -> Dict:
         """Analyze geographic distribution (placeholder)"""
         return {
             'regions': {
-                'rural': len(mfi_loans) * 0.7,  # Estimate
-                'semi_urban': len(mfi_loans) * 0.2,
-                'urban': len(mfi_loans) * 0.1
+                'rural': total_loans * 0.7,  # Estimate
+                'semi_urban': total_loans * 0.2,
+                'urban': total_loans * 0.1
             }
         }
     
     def _analyze_repayment_patterns(self, mfi_loans: Dict) -> Dict:
         """Analyze repayment patterns from real payment data"""
-        total_payments = 0
-        on_time_payments = 0
-        early_payments = 0
-        late_payments = 0
-        
-        for loan in mfi_loans.values():
-            payments = loan.get('payments', [])
-            total_payments += len(payments)
-            
-            # This is simplified - in real implementation, would compare actual vs due dates
-            # For now, assume most payments are on time
-            on_time_payments += len(payments) * 0.8
-            early_payments += len(payments) * 0.15
-            late_payments += len(payments) * 0.05
+        total_payments = sum(len(loan.get('payments', [])) for loan in mfi_loans.values())
+        return self._repayment_pattern_rates(total_payments)
+    
+    def _repayment_pattern_rates(self, total_payments: int) -> Dict:
+        """Repayment pattern split for a payment count"""
+        # This is simplified - in real implementation, would compare actual vs due dates
+        # For now, assume most payments are on time
+        on_time_payments = total_payments * 0.8
+        early_payments = total_payments * 0.15
+        late_payments = total_payments * 0.05
         
         return {
             'total_payments': total_payments,
@@ -550,7 +628,8 @@ Keep insights practical and specific to Indian microfinance operations.
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=600,
-                temperature=0.7
+                temperature=0.7,
+                priority="batch"
             )
             
             return response.choices[0].message.content.strip()
@@ -565,6 +644,8 @@ Keep insights practical and specific to Indian microfinance operations.
         avg_emi = summary['average_emi']
         active_loans = summary['active_loans']
         
+        scheduled = portfolio_data.get('scheduled_collections', [])
+        
         projections = []
         total_expected = 0
         
@@ -572,8 +653,11 @@ Keep insights practical and specific to Indian microfinance operations.
             current_date = datetime.now() + timedelta(days=30 * month)
             seasonal_factor = self.seasonal_factors.get(current_date.month, 0.85)
             
-            # Calculate expected collections
-            expected_monthly = avg_emi * active_loans * seasonal_factor
+            # Calculate expected collections (scheduled EMIs when available)
+            if month <= len(scheduled):
+                expected_monthly = scheduled[month - 1] * seasonal_factor
+            else:
+                expected_monthly = avg_emi * active_loans * seasonal_factor
             total_expected += expected_monthly
             
             projections.append(f"| Month {month} | ₹{expected_monthly:,.0f} | {seasonal_factor:.2f} | {'🟢' if seasonal_factor > 0.85 else '🟡' if seasonal_factor > 0.75 else '🔴'} |")
@@ -606,6 +690,7 @@ Keep insights practical and specific to Indian microfinance operations.
         
         return f"""
 **Current PAR 30+ Rate**: {par_rate:.2f}%
+**Current PAR 90+ Rate**: {summary.get('par_90_rate', 0):.2f}%
 **Risk Level**: {risk_level}
 
 **Recommendations**: {recommendations}
@@ -688,7 +773,8 @@ Keep insights specific to Indian microfinance context and seasonal patterns.
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=500,
-                temperature=0.1
+                temperature=0.1,
+                priority="batch"
             )
             
             return response.choices[0].message.content.strip()
@@ -9,7 +9,6 @@ import json
 import sys
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
-from groq import Groq
 from dotenv import load_dotenv
 import random
 import math
@@ -17,13 +16,16 @@ import math
 # Load environment variables
 load_dotenv()
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from shared_data.llm_gateway import get_llm_client
+
 class OpsGenieAgent:
     def __init__(self, groq_api_key: str = None):
         self.groq_api_key = groq_api_key or os.getenv('GROQ_API_KEY')
         if not self.groq_api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables")
             
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("OpsGenieAgent", self.groq_api_key)
         self.model = os.getenv('MODEL_NAME', "meta-llama/llama-4-maverick-17b-128e-instruct")
         
         # Initialize ops data
@@ -626,7 +628,8 @@ Keep insights practical for Indian rural microfinance operations.
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=600,
-                temperature=0.7
+                temperature=0.7,
+                priority="batch"
             )
             
             return response.choices[0].message.content.strip()
@@ -9,19 +9,21 @@ import json
 import sys
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
-from groq import Groq
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from shared_data.llm_gateway import get_llm_client
+
 class PolicyPulseAdvisor:
     def __init__(self, groq_api_key: str = None):
         self.groq_api_key = groq_api_key or os.getenv('GROQ_API_KEY')
         if not self.groq_api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables")
             
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("PolicyPulseAdvisor", self.groq_api_key)
         self.model = os.getenv('MODEL_NAME', "meta-llama/llama-4-maverick-17b-128e-instruct")
         
         # Initialize policy database
@@ -37,6 +37,8 @@ except ImportError:
     print("Warning: Shared loan database not available")
     loan_db = None
 
+from shared_data.amortization import calculate_emi
+
 # Import RAG chat system for lenders
 try:
     from shared_data.simple_rag_system import get_simple_rag_system
@@ -89,7 +91,8 @@ def login_mfi(mfi_selection: str) -> Tuple[str, bool]:
         if not loan_db:
             return "❌ Database system not available", False
         
-        # Load MFI directory to find the profile
+        # Load MFI directory to find the profile (picking up MFIs registered elsewhere)
+        loan_db.sync_changes()
         mfi_directory = loan_db.mfi_directory
         if selected_mfi_id not in mfi_directory:
             return f"❌ MFI {selected_mfi_id} not found in directory", False
@@ -147,6 +150,7 @@ def get_available_mfis_for_login() -> list:
         if not loan_db:
             return ["Database not available"]
         
+        loan_db.sync_changes()
         mfi_directory = loan_db.mfi_directory
         if not mfi_directory:
             return ["No MFIs available"]
@@ -507,8 +511,8 @@ Provide a helpful, conversational response about:
 Keep response under 200 words, professional but conversational for voice delivery.
 """
 
-        from groq import Groq
-        client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+        from shared_data.llm_gateway import get_llm_client
+        client = get_llm_client("MFIVoiceAssistant", priority="interactive")
         
         response = client.chat.completions.create(
             model=os.getenv('MODEL_NAME', "meta-llama/llama-4-maverick-17b-128e-instruct"),
@@ -573,8 +577,7 @@ def view_pending_applications() -> str:
         return "❌ Loan system not available"
     
     try:
-        applications = loan_db.get_applications_for_mfi(current_mfi_id)
-        pending_apps = [app for app in applications if app['status'] == 'pending']
+        pending_apps = loan_db.get_applications_for_mfi(current_mfi_id, status='pending')
         
         if not pending_apps:
             return "ℹ️ No pending applications found."
@@ -615,13 +618,9 @@ def get_credit_analysis(app_id: str) -> str:
         return "❌ Please enter Application ID"
     
     try:
-        applications = loan_db.get_applications_for_mfi(current_mfi_id)
-        application = None
-        
-        for app in applications:
-            if app['application_id'] == app_id:
-                application = app
-                break
+        application = loan_db.get_application(app_id)
+        if application and application.get('mfi_id') != current_mfi_id:
+            application = None
         
         if not application:
             return f"❌ Application {app_id} not found"
@@ -678,8 +677,7 @@ def approve_loan_application(app_id: str, approved_amount: float, loan_tenure: i
     
     try:
         # Calculate EMI and total amount
-        monthly_rate = interest_rate / 100 / 12
-        emi_amount = approved_amount * monthly_rate * (1 + monthly_rate)**loan_tenure / ((1 + monthly_rate)**loan_tenure - 1)
+        emi_amount = calculate_emi(approved_amount, interest_rate, loan_tenure)
         total_amount = emi_amount * loan_tenure
         
         # Prepare approval data
@@ -753,6 +751,9 @@ The borrower will be notified of the rejection and the reason provided.
     except Exception as e:
         return f"❌ Error rejecting loan: {e}"
 
+# Active loans listed individually in the portfolio view
+PORTFOLIO_DETAIL_LIMIT = 50
+
 def view_active_portfolio() -> str:
     """View active loan portfolio for the MFI"""
     global current_mfi_id
@@ -764,36 +765,39 @@ def view_active_portfolio() -> str:
         return "❌ Loan system not available"
     
     try:
-        # Get all EMI tracking data for this MFI
-        all_loans = []
-        for loan_id, loan_data in loan_db.emi_tracking.items():
-            if loan_data['mfi_id'] == current_mfi_id:
-                all_loans.append(loan_data)
+        # Materialized per-MFI totals; refresh cost does not grow with the portfolio
+        summary = loan_db.get_portfolio_summary(current_mfi_id)
         
-        if not all_loans:
+        if not summary['total_loans']:
             return "ℹ️ No active loans in portfolio."
         
-        # Calculate portfolio statistics
-        total_principal = sum(loan['principal_amount'] for loan in all_loans)
-        total_outstanding = sum(loan['outstanding_balance'] for loan in all_loans)
-        active_loans = [loan for loan in all_loans if loan['status'] == 'active']
-        completed_loans = [loan for loan in all_loans if loan['status'] == 'completed']
+        total_principal = summary['principal_disbursed']
+        total_outstanding = summary['outstanding']
+        aging = loan_db.get_portfolio_aging(current_mfi_id)
         
         portfolio_summary = f"""
 ## 💼 Loan Portfolio Summary
 
-**Total Loans**: {len(all_loans)}  
-**Active Loans**: {len(active_loans)}  
-**Completed Loans**: {len(completed_loans)}  
+**Total Loans**: {summary['total_loans']}  
+**Active Loans**: {summary['active_loans']}  
+**Completed Loans**: {summary['completed_loans']}  
 **Total Principal Disbursed**: ₹{total_principal:,.0f}  
 **Total Outstanding**: ₹{total_outstanding:,.0f}  
+**Total Collected**: ₹{summary['collected']:,.0f}  
+**Average EMI**: ₹{summary['average_emi']:,.0f}  
 **Collection Rate**: {((total_principal - total_outstanding) / total_principal * 100) if total_principal > 0 else 0:.1f}%  
+**PAR 30+**: {aging['par_30_rate']:.2f}%  
+**PAR 90+**: {aging['par_90_rate']:.2f}%  
+
+## ⏳ Days Past Due
+{" | ".join(f"**{bucket}**: {data['loans']} (₹{data['outstanding']:,.0f})" for bucket, data in aging['buckets'].items())}
 
 ## 📊 Active Loans Details
 
 """
         
-        for loan in active_loans:
+        active_loans = loan_db.get_emi_loans_for_mfi(current_mfi_id, status='active')
+        for loan in active_loans[:PORTFOLIO_DETAIL_LIMIT]:
             portfolio_summary += f"""
 ### 🔸 Loan ID: {loan['loan_id'][:12]}...
 **Borrower**: {loan['borrower_id']}  
@@ -801,9 +805,12 @@ def view_active_portfolio() -> str:
 **Outstanding**: ₹{loan['outstanding_balance']:,.0f}  
 **EMI**: ₹{loan['emi_amount']:,.0f}  
 **Next Due**: {loan.get('next_due_date', 'N/A')[:10]}  
+**Days Past Due**: {loan_db.aging.dpd(loan['loan_id'])}  
 **Payments Made**: {len(loan['payments'])}  
 ---
 """
+        if len(active_loans) > PORTFOLIO_DETAIL_LIMIT:
+            portfolio_summary += f"\n*...and {len(active_loans) - PORTFOLIO_DETAIL_LIMIT} more active loans*\n"
         
         return portfolio_summary
         
@@ -819,8 +826,7 @@ def get_application_ids_list():
         return gr.update(choices=app_list, value=app_list[0]), gr.update(choices=app_list, value=app_list[0])
     
     try:
-        applications = loan_db.get_applications_for_mfi(current_mfi_id)
-        pending_apps = [app for app in applications if app['status'] == 'pending']
+        pending_apps = loan_db.get_applications_for_mfi(current_mfi_id, status='pending')
         
         if not pending_apps:
             app_list = ["No pending applications"]
@@ -848,13 +854,9 @@ def get_loan_details_from_dropdown(app_dropdown_value: str):
         app_id = app_dropdown_value.split(' - ')[0]
         
         # Find the application
-        applications = loan_db.get_applications_for_mfi(current_mfi_id)
-        application = None
-        
-        for app in applications:
-            if app['application_id'] == app_id and app['status'] == 'pending':
-                application = app
-                break
+        application = loan_db.get_application(app_id)
+        if application and (application.get('mfi_id') != current_mfi_id or application['status'] != 'pending'):
+            application = None
         
         if application:
             return (
@@ -1137,12 +1139,27 @@ def create_mfi_interface():
                         
                         def respond_to_mfi_query(message, history):
                             if not message.strip():
-                                return history, ""
+                                yield history, ""
+                                return
                             
-                            response = get_mfi_rag_response(message)
                             history = history or []
-                            history.append([message, response])
-                            return history, ""
+                            history.append([message, ""])
+                            if not rag_system:
+                                history[-1][1] = get_mfi_rag_response(message)
+                                yield history, ""
+                                return
+                            
+                            # Stream the answer into the chat as it is generated
+                            response = ""
+                            try:
+                                for piece in rag_system.stream_response(message, user_type="lender"):
+                                    response += piece
+                                    history[-1][1] = f"🏦 **MFI Operations Assistant**\n\n{response}"
+                                    yield history, ""
+                            except Exception:
+                                if not response:
+                                    history[-1][1] = get_mfi_rag_response(message)
+                                    yield history, ""
                         
                         def clear_mfi_chat():
                             if rag_system:
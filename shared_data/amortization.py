@@ -0,0 +1,138 @@
+"""
+Vectorized Amortization Engine
+Shared NumPy implementation of EMI, amortization schedules, outstanding balances and
+interest/principal splits. Every function accepts scalars or arrays (broadcast
+together), so a whole portfolio can be recomputed in one call.
+"""
+
+from typing import Dict, Union
+
+import numpy as np
+
+ArrayLike = Union[float, int, np.ndarray, list]
+
+
+def monthly_rate(annual_rate_percent: ArrayLike) -> np.ndarray:
+    """Annual interest rate in percent -> monthly rate as a fraction"""
+    return np.asarray(annual_rate_percent, dtype=np.float64) / 100.0 / 12.0
+
+
+def _unwrap(result: np.ndarray):
+    """Return plain floats for scalar inputs so existing call sites keep working"""
+    return float(result) if np.ndim(result) == 0 else result
+
+
+def _growth(rate: np.ndarray, periods: np.ndarray) -> np.ndarray:
+    """Compound growth factor (1 + r)^n"""
+    return np.power(1.0 + rate, periods)
+
+
+def calculate_emi(principal: ArrayLike, annual_rate_percent: ArrayLike, tenure_months: ArrayLike):
+    """Equated monthly instalment: P * r * (1+r)^n / ((1+r)^n - 1), or P / n at zero rate"""
+    principal = np.asarray(principal, dtype=np.float64)
+    tenure = np.asarray(tenure_months, dtype=np.float64)
+    rate = monthly_rate(annual_rate_percent)
+
+    growth = _growth(rate, tenure)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        emi = np.where(
+            rate > 0,
+            principal * rate * growth / (growth - 1.0),
+            principal / np.where(tenure > 0, tenure, np.nan)
+        )
+    return _unwrap(emi)
+
+
+def principal_from_emi(emi: ArrayLike, annual_rate_percent: ArrayLike, tenure_months: ArrayLike):
+    """Largest principal serviceable by a given EMI (inverse of calculate_emi)"""
+    emi = np.asarray(emi, dtype=np.float64)
+    tenure = np.asarray(tenure_months, dtype=np.float64)
+    rate = monthly_rate(annual_rate_percent)
+
+    growth = _growth(rate, tenure)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        principal = np.where(
+            rate > 0,
+            emi * (growth - 1.0) / (rate * growth),
+            emi * tenure
+        )
+    return _unwrap(principal)
+
+
+def outstanding_balance(principal: ArrayLike, annual_rate_percent: ArrayLike, tenure_months: ArrayLike,
+                        installments_paid: ArrayLike, emi: ArrayLike = None):
+    """Balance after k instalments: P(1+r)^k - EMI((1+r)^k - 1)/r, floored at zero"""
+    principal = np.asarray(principal, dtype=np.float64)
+    paid = np.asarray(installments_paid, dtype=np.float64)
+    rate = monthly_rate(annual_rate_percent)
+    if emi is None:
+        emi = calculate_emi(principal, annual_rate_percent, tenure_months)
+    emi = np.asarray(emi, dtype=np.float64)
+
+    growth = _growth(rate, paid)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        balance = np.where(
+            rate > 0,
+            principal * growth - emi * (growth - 1.0) / np.where(rate > 0, rate, 1.0),
+            principal - emi * paid
+        )
+    return _unwrap(np.maximum(balance, 0.0))
+
+
+def split_payment(outstanding: ArrayLike, annual_rate_percent: ArrayLike, emi: ArrayLike):
+    """Split an EMI into (interest, principal) components for the current balance"""
+    outstanding = np.asarray(outstanding, dtype=np.float64)
+    interest = outstanding * monthly_rate(annual_rate_percent)
+    principal = np.asarray(emi, dtype=np.float64) - interest
+    return _unwrap(interest), _unwrap(principal)
+
+
+def amortization_schedule(principal: ArrayLike, annual_rate_percent: ArrayLike,
+                          tenure_months: ArrayLike, emi: ArrayLike = None) -> Dict[str, np.ndarray]:
+    """Full schedules for a batch of loans
+
+    Returns 2-D arrays of shape (n_loans, max_tenure) for ``interest``,
+    ``principal`` and ``balance`` (balance after each instalment), plus
+    ``emi`` of shape (n_loans,). Columns beyond a loan's tenure are zero.
+    Computed in closed form, so cost is O(n_loans * max_tenure) vector ops
+    with no Python-level loop over loans or months.
+    """
+    principal = np.atleast_1d(np.asarray(principal, dtype=np.float64))
+    annual = np.atleast_1d(np.asarray(annual_rate_percent, dtype=np.float64))
+    tenure = np.atleast_1d(np.asarray(tenure_months, dtype=np.int64))
+    principal, annual, tenure = np.broadcast_arrays(principal, annual, tenure)
+    rate = monthly_rate(annual)
+    if emi is None:
+        emi = calculate_emi(principal, annual, tenure)
+    emi = np.broadcast_to(np.atleast_1d(np.asarray(emi, dtype=np.float64)), principal.shape)
+
+    max_tenure = int(tenure.max()) if tenure.size else 0
+    months = np.arange(1, max_tenure + 1, dtype=np.float64)[None, :]
+    active = months <= tenure[:, None]
+
+    r = rate[:, None]
+    p = principal[:, None]
+    e = emi[:, None]
+    safe_r = np.where(r > 0, r, 1.0)
+
+    # Balance before instalment k (k = 1..n) and after it
+    growth_before = np.power(1.0 + r, months - 1.0)
+    balance_before = np.where(r > 0, p * growth_before - e * (growth_before - 1.0) / safe_r, p - e * (months - 1.0))
+    balance_before = np.maximum(balance_before, 0.0)
+
+    interest = balance_before * r
+    principal_part = np.minimum(e - interest, balance_before)
+    balance_after = np.maximum(balance_before - principal_part, 0.0)
+
+    return {
+        'emi': emi.copy(),
+        'interest': np.where(active, interest, 0.0),
+        'principal': np.where(active, principal_part, 0.0),
+        'balance': np.where(active, balance_after, 0.0),
+    }
+
+
+def total_interest(principal: ArrayLike, annual_rate_percent: ArrayLike, tenure_months: ArrayLike):
+    """Total interest over the life of the loan"""
+    emi = np.asarray(calculate_emi(principal, annual_rate_percent, tenure_months))
+    return _unwrap(emi * np.asarray(tenure_months, dtype=np.float64) - np.asarray(principal, dtype=np.float64))
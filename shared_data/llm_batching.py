@@ -0,0 +1,168 @@
+"""
+Batched LLM Prompts
+Asks about several records (borrowers) in one LLM call: records are packed into batches
+by count and prompt tokens, the model answers with one JSON result per record id, and
+any record whose result is missing or unreadable is asked about on its own.
+``amap_batched`` is the same for async code, asking the batches concurrently.
+
+Batch size defaults to LLM_BATCH_SIZE (10).
+"""
+
+import asyncio
+import json
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BATCH_SIZE = 10
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def batch_size() -> int:
+    """Records per batched call (LLM_BATCH_SIZE, at least 1)"""
+    try:
+        return max(1, int(os.getenv('LLM_BATCH_SIZE', DEFAULT_BATCH_SIZE)))
+    except ValueError:
+        return DEFAULT_BATCH_SIZE
+
+
+def pack_batches(items: List[Any], size: int, max_tokens: Optional[int] = None,
+                 cost: Optional[Callable[[Any], int]] = None) -> List[List[Any]]:
+    """Consecutive batches of at most ``size`` items and (if given) ``max_tokens`` total cost
+
+    An item that alone costs more than ``max_tokens`` gets a batch of its own.
+    """
+    batches, current, current_cost = [], [], 0
+    for item in items:
+        item_cost = cost(item) if cost and max_tokens else 0
+        if current and (len(current) >= size or (max_tokens and current_cost + item_cost > max_tokens)):
+            batches.append(current)
+            current, current_cost = [], 0
+        current.append(item)
+        current_cost += item_cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def extract_json(text: str) -> Any:
+    """JSON value in a model answer, tolerating code fences and text around it"""
+    text = _FENCE.sub("", text.strip())
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        start = min((i for i in (text.find('{'), text.find('[')) if i >= 0), default=-1)
+        end = max(text.rfind('}'), text.rfind(']'))
+        if start < 0 or end <= start:
+            raise
+        return json.loads(text[start:end + 1])
+
+
+def batch_schema_prompt(result_schema: Dict[str, Any]) -> str:
+    """Instructions asking for one ``result_schema`` object per record id"""
+    schema = json.dumps({"results": [result_schema]}, indent=2, ensure_ascii=False)
+    return f"""Return ONLY JSON in this format, with exactly one entry in "results" for each record id:
+{schema}"""
+
+
+def parse_batch_results(text: str, ids: List[str], id_field: str = "id") -> Dict[str, Dict[str, Any]]:
+    """Result objects from a batched answer, by id (ids not asked for are ignored)"""
+    data = extract_json(text)
+    results = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(results, list):
+        raise ValueError("batched answer has no results list")
+    wanted = set(ids)
+    parsed = {}
+    for result in results:
+        if isinstance(result, dict):
+            key = str(result.get(id_field, ""))
+            if key in wanted and key not in parsed:
+                parsed[key] = result
+    return parsed
+
+
+def _keyed_batches(items: List[Any], size: Optional[int], max_tokens: Optional[int],
+                   cost: Optional[Callable[[Any], int]]) -> List[Tuple[List[int], List[Tuple[str, Any]]]]:
+    """(positions, (id, item) pairs) for each batch of items"""
+    batches = []
+    for batch in pack_batches(list(range(len(items))), size or batch_size(), max_tokens,
+                              (lambda i: cost(items[i])) if cost else None):
+        # Ids are positions, so they are unique even if the records' own ids are not
+        batches.append((batch, [(f"B{i + 1}", items[i]) for i in batch]))
+    return batches
+
+
+def _accept_answer(batch: List[int], keyed: List[Tuple[str, Any]], answer: Any,
+                   convert: Callable[[Dict[str, Any], Any], Any], results: List[Any], answered: List[bool]):
+    """Store the readable results of one batched answer (an exception if the call failed)"""
+    try:
+        if isinstance(answer, BaseException):
+            raise answer
+        parsed = parse_batch_results(answer, [key for key, _ in keyed])
+    except Exception as e:
+        print(f"Batched LLM call for {len(keyed)} records failed: {e}")
+        parsed = {}
+    for i, (key, item) in zip(batch, keyed):
+        if key not in parsed:
+            continue
+        try:
+            results[i] = convert(parsed[key], item)
+            answered[i] = True
+        except (TypeError, ValueError, KeyError) as e:
+            print(f"Unreadable batched result {key}: {e}")
+
+
+def _unanswered(answered: List[bool]) -> List[int]:
+    missing = [i for i, done in enumerate(answered) if not done]
+    if missing:
+        print(f"Asking about {len(missing)} of {len(answered)} records one at a time")
+    return missing
+
+
+def map_batched(items: List[Any], ask_batch: Callable[[List[Tuple[str, Any]]], str],
+                convert: Callable[[Dict[str, Any], Any], Any], ask_one: Callable[[Any], Any],
+                size: int = None, max_tokens: Optional[int] = None,
+                cost: Optional[Callable[[Any], int]] = None) -> List[Any]:
+    """One result per item, in order, from as few LLM calls as possible
+
+    ``ask_batch`` gets (id, item) pairs and returns the model's answer text;
+    ``convert`` turns one parsed result object into the final result and may
+    raise (TypeError, ValueError, KeyError) to reject it. Items left without
+    a result, including every item of a batch whose call or parse failed,
+    go through ``ask_one``.
+    """
+    results: List[Any] = [None] * len(items)
+    answered = [False] * len(items)
+    for batch, keyed in _keyed_batches(items, size, max_tokens, cost):
+        try:
+            answer = ask_batch(keyed)
+        except Exception as e:
+            answer = e
+        _accept_answer(batch, keyed, answer, convert, results, answered)
+
+    for i in _unanswered(answered):
+        results[i] = ask_one(items[i])
+    return results
+
+
+async def amap_batched(items: List[Any], ask_batch: Callable[[List[Tuple[str, Any]]], Awaitable[str]],
+                       convert: Callable[[Dict[str, Any], Any], Any], ask_one: Callable[[Any], Awaitable[Any]],
+                       size: int = None, max_tokens: Optional[int] = None,
+                       cost: Optional[Callable[[Any], int]] = None) -> List[Any]:
+    """Async map_batched: ``ask_batch`` and ``ask_one`` are coroutine functions
+
+    All batches are asked at once, then all items left without a result; the
+    gateway's scheduler bounds how many of those calls are in flight.
+    """
+    results: List[Any] = [None] * len(items)
+    answered = [False] * len(items)
+    batches = _keyed_batches(items, size, max_tokens, cost)
+    answers = await asyncio.gather(*(ask_batch(keyed) for _, keyed in batches), return_exceptions=True)
+    for (batch, keyed), answer in zip(batches, answers):
+        _accept_answer(batch, keyed, answer, convert, results, answered)
+
+    missing = _unanswered(answered)
+    for i, result in zip(missing, await asyncio.gather(*(ask_one(items[i]) for i in missing))):
+        results[i] = result
+    return results
@@ -0,0 +1,273 @@
+"""
+LLM Response Cache
+Completed LLM responses keyed by the request (model, messages, sampling parameters), shared
+by every agent in the process: an in-memory LRU bounded by size in bytes, with a TTL, in
+front of an optional SQLite tier that survives restarts and is shared by the borrower app,
+the MFI app and the API server. Hits and misses are counted per agent and prompt type.
+
+Prompts and answers carry borrower profiles and chat messages, and the SQLite file stores
+them unencrypted, so the disk tier is off unless a path is given (LLM_CACHE_PATH) and can be
+limited to prompt types that hold no personal data.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Collection, Dict, Optional, Tuple
+
+# Memory tier: 32 MB, disk tier: 512 MB, entries expire after a week
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_DISK_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_TTL = 7 * 24 * 3600.0
+
+# Per-agent result caches keep at most this many entries
+AGENT_CACHE_ENTRIES = 1024
+
+
+def entry_size(key: str, value: str) -> int:
+    """Bytes a cache entry takes: the UTF-8 value (Indic scripts use 3 bytes a character) plus its ASCII key"""
+    return len(key) + len(value.encode('utf-8'))
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """Cache key for a chat completion request (any JSON-able dict)"""
+    data_str = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data_str.encode()).hexdigest()
+
+
+class LRUCache(OrderedDict):
+    """Dict that keeps the ``max_entries`` most recently used items (for per-agent result caches)"""
+
+    def __init__(self, max_entries: int = AGENT_CACHE_ENTRIES):
+        super().__init__()
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.max_entries:
+                self.popitem(last=False)
+
+
+class _CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+class ResponseCache:
+    """Serialized responses in a byte-bounded LRU with a TTL, backed by an optional SQLite file
+
+    Memory misses fall through to the disk tier, whose hits are promoted back
+    into memory. The disk tier drops its least recently used rows once it
+    grows past ``disk_max_bytes``. ``ttl=0`` keeps entries until evicted;
+    ``path=None`` (the default) keeps the cache in memory only, and
+    ``disk_prompt_types`` (if given) are the only prompt types written to disk.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL,
+                 path: Optional[str] = None, disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES,
+                 disk_prompt_types: Optional[Collection[str]] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.path = path
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_prompt_types = frozenset(disk_prompt_types) if disk_prompt_types is not None else None
+        # key -> (value, stored_at, size in bytes)
+        self._entries: 'OrderedDict[str, Tuple[str, float, int]]' = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._stats: Dict[Tuple[str, str], _CacheStats] = {}
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._conn = None
+        if path:
+            try:
+                self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS llm_responses (
+                        key TEXT PRIMARY KEY,
+                        value TEXT,
+                        size INTEGER,
+                        stored_at REAL,
+                        used_at REAL,
+                        agent TEXT,
+                        prompt_type TEXT
+                    )
+                """)
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_used ON llm_responses(used_at)")
+                self._conn.commit()
+                self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+            except sqlite3.Error as e:
+                print(f"LLM response cache unavailable at {path}: {e}")
+                self._conn = None
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return bool(self.ttl) and now - stored_at > self.ttl
+
+    def _on_disk(self, prompt_type: str) -> bool:
+        return self._conn is not None and (self.disk_prompt_types is None or prompt_type in self.disk_prompt_types)
+
+    def get(self, key: str, agent: str = "unknown", prompt_type: str = "chat") -> Optional[str]:
+        """Cached value for a key, or None (counted as a hit or miss for the agent and prompt type)"""
+        now = time.time()
+        value, from_disk = None, False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._expired(entry[1], now):
+                    self._drop(key)
+                else:
+                    self._entries.move_to_end(key)
+                    value = entry[0]
+
+        if value is None and self._on_disk(prompt_type):
+            found = self._disk_get(key, now)
+            if found is not None:
+                value, from_disk = found[0], True
+                with self._lock:
+                    self._store(key, value, found[1])
+
+        with self._lock:
+            stats = self._stats.setdefault((agent, prompt_type), _CacheStats())
+            if value is None:
+                stats.misses += 1
+            else:
+                stats.hits += 1
+                stats.disk_hits += from_disk
+        return value
+
+    def put(self, key: str, value: str, agent: str = "unknown", prompt_type: str = "chat"):
+        now = time.time()
+        with self._lock:
+            self._store(key, value, now)
+        if self._on_disk(prompt_type):
+            self._disk_put(key, value, now, agent, prompt_type)
+
+    def _store(self, key: str, value: str, stored_at: float):
+        # Caller holds self._lock
+        size = entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (value, stored_at, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        if self._conn is None:
+            return None
+        with self._disk_lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT value, stored_at FROM llm_responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if self._expired(row[1], now):
+                    self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                    return None
+                self._conn.execute("UPDATE llm_responses SET used_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                return row[0], row[1]
+            except sqlite3.Error as e:
+                print(f"Error reading LLM response cache: {e}")
+                return None
+
+    def _disk_put(self, key: str, value: str, now: float, agent: str, prompt_type: str):
+        if self._conn is None:
+            return
+        size = entry_size(key, value)
+        with self._disk_lock:
+            try:
+                # INSERT OR REPLACE drops the key's old row, so only the difference is added
+                old = self._conn.execute("SELECT size FROM llm_responses WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, value, size, now, now, agent, prompt_type)
+                )
+                self._disk_bytes += size - (old[0] if old else 0)
+                if self._disk_bytes > self.disk_max_bytes:
+                    self._evict_disk(now)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing LLM response cache: {e}")
+
+    def _evict_disk(self, now: float):
+        # Caller holds self._disk_lock. Other processes may share the file, so re-measure first.
+        if self.ttl:
+            self._conn.execute("DELETE FROM llm_responses WHERE stored_at < ?", (now - self.ttl,))
+        self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        # Evict down to 90% so every put near the limit does not trigger another pass
+        excess = self._disk_bytes - int(0.9 * self.disk_max_bytes)
+        if excess <= 0:
+            return
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_responses ORDER BY used_at"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM llm_responses WHERE key = ?", doomed)
+        self._disk_bytes -= freed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._conn is not None:
+            with self._disk_lock:
+                self._conn.execute("DELETE FROM llm_responses")
+                self._conn.commit()
+                self._disk_bytes = 0
+
+    def metrics(self) -> Dict[str, Any]:
+        """Sizes of both tiers and hit/miss counters per agent and prompt type"""
+        with self._lock:
+            by_agent: Dict[str, Dict[str, Any]] = {}
+            for (agent, prompt_type), stats in self._stats.items():
+                by_agent.setdefault(agent, {})[prompt_type] = stats.as_dict()
+            return {
+                "memory_entries": len(self._entries),
+                "memory_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_bytes": self._disk_bytes if self._conn is not None else None,
+                "disk_max_bytes": self.disk_max_bytes if self._conn is not None else None,
+                "ttl_seconds": self.ttl,
+                "agents": by_agent
+            }
+
+    def close(self):
+        if self._conn is not None:
+            with self._disk_lock:
+                self._conn.close()
+                self._conn = None
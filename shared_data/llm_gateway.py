@@ -0,0 +1,653 @@
+"""
+LLM Gateway
+One process-wide Groq client per API key with a shared keep-alive connection pool,
+a priority scheduler (see llm_scheduler.py), retries with jittered exponential backoff
+and per-agent usage metrics. Agents get a view with the usual ``client.chat.completions.create(...)``,
+and ``await client.aio.chat.completions.create(...)`` for async code;
+``client.stream_text(...)`` / ``client.aio.stream_text(...)`` yield the answer as it is generated. Responses are
+kept in a process-wide ResponseCache (see llm_cache.py), so identical requests from
+any agent are answered without a call.
+
+Configured through LLM_BASE_URL (e.g. a local stub server), LLM_MAX_CONCURRENCY,
+LLM_MAX_ASYNC_CONCURRENCY, LLM_MAX_RETRIES, LLM_TIMEOUT and LLM_MAX_CONNECTIONS;
+the provider's rate limits through LLM_REQUESTS_PER_MINUTE and LLM_TOKENS_PER_MINUTE
+(unset: no budget); the cache through LLM_CACHE (0 to disable), LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL,
+LLM_CACHE_PATH (empty for memory only) and LLM_CACHE_DISK_MAX_BYTES.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from groq import (APIConnectionError, APIStatusError, APITimeoutError, AsyncGroq, Groq,
+                  InternalServerError, RateLimitError)
+from groq.types.chat import ChatCompletion
+
+try:
+    from shared_data.llm_cache import (DEFAULT_DISK_MAX_BYTES, DEFAULT_MAX_BYTES, DEFAULT_TTL,
+                                       ResponseCache, request_key)
+except ImportError:
+    from llm_cache import (DEFAULT_DISK_MAX_BYTES, DEFAULT_MAX_BYTES, DEFAULT_TTL,
+                           ResponseCache, request_key)
+
+try:
+    from shared_data.llm_scheduler import PRIORITIES, LLMScheduler, Ticket, estimate_request_tokens
+except ImportError:
+    from llm_scheduler import PRIORITIES, LLMScheduler, Ticket, estimate_request_tokens
+
+# Errors worth retrying: transport failures, throttling and server-side errors
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+# Longest single backoff sleep in seconds
+MAX_BACKOFF = 20.0
+
+
+def _env_number(name: str, default, cast=int):
+    try:
+        return cast(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_list(name: str) -> Optional[List[str]]:
+    """Comma-separated values of an environment variable, or None if it is unset or empty"""
+    values = [value.strip() for value in os.getenv(name, '').split(',') if value.strip()]
+    return values or None
+
+
+def _total_tokens(usage) -> Optional[int]:
+    return getattr(usage, 'total_tokens', None) if usage is not None else None
+
+
+class _AgentUsage:
+    """Counters for one agent (guarded by the gateway's metrics lock)"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_seconds = 0.0
+        self.coalesced = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_latency_ms": round(1000 * self.latency_seconds / self.requests, 1) if self.requests else 0.0,
+            "coalesced": self.coalesced
+        }
+
+
+class _Schedule:
+    """Priority class and queueing deadline of one upstream call
+
+    Callers that join the call raise it to the most urgent priority and the
+    latest deadline among them, so nobody waits under another caller's terms.
+    """
+
+    def __init__(self, scheduler: LLMScheduler, priority: str, until: Optional[float]):
+        self.scheduler = scheduler
+        self.priority = priority if priority in PRIORITIES else "default"
+        self.until = until
+        self._ticket: Optional[Ticket] = None
+        self._lock = threading.Lock()
+
+    def attach(self, ticket: Ticket):
+        """Track the ticket of the current attempt, applying any joins made before it"""
+        with self._lock:
+            self._ticket = ticket
+            self.scheduler.promote(ticket, self.priority, self.until)
+
+    def join(self, priority: str, until: Optional[float]):
+        with self._lock:
+            if priority in PRIORITIES and PRIORITIES.index(priority) < PRIORITIES.index(self.priority):
+                self.priority = priority
+            if self.until is not None and (until is None or until > self.until):
+                self.until = until
+            if self._ticket is not None:
+                self.scheduler.promote(self._ticket, self.priority, self.until)
+
+
+class _Flight:
+    """An upstream call that identical concurrent blocking requests wait on"""
+
+    def __init__(self, schedule: _Schedule):
+        self.schedule = schedule
+        self.done = threading.Event()
+        self.response = None
+        self.error: Optional[BaseException] = None
+
+
+class _StreamedText:
+    """Collects a streamed completion so it can be recorded and cached like a plain one"""
+
+    def __init__(self):
+        self.parts = []
+        self.first_chunk = None
+        self.finish_reason = None
+        self.usage = None
+
+    def add(self, chunk) -> str:
+        """Record a chunk and return its text delta"""
+        self.first_chunk = self.first_chunk or chunk
+        # Groq reports usage on the last chunk under x_groq
+        usage = getattr(chunk, 'usage', None) or getattr(getattr(chunk, 'x_groq', None), 'usage', None)
+        if usage is not None:
+            self.usage = usage
+        if not chunk.choices:
+            return ""
+        choice = chunk.choices[0]
+        self.finish_reason = choice.finish_reason or self.finish_reason
+        delta = choice.delta.content or ""
+        self.parts.append(delta)
+        return delta
+
+    def completion(self) -> Optional[ChatCompletion]:
+        """The equivalent non-streaming response, or None if the stream did not finish"""
+        if self.first_chunk is None or self.finish_reason is None:
+            return None
+        return ChatCompletion.model_validate({
+            "id": self.first_chunk.id,
+            "object": "chat.completion",
+            "created": self.first_chunk.created,
+            "model": self.first_chunk.model,
+            "choices": [{"index": 0, "finish_reason": self.finish_reason,
+                         "message": {"role": "assistant", "content": "".join(self.parts)}}],
+            "usage": self.usage.model_dump() if self.usage is not None else None
+        })
+
+
+class _Completions:
+    def __init__(self, complete: Callable, agent: str, priority: str):
+        self._complete = complete
+        self._agent = agent
+        self._priority = priority
+
+    def create(self, **kwargs):
+        kwargs.setdefault('priority', self._priority)
+        return self._complete(self._agent, **kwargs)
+
+
+class _Chat:
+    def __init__(self, complete: Callable, agent: str, priority: str):
+        self.completions = _Completions(complete, agent, priority)
+
+
+class AgentLLMClient:
+    """Drop-in for a Groq client inside an agent: calls go through the shared gateway
+
+    ``aio`` is the same client for async code (its ``create`` returns a coroutine).
+    ``create`` also takes ``prompt_type`` (the label for cache metrics) and
+    ``use_cache=False`` to always ask the model, ``priority`` (the scheduler
+    class, ``priority`` of the client by default) and ``deadline`` (seconds the
+    request may queue before it is dropped with LLMDeadlineExceeded).
+    """
+
+    def __init__(self, gateway: 'LLMGateway', agent: str, asynchronous: bool = False, priority: str = "default"):
+        self.gateway = gateway
+        self.agent = agent
+        self.asynchronous = asynchronous
+        self.priority = priority
+        self.chat = _Chat(gateway.acomplete if asynchronous else gateway.complete, agent, priority)
+        if not asynchronous:
+            self.aio = AgentLLMClient(gateway, agent, asynchronous=True, priority=priority)
+
+    def stream_text(self, **kwargs):
+        """Text deltas of the answer as it is generated (an async iterator on ``aio``)"""
+        stream = self.gateway.astream if self.asynchronous else self.gateway.stream
+        kwargs.setdefault('priority', self.priority)
+        return stream(self.agent, **kwargs)
+
+
+class LLMGateway:
+    """Shared Groq client with pooled connections, a request scheduler and retries
+
+    Every call to the provider is admitted by ``scheduler``: at most
+    ``max_concurrency`` blocking requests are in flight at once, async requests
+    have their own, larger limit (``max_async_concurrency``) and a connection
+    pool per event loop, since waiting on them costs no thread, and both share
+    the requests/min and tokens/min budgets. Waiting callers start in priority
+    order (interactive, default, batch). Retryable failures are retried up to
+    ``max_retries`` times, sleeping ``backoff * 2**attempt`` seconds scaled by a
+    random factor in [0.5, 1.5) (or the server's Retry-After, if longer); a 429
+    also pauses the scheduler for that long.
+    Non-streaming responses are looked up in and stored to ``cache`` (the
+    process-wide response cache unless one is given). Identical requests
+    that arrive while one is already in flight wait for it and share its
+    response (or error) instead of making their own call.
+    """
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, max_concurrency: int = None,
+                 max_retries: int = None, timeout: float = None, max_connections: int = None,
+                 backoff: float = 0.5, max_async_concurrency: int = None,
+                 cache: Optional[ResponseCache] = None, scheduler: Optional[LLMScheduler] = None):
+        self.max_concurrency = max_concurrency or _env_number('LLM_MAX_CONCURRENCY', 8)
+        self.max_async_concurrency = max_async_concurrency or _env_number('LLM_MAX_ASYNC_CONCURRENCY', 256)
+        self.max_retries = max_retries if max_retries is not None else _env_number('LLM_MAX_RETRIES', 3)
+        self.backoff = backoff
+        self.timeout = timeout or _env_number('LLM_TIMEOUT', 60.0, float)
+        self.base_url = base_url or os.getenv('LLM_BASE_URL') or None
+        max_connections = max_connections or _env_number('LLM_MAX_CONNECTIONS', max(self.max_concurrency, 10))
+
+        self._api_key = api_key
+        self._http = httpx.Client(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        # The gateway does its own retries, so the SDK's are turned off
+        self.client = Groq(api_key=api_key, base_url=self.base_url, http_client=self._http, max_retries=0)
+        self.scheduler = scheduler or LLMScheduler(
+            max_concurrency=self.max_concurrency,
+            max_async_concurrency=self.max_async_concurrency,
+            requests_per_minute=_env_number('LLM_REQUESTS_PER_MINUTE', 0, float),
+            tokens_per_minute=_env_number('LLM_TOKENS_PER_MINUTE', 0, float)
+        )
+        # Event loop -> (AsyncGroq client, in-flight (task, schedule) by request key); both are
+        # bound to the loop that uses them
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._flights: Dict[str, _Flight] = {}
+        self._flights_lock = threading.Lock()
+        self.cache = cache if cache is not None else get_response_cache()
+        self._usage: Dict[str, _AgentUsage] = {}
+        self._metrics_lock = threading.Lock()
+
+    def client_for(self, agent: str, priority: str = "default") -> AgentLLMClient:
+        """Client view whose calls are counted under ``agent`` and scheduled as ``priority``"""
+        return AgentLLMClient(self, agent, priority=priority)
+
+    def _request_key(self, use_cache: bool, kwargs: Dict[str, Any]) -> Optional[str]:
+        """Key for caching and coalescing, or None if the request must go out on its own"""
+        if not use_cache or kwargs.get('stream'):
+            return None
+        # Answers from a stub server must not be served for the real one
+        return request_key({'base_url': self.base_url, **kwargs})
+
+    def _cached(self, key: Optional[str], agent: str, prompt_type: str) -> Optional[ChatCompletion]:
+        if key is None or self.cache is None:
+            return None
+        value = self.cache.get(key, agent, prompt_type)
+        if value is None:
+            return None
+        try:
+            return ChatCompletion.model_validate_json(value)
+        except ValueError as e:
+            print(f"Ignoring unreadable cached LLM response: {e}")
+            return None
+
+    def _remember(self, key: Optional[str], response, agent: str, prompt_type: str):
+        if key is not None and self.cache is not None and isinstance(response, ChatCompletion):
+            self.cache.put(key, response.model_dump_json(), agent, prompt_type)
+
+    def complete(self, agent: str, prompt_type: str = "chat", use_cache: bool = True,
+                 priority: str = "default", deadline: Optional[float] = None, **kwargs):
+        """chat.completions.create through the cache and the scheduler, with retries"""
+        key = self._request_key(use_cache, kwargs)
+        cached = self._cached(key, agent, prompt_type)
+        if cached is not None:
+            return cached
+        schedule = _Schedule(self.scheduler, priority, self.scheduler.deadline_for(priority, deadline))
+        if key is None:
+            return self._call(agent, kwargs, schedule)
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(schedule)
+        if not leader:
+            self._record_coalesced(agent)
+            flight.schedule.join(schedule.priority, schedule.until)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            flight.response = self._call(agent, kwargs, schedule)
+            self._remember(key, flight.response, agent, prompt_type)
+            return flight.response
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _call(self, agent: str, kwargs: Dict[str, Any], schedule: _Schedule):
+        tokens = estimate_request_tokens(kwargs)
+        attempt = 0
+        while True:
+            # Retries queue again, but keep the deadline (as extended by joining callers)
+            ticket = self.scheduler.acquire(schedule.priority, tokens, schedule.until, on_queued=schedule.attach)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = self.client.chat.completions.create(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    self._record(agent, time.perf_counter() - started, retries=attempt, error=True)
+                    raise
+                error = e
+            except Exception:
+                self._record(agent, time.perf_counter() - started, retries=attempt, error=True)
+                raise
+            finally:
+                self.scheduler.release(ticket, _total_tokens(getattr(response, 'usage', None)))
+
+            if response is not None:
+                self._record(agent, time.perf_counter() - started, retries=attempt,
+                             usage=getattr(response, 'usage', None))
+                return response
+            time.sleep(self._backoff_delay(attempt, error))
+            attempt += 1
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        state = self._async_clients.get(loop)
+        if state is None:
+            http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_async_concurrency,
+                                    max_keepalive_connections=self.max_async_concurrency)
+            )
+            client = AsyncGroq(api_key=self._api_key, base_url=self.base_url, http_client=http, max_retries=0)
+            state = (client, {})
+            self._async_clients[loop] = state
+        return state
+
+    async def acomplete(self, agent: str, prompt_type: str = "chat", use_cache: bool = True,
+                        priority: str = "default", deadline: Optional[float] = None, **kwargs):
+        """Async chat.completions.create through the cache and the scheduler, with retries"""
+        key = self._request_key(use_cache, kwargs)
+        cached = self._cached(key, agent, prompt_type)
+        if cached is not None:
+            return cached
+        schedule = _Schedule(self.scheduler, priority, self.scheduler.deadline_for(priority, deadline))
+        if key is None:
+            return await self._acall(agent, kwargs, schedule)
+
+        flights = self._async_client()[1]
+        flight = flights.get(key)
+        if flight is None:
+            # The call runs as its own task, so a cancelled caller does not cancel it for the others
+            task = asyncio.ensure_future(self._acall(agent, kwargs, schedule))
+            flights[key] = (task, schedule)
+            task.add_done_callback(lambda done: self._land(flights, key, done, agent, prompt_type))
+        else:
+            task = flight[0]
+            self._record_coalesced(agent)
+            flight[1].join(schedule.priority, schedule.until)
+        return await asyncio.shield(task)
+
+    def _land(self, flights: Dict[str, Tuple[asyncio.Future, _Schedule]], key: str, task: asyncio.Future,
+              agent: str, prompt_type: str):
+        # Runs before any awaiting caller resumes, so later identical requests find the cache filled
+        flights.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self._remember(key, task.result(), agent, prompt_type)
+
+    async def _acall(self, agent: str, kwargs: Dict[str, Any], schedule: _Schedule):
+        client = self._async_client()[0]
+        tokens = estimate_request_tokens(kwargs)
+        attempt = 0
+        while True:
+            ticket = await self.scheduler.acquire_async(schedule.priority, tokens, schedule.until,
+                                                        on_queued=schedule.attach)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = await client.chat.completions.create(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    self._record(agent, time.perf_counter() - started, retries=attempt, error=True)
+                    raise
+                error = e
+            except Exception:
+                self._record(agent, time.perf_counter() - started, retries=attempt, error=True)
+                raise
+            finally:
+                self.scheduler.release(ticket, _total_tokens(getattr(response, 'usage', None)))
+
+            if response is not None:
+                self._record(agent, time.perf_counter() - started, retries=attempt,
+                             usage=getattr(response, 'usage', None))
+                return response
+            await asyncio.sleep(self._backoff_delay(attempt, error))
+            attempt += 1
+
+    def stream(self, agent: str, prompt_type: str = "chat", use_cache: bool = True,
+               priority: str = "default", deadline: Optional[float] = None, **kwargs) -> Iterator[str]:
+        """Text deltas of a streamed completion, holding a scheduler slot until the stream ends
+
+        A cached answer to the same request is yielded in one piece, and a
+        finished stream is cached like a plain response. Only starting the
+        stream is retried; once text has been yielded, errors are raised.
+        """
+        kwargs.pop('stream', None)
+        key = self._request_key(use_cache, kwargs)
+        cached = self._cached(key, agent, prompt_type)
+        if cached is not None:
+            yield cached.choices[0].message.content or ""
+            return
+
+        tokens = estimate_request_tokens(kwargs)
+        until = self.scheduler.deadline_for(priority, deadline)
+        attempt = 0
+        while True:
+            ticket = self.scheduler.acquire(priority, tokens, until)
+            started = time.perf_counter()
+            collected = _StreamedText()
+            try:
+                try:
+                    chunks = self.client.chat.completions.create(stream=True, **kwargs)
+                except RETRYABLE_ERRORS as e:
+                    if attempt >= self.max_retries:
+                        self._record(agent, time.perf_counter() - started, retries=attempt, error=True)
+                        raise
+                    error = e
+                except Exception:
+                    self._record(agent, time.perf_counter() - started, retries=attempt, error=True)
+                    raise
+                else:
+                    try:
+                        for chunk in chunks:
+                            delta = collected.add(chunk)
+                            if delta:
+                                yield delta
+                    except Exception:
+                        self._record(agent, time.perf_counter() - started, retries=attempt, error=True)
+                        raise
+                    except GeneratorExit:
+                        # The caller stopped reading early
+                        self._record(agent, time.perf_counter() - started, retries=attempt, usage=collected.usage)
+                        raise
+                    finally:
+                        chunks.close()
+                    self._record(agent, time.perf_counter() - started, retries=attempt, usage=collected.usage)
+                    self._remember(key, collected.completion(), agent, prompt_type)
+                    return
+            finally:
+                self.scheduler.release(ticket, _total_tokens(collected.usage))
+            time.sleep(self._backoff_delay(attempt, error))
+            attempt += 1
+
+    async def astream(self, agent: str, prompt_type: str = "chat", use_cache: bool = True,
+                      priority: str = "default", deadline: Optional[float] = None,
+                      **kwargs) -> AsyncIterator[str]:
+        """Async stream(): text deltas of a streamed completion"""
+        kwargs.pop('stream', None)
+        key = self._request_key(use_cache, kwargs)
+        cached = self._cached(key, agent, prompt_type)
+        if cached is not None:
+            yield cached.choices[0].message.content or ""
+            return
+
+        client = self._async_client()[0]
+        tokens = estimate_request_tokens(kwargs)
+        until = self.scheduler.deadline_for(priority, deadline)
+        attempt = 0
+        while True:
+            ticket = await self.scheduler.acquire_async(priority, tokens, until)
+            started = time.perf_counter()
+            collected = _StreamedText()
+            try:
+                try:
+                    chunks = await client.chat.completions.create(stream=True, **kwargs)
+                except RETRYABLE_ERRORS as e:
+                    if attempt >= self.max_retries:
+                        self._record(agent, time.perf_counter() - started, retries=attempt, error=True)
+                        raise
+                    error = e
+                except Exception:
+                    self._record(agent, time.perf_counter() - started, retries=attempt, error=True)
+                    raise
+                else:
+                    try:
+                        async for chunk in chunks:
+                            delta = collected.add(chunk)
+                            if delta:
+                                yield delta
+                    except Exception:
+                        self._record(agent, time.perf_counter() - started, retries=attempt, error=True)
+                        raise
+                    except GeneratorExit:
+                        self._record(agent, time.perf_counter() - started, retries=attempt, usage=collected.usage)
+                        raise
+                    finally:
+                        await chunks.close()
+                    self._record(agent, time.perf_counter() - started, retries=attempt, usage=collected.usage)
+                    self._remember(key, collected.completion(), agent, prompt_type)
+                    return
+            finally:
+                self.scheduler.release(ticket, _total_tokens(collected.usage))
+            await asyncio.sleep(self._backoff_delay(attempt, error))
+            attempt += 1
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        if isinstance(error, APIStatusError):
+            try:
+                delay = max(delay, float(error.response.headers.get('retry-after', 0)))
+            except (TypeError, ValueError):
+                pass
+        delay = min(delay, MAX_BACKOFF)
+        if isinstance(error, RateLimitError):
+            # The provider's limit is shared: hold back every queued request, not just this one
+            self.scheduler.pause(delay)
+        return delay
+
+    def _record(self, agent: str, latency: float, retries: int = 0, usage=None, error: bool = False):
+        with self._metrics_lock:
+            counters = self._usage.setdefault(agent, _AgentUsage())
+            counters.requests += 1
+            counters.retries += retries
+            counters.latency_seconds += latency
+            if error:
+                counters.errors += 1
+            if usage is not None:
+                counters.prompt_tokens += getattr(usage, 'prompt_tokens', 0) or 0
+                counters.completion_tokens += getattr(usage, 'completion_tokens', 0) or 0
+
+    def _record_coalesced(self, agent: str):
+        with self._metrics_lock:
+            self._usage.setdefault(agent, _AgentUsage()).coalesced += 1
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Usage counters per agent"""
+        with self._metrics_lock:
+            return {agent: counters.as_dict() for agent, counters in self._usage.items()}
+
+    def _add_usage_to(self, totals: Dict[str, _AgentUsage]):
+        with self._metrics_lock:
+            for agent, counters in self._usage.items():
+                total = totals.setdefault(agent, _AgentUsage())
+                for field, value in vars(counters).items():
+                    setattr(total, field, getattr(total, field) + value)
+
+    def close(self):
+        self._http.close()
+
+    async def aclose(self):
+        """Close the async connection pool of the running event loop"""
+        state = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state[0].close()
+
+
+# Global instances, one per API key, sharing one response cache
+_gateways: Dict[str, LLMGateway] = {}
+_gateways_lock = threading.Lock()
+_response_cache: Optional[ResponseCache] = None
+_response_cache_loaded = False
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide LLM response cache, or None if LLM_CACHE=0
+
+    Memory only unless LLM_CACHE_PATH names the SQLite file for the disk tier;
+    LLM_CACHE_DISK_PROMPT_TYPES (comma-separated) limits what is written there.
+    """
+    global _response_cache, _response_cache_loaded
+    with _response_cache_lock:
+        if not _response_cache_loaded:
+            _response_cache_loaded = True
+            if os.getenv('LLM_CACHE', '1').lower() not in ('0', 'false', 'no'):
+                _response_cache = ResponseCache(
+                    max_bytes=_env_number('LLM_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+                    ttl=_env_number('LLM_CACHE_TTL', DEFAULT_TTL, float),
+                    path=os.getenv('LLM_CACHE_PATH') or None,
+                    disk_max_bytes=_env_number('LLM_CACHE_DISK_MAX_BYTES', DEFAULT_DISK_MAX_BYTES),
+                    disk_prompt_types=_env_list('LLM_CACHE_DISK_PROMPT_TYPES')
+                )
+        return _response_cache
+
+
+def get_llm_gateway(api_key: str = None) -> LLMGateway:
+    """Process-wide gateway for an API key (GROQ_API_KEY by default)"""
+    api_key = api_key or os.getenv('GROQ_API_KEY')
+    if not api_key:
+        raise ValueError("GROQ_API_KEY not found in environment variables or parameters")
+    with _gateways_lock:
+        if api_key not in _gateways:
+            _gateways[api_key] = LLMGateway(api_key)
+        return _gateways[api_key]
+
+
+def get_llm_client(agent: str, api_key: str = None, priority: str = "default") -> AgentLLMClient:
+    """Chat client for an agent, backed by the shared gateway (``priority``: interactive, default or batch)"""
+    return get_llm_gateway(api_key).client_for(agent, priority)
+
+
+def llm_cache_metrics() -> Optional[Dict[str, Any]]:
+    """Response cache sizes and hit/miss counters per agent and prompt type (None if disabled)"""
+    cache = get_response_cache()
+    return cache.metrics() if cache is not None else None
+
+
+def llm_scheduler_metrics() -> list:
+    """Queue depth, admissions, drops and waits per priority class, one entry per gateway"""
+    with _gateways_lock:
+        gateways = list(_gateways.values())
+    return [gateway.scheduler.metrics() for gateway in gateways]
+
+
+def llm_usage_metrics() -> Dict[str, Dict[str, Any]]:
+    """Per-agent usage across all gateways in this process"""
+    with _gateways_lock:
+        gateways = list(_gateways.values())
+    totals: Dict[str, _AgentUsage] = {}
+    for gateway in gateways:
+        gateway._add_usage_to(totals)
+    return {agent: counters.as_dict() for agent, counters in totals.items()}
@@ -0,0 +1,336 @@
+"""
+LLM Request Scheduler
+Admits LLM requests in priority order (interactive before default before batch) under
+concurrency limits and requests-per-minute / tokens-per-minute budgets, drops requests
+whose queueing deadline passes, and reports queue depth and waits per priority class.
+
+The scheduling core (submit / dispatch / release) never blocks and takes its time
+from ``clock``, so it can be driven step by step with a fake clock; ``acquire`` and
+``acquire_async`` wrap it for threads and event loops.
+"""
+
+import asyncio
+import bisect
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Priority classes, most urgent first
+PRIORITIES = ("interactive", "default", "batch")
+
+# How long a request may wait for admission before it is dropped (None: no limit)
+QUEUE_TIMEOUTS = {"interactive": 30.0, "default": 120.0, "batch": None}
+
+# Share of each rate budget that batch requests may not use, kept for interactive traffic
+BATCH_RESERVE = 0.25
+
+# Longest a blocked waiter sleeps before checking the queue again
+MAX_WAIT = 1.0
+
+QUEUED, RUNNING, DROPPED, DONE = "queued", "running", "dropped", "done"
+
+
+class LLMDeadlineExceeded(Exception):
+    """Raised when a request is dropped because it could not start before its deadline"""
+
+
+def estimate_request_tokens(request: Dict[str, Any]) -> int:
+    """Rough token cost of a chat completion request: prompt characters / 4 plus max_tokens"""
+    chars = 0
+    for message in request.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            chars += sum(len(part.get("text", "")) for part in content if isinstance(part, dict))
+    return chars // 4 + int(request.get("max_tokens") or 1024)
+
+
+class TokenBucket:
+    """``per_minute`` units refilled continuously, at most one minute's worth banked
+
+    ``per_minute <= 0`` means unlimited. The level may go negative when a
+    request turns out to cost more than estimated; later requests wait it off.
+    """
+
+    def __init__(self, per_minute: float, now: float):
+        self.per_minute = per_minute
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = now
+
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+
+    def refill(self, now: float):
+        if now > self.updated:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.per_minute / 60.0)
+            self.updated = now
+
+    def wait_time(self, amount: float, now: float, reserve: float = 0.0) -> float:
+        """Seconds until ``amount`` can be taken leaving ``reserve`` (a share of capacity) behind"""
+        if self.unlimited:
+            return 0.0
+        self.refill(now)
+        # A request bigger than the whole bucket only needs a full bucket
+        needed = min(amount, self.capacity * (1 - reserve)) + reserve * self.capacity
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) * 60.0 / self.per_minute
+
+    def take(self, amount: float):
+        if not self.unlimited:
+            self.level -= amount
+
+
+class Ticket:
+    """One request's place in the scheduler"""
+
+    def __init__(self, seq: int, priority: str, tokens: int, deadline: Optional[float], lane: str,
+                 enqueued_at: float, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.seq = seq
+        self.priority = priority
+        self.rank = PRIORITIES.index(priority)
+        self.tokens = tokens
+        self.deadline = deadline
+        self.lane = lane
+        self.enqueued_at = enqueued_at
+        self.state = QUEUED
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def __lt__(self, other: 'Ticket') -> bool:
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+    def _wake(self):
+        # Called with the scheduler lock held, possibly from another thread
+        if self.event is not None:
+            self.event.set()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _ClassStats:
+    def __init__(self):
+        self.admitted = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.wait_seconds = 0.0
+
+    def as_dict(self, depth: int) -> Dict[str, Any]:
+        return {
+            "queued": depth,
+            "max_queued": self.max_depth,
+            "admitted": self.admitted,
+            "dropped": self.dropped,
+            "avg_wait_ms": round(1000 * self.wait_seconds / self.admitted, 1) if self.admitted else 0.0
+        }
+
+
+class LLMScheduler:
+    """Priority queue in front of the LLM provider
+
+    Requests run in two lanes with their own concurrency limits: ``sync``
+    (worker threads, ``max_concurrency``) and ``async`` (event loops,
+    ``max_async_concurrency``). Both share the rate budgets. The queue is
+    strictly ordered by priority class, then arrival: when the request at the
+    head has to wait for budget, nothing behind it starts either. Batch
+    requests additionally leave ``BATCH_RESERVE`` of each budget unused.
+    A request still queued at its deadline is dropped with LLMDeadlineExceeded.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_async_concurrency: int = 256,
+                 requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.limits = {"sync": max_concurrency, "async": max_async_concurrency}
+        now = clock()
+        self.requests = TokenBucket(requests_per_minute, now)
+        self.tokens = TokenBucket(tokens_per_minute, now)
+        self._queue: List[Ticket] = []
+        self._in_flight = {"sync": 0, "async": 0}
+        self._paused_until = now
+        self._seq = itertools.count()
+        self._stats = {priority: _ClassStats() for priority in PRIORITIES}
+        self._lock = threading.RLock()
+
+    def deadline_for(self, priority: str, timeout: Optional[float] = None) -> Optional[float]:
+        """Absolute deadline for a request queued now (``timeout`` overrides the class default)"""
+        if timeout is None:
+            timeout = QUEUE_TIMEOUTS.get(priority)
+        return None if timeout is None else self.clock() + timeout
+
+    # Scheduling core (non-blocking)
+
+    def submit(self, priority: str = "default", tokens: int = 0, deadline: Optional[float] = None,
+               lane: str = "sync", loop: Optional[asyncio.AbstractEventLoop] = None) -> Ticket:
+        """Queue a request and admit whatever can start now"""
+        if priority not in PRIORITIES:
+            priority = "default"
+        with self._lock:
+            ticket = Ticket(next(self._seq), priority, tokens, deadline, lane, self.clock(), loop)
+            bisect.insort(self._queue, ticket)
+            stats = self._stats[priority]
+            stats.max_depth = max(stats.max_depth, self._depth(priority))
+            self.dispatch()
+            return ticket
+
+    def dispatch(self) -> List[Ticket]:
+        """Drop expired requests and start queued ones in priority order; returns those started"""
+        started = []
+        with self._lock:
+            now = self.clock()
+            for ticket in [t for t in self._queue if t.deadline is not None and now >= t.deadline]:
+                self._queue.remove(ticket)
+                ticket.state = DROPPED
+                self._stats[ticket.priority].dropped += 1
+                ticket._wake()
+            if now < self._paused_until:
+                return started
+
+            for ticket in list(self._queue):
+                if self._in_flight[ticket.lane] >= self.limits[ticket.lane]:
+                    continue
+                reserve = BATCH_RESERVE if ticket.priority == "batch" else 0.0
+                if max(self.requests.wait_time(1, now, reserve),
+                       self.tokens.wait_time(ticket.tokens, now, reserve)) > 0:
+                    break
+                self.requests.take(1)
+                self.tokens.take(ticket.tokens)
+                self._queue.remove(ticket)
+                self._in_flight[ticket.lane] += 1
+                ticket.state = RUNNING
+                stats = self._stats[ticket.priority]
+                stats.admitted += 1
+                stats.wait_seconds += now - ticket.enqueued_at
+                ticket._wake()
+                started.append(ticket)
+        return started
+
+    def release(self, ticket: Ticket, used_tokens: Optional[int] = None):
+        """Finish a started request (charging its actual token use if known) or withdraw a queued one"""
+        with self._lock:
+            if ticket.state == RUNNING:
+                self._in_flight[ticket.lane] -= 1
+                if used_tokens is not None:
+                    self.tokens.take(used_tokens - ticket.tokens)
+            elif ticket.state == QUEUED:
+                self._queue.remove(ticket)
+            ticket.state = DONE
+            self.dispatch()
+
+    def promote(self, ticket: Ticket, priority: str, deadline: Optional[float]):
+        """Move a queued request up to ``priority`` and out to ``deadline`` where those are more
+        lenient than its own (for callers that join an identical request already queued)"""
+        with self._lock:
+            if ticket.state != QUEUED:
+                return
+            if priority in PRIORITIES and PRIORITIES.index(priority) < ticket.rank:
+                # Keeps its arrival order within the new class
+                self._queue.remove(ticket)
+                ticket.priority, ticket.rank = priority, PRIORITIES.index(priority)
+                bisect.insort(self._queue, ticket)
+            if ticket.deadline is not None and (deadline is None or deadline > ticket.deadline):
+                ticket.deadline = deadline
+            self.dispatch()
+
+    def pause(self, seconds: float):
+        """Start nothing for ``seconds`` (e.g. after the provider answers 429 with Retry-After)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+
+    def next_change(self) -> Optional[float]:
+        """Seconds until the queue could move without a release: a deadline, the pause or budget refill"""
+        with self._lock:
+            if not self._queue:
+                return None
+            now = self.clock()
+            waits = [t.deadline - now for t in self._queue if t.deadline is not None]
+            if now < self._paused_until:
+                waits.append(self._paused_until - now)
+            else:
+                head = self._queue[0]
+                reserve = BATCH_RESERVE if head.priority == "batch" else 0.0
+                budget_wait = max(self.requests.wait_time(1, now, reserve),
+                                  self.tokens.wait_time(head.tokens, now, reserve))
+                if budget_wait > 0:
+                    waits.append(budget_wait)
+            return max(0.0, min(waits)) if waits else None
+
+    # Blocking wrappers
+
+    def acquire(self, priority: str = "default", tokens: int = 0, deadline: Optional[float] = None,
+                on_queued: Optional[Callable[[Ticket], None]] = None) -> Ticket:
+        """Wait (in this thread) until the request may start; raises LLMDeadlineExceeded if dropped
+
+        ``on_queued`` gets the ticket as soon as it is submitted, e.g. to promote it later.
+        """
+        ticket = self.submit(priority, tokens, deadline, lane="sync")
+        try:
+            if on_queued:
+                on_queued(ticket)
+            while True:
+                if ticket.state == RUNNING:
+                    return ticket
+                if ticket.state == DROPPED:
+                    raise LLMDeadlineExceeded(f"{priority} LLM request waited past its deadline")
+                ticket.event.wait(self._wait_time())
+                self.dispatch()
+        except BaseException:
+            self.release(ticket)
+            raise
+
+    async def acquire_async(self, priority: str = "default", tokens: int = 0, deadline: Optional[float] = None,
+                            on_queued: Optional[Callable[[Ticket], None]] = None) -> Ticket:
+        """acquire() for coroutines: waits without blocking the event loop"""
+        ticket = self.submit(priority, tokens, deadline, lane="async", loop=asyncio.get_running_loop())
+        try:
+            if on_queued:
+                on_queued(ticket)
+            while True:
+                if ticket.state == RUNNING:
+                    return ticket
+                if ticket.state == DROPPED:
+                    raise LLMDeadlineExceeded(f"{priority} LLM request waited past its deadline")
+                try:
+                    await asyncio.wait_for(asyncio.shield(ticket.future), self._wait_time())
+                except asyncio.TimeoutError:
+                    pass
+                self.dispatch()
+        except BaseException:
+            # Dropped, or cancelled while waiting: give the place (or a slot just granted) back
+            self.release(ticket)
+            raise
+
+    def _wait_time(self) -> float:
+        change = self.next_change()
+        return MAX_WAIT if change is None else min(max(change, 0.001), MAX_WAIT)
+
+    def _depth(self, priority: str) -> int:
+        return sum(1 for ticket in self._queue if ticket.priority == priority)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, admissions, drops and average wait per priority class, plus budget levels"""
+        with self._lock:
+            now = self.clock()
+            for bucket in (self.requests, self.tokens):
+                bucket.refill(now)
+            return {
+                "in_flight": dict(self._in_flight),
+                "limits": dict(self.limits),
+                "requests_per_minute": self.requests.per_minute or None,
+                "tokens_per_minute": self.tokens.per_minute or None,
+                "requests_available": None if self.requests.unlimited else round(self.requests.level, 1),
+                "tokens_available": None if self.tokens.unlimited else round(self.tokens.level),
+                "paused_seconds": round(max(0.0, self._paused_until - now), 1),
+                "classes": {priority: self._stats[priority].as_dict(self._depth(priority))
+                            for priority in PRIORITIES}
+            }
@@ -0,0 +1,177 @@
+"""
+Materialized Portfolio Aggregates
+Per-MFI totals over EMI tracking records (counts, disbursed, outstanding, collected,
+EMI, size buckets, monthly cohorts), updated per loan instead of recomputed per read
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+# Loan size buckets by principal: (name, exclusive upper bound)
+SIZE_BUCKETS = (('small_loans', 30000), ('medium_loans', 70000), ('large_loans', None))
+
+_AMOUNT_FIELDS = ('principal_disbursed', 'outstanding', 'collected', 'emi_total')
+
+
+def size_bucket(principal: float) -> str:
+    for name, upper in SIZE_BUCKETS:
+        if upper is None or principal < upper:
+            return name
+    return SIZE_BUCKETS[-1][0]
+
+
+class PortfolioAggregates:
+    """Running per-MFI portfolio totals
+
+    Each loan's last contribution is remembered, so ``add`` on an updated loan
+    subtracts the old contribution and adds the new one: an approval or a
+    payment costs O(1) regardless of portfolio size, and ``summary`` never
+    touches individual loans. ``verify`` rebuilds from scratch and compares.
+    """
+
+    def __init__(self):
+        self._contributions: Dict[str, Tuple] = {}
+        self._totals: Dict[str, Dict] = {}
+
+    def _contribution(self, loan: Dict) -> Tuple:
+        payments = loan.get('payments', [])
+        principal = float(loan.get('principal_amount', 0) or 0)
+        # Lazily loaded payment histories know their total without being read
+        amount_paid = getattr(payments, 'amount_paid', None)
+        return (
+            loan.get('mfi_id'),
+            loan.get('status'),
+            size_bucket(principal),
+            (loan.get('disbursement_date') or '')[:7] or None,
+            int(loan.get('tenure_months', 12) or 0),
+            len(payments),
+            principal,
+            float(loan.get('outstanding_balance', 0) or 0),
+            amount_paid() if amount_paid else sum(float(p.get('emi_amount', 0) or 0) for p in payments),
+            float(loan.get('emi_amount', 0) or 0)
+        )
+
+    def _apply(self, contribution: Tuple, sign: int):
+        mfi_id, status, size, cohort, tenure, payments_made, principal, outstanding, collected, emi = contribution
+        totals = self._totals.get(mfi_id)
+        if totals is None:
+            totals = self._totals[mfi_id] = {
+                'total_loans': 0, 'payments_made': 0, 'expected_payments': 0,
+                'by_status': {}, 'by_size': {}, 'cohorts': {},
+                **{field: 0.0 for field in _AMOUNT_FIELDS}
+            }
+
+        totals['total_loans'] += sign
+        totals['payments_made'] += sign * payments_made
+        if status == 'active':
+            totals['expected_payments'] += sign * tenure
+        for field, amount in zip(_AMOUNT_FIELDS, (principal, outstanding, collected, emi)):
+            totals[field] += sign * amount
+        self._bump(totals['by_status'], status, sign)
+        self._bump(totals['by_size'], size, sign)
+
+        if cohort:
+            entry = totals['cohorts'].setdefault(cohort, {
+                'loan_count': 0, 'total_disbursed': 0.0, 'current_outstanding': 0.0, 'total_payments': 0
+            })
+            entry['loan_count'] += sign
+            entry['total_disbursed'] += sign * principal
+            entry['current_outstanding'] += sign * outstanding
+            entry['total_payments'] += sign * payments_made
+            if entry['loan_count'] == 0:
+                del totals['cohorts'][cohort]
+
+        if totals['total_loans'] == 0:
+            del self._totals[mfi_id]
+
+    @staticmethod
+    def _bump(counts: Dict, key, sign: int):
+        counts[key] = counts.get(key, 0) + sign
+        if counts[key] == 0:
+            del counts[key]
+
+    def add(self, loan_id: str, loan: Dict):
+        """Account for a new loan or replace the contribution of an updated one"""
+        contribution = self._contribution(loan)
+        old = self._contributions.get(loan_id)
+        if old == contribution:
+            return
+        if old is not None:
+            self._apply(old, -1)
+        self._apply(contribution, 1)
+        self._contributions[loan_id] = contribution
+
+    def remove(self, loan_id: str):
+        old = self._contributions.pop(loan_id, None)
+        if old is not None:
+            self._apply(old, -1)
+
+    def rebuild(self, loans: Dict[str, Dict]):
+        """Drop all totals and recompute them from the given records"""
+        self._contributions.clear()
+        self._totals.clear()
+        for loan_id, loan in loans.items():
+            self.add(loan_id, loan)
+
+    def get_state(self) -> Dict:
+        """Plain-data state for snapshots"""
+        return {'contributions': self._contributions, 'totals': self._totals}
+
+    def set_state(self, state: Dict):
+        self._contributions = state['contributions']
+        self._totals = state['totals']
+
+    def mfi_ids(self) -> Iterable[str]:
+        return list(self._totals)
+
+    def summary(self, mfi_id: str) -> Dict:
+        """Portfolio totals for an MFI (all zero if it has no loans)"""
+        totals = self._totals.get(mfi_id) or {}
+        total_loans = totals.get('total_loans', 0)
+        by_status = dict(totals.get('by_status', {}))
+        principal = totals.get('principal_disbursed', 0.0)
+        return {
+            'total_loans': total_loans,
+            'active_loans': by_status.get('active', 0),
+            'completed_loans': by_status.get('completed', 0),
+            'loans_by_status': by_status,
+            'loans_by_size': {name: totals.get('by_size', {}).get(name, 0) for name, _ in SIZE_BUCKETS},
+            'principal_disbursed': round(principal, 2),
+            'outstanding': round(totals.get('outstanding', 0.0), 2),
+            'collected': round(totals.get('collected', 0.0), 2),
+            'average_loan_size': round(principal / total_loans, 2) if total_loans else 0.0,
+            'average_emi': round(totals.get('emi_total', 0.0) / total_loans, 2) if total_loans else 0.0,
+            'payments_made': totals.get('payments_made', 0),
+            'expected_payments': totals.get('expected_payments', 0),
+            'cohorts': [
+                {'cohort': key, **{k: round(v, 2) if isinstance(v, float) else v for k, v in entry.items()}}
+                for key, entry in sorted(totals.get('cohorts', {}).items(), reverse=True)
+            ]
+        }
+
+    def verify(self, loans: Dict[str, Dict], tolerance: float = 0.01) -> Optional[str]:
+        """Rebuild from scratch and compare; returns None if consistent, else the first mismatch"""
+        fresh = PortfolioAggregates()
+        fresh.rebuild(loans)
+        for mfi_id in set(self.mfi_ids()) | set(fresh.mfi_ids()):
+            mismatch = _diff(self.summary(mfi_id), fresh.summary(mfi_id), tolerance)
+            if mismatch:
+                return f"{mfi_id}: {mismatch}"
+        return None
+
+
+def _diff(current, expected, tolerance: float, path: str = '') -> Optional[str]:
+    if isinstance(expected, dict) and isinstance(current, dict):
+        for key in set(current) | set(expected):
+            mismatch = _diff(current.get(key), expected.get(key), tolerance, f"{path}.{key}")
+            if mismatch:
+                return mismatch
+        return None
+    if isinstance(expected, list) and isinstance(current, list) and len(current) == len(expected):
+        for i, (a, b) in enumerate(zip(current, expected)):
+            mismatch = _diff(a, b, tolerance, f"{path}[{i}]")
+            if mismatch:
+                return mismatch
+        return None
+    if isinstance(expected, float) and isinstance(current, (int, float)):
+        return None if abs(current - expected) <= tolerance else f"{path}: {current} != {expected}"
+    return None if current == expected else f"{path}: {current} != {expected}"
@@ -0,0 +1,189 @@
+"""
+Portfolio Aging Engine
+Days-past-due (DPD) buckets and PAR per MFI over EMI tracking records, maintained
+incrementally as payments arrive and as the clock advances
+"""
+
+import heapq
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+# DPD buckets and the highest DPD in each (the last bucket is open-ended)
+DPD_BUCKETS = ('0', '1-30', '31-60', '61-90', '90+')
+BUCKET_LIMITS = (0, 30, 60, 90)
+
+
+def bucket_index(dpd: int) -> int:
+    """Index into DPD_BUCKETS for a days-past-due value"""
+    for i, limit in enumerate(BUCKET_LIMITS):
+        if dpd <= limit:
+            return i
+    return len(BUCKET_LIMITS)
+
+
+def first_unpaid_due_date(loan: Dict) -> Optional[date]:
+    """Due date of the oldest unpaid installment of an active loan (None if not active)"""
+    if loan.get('status') != 'active':
+        return None
+    due_dates = loan.get('schedule', {}).get('due_dates', [])
+    paid = len(loan.get('payments', []))
+    value = due_dates[paid] if paid < len(due_dates) else loan.get('next_due_date')
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).date()
+    except ValueError:
+        return None
+
+
+class PortfolioAging:
+    """Incremental DPD aging with per-MFI bucket totals
+
+    Each tracked loan contributes its outstanding balance to exactly one bucket
+    of its MFI; dates are kept as ordinals so the state is plain data.
+    ``update`` moves a single loan between buckets when a payment changes it; ``advance_to`` moves the clock forward and only re-buckets the
+    loans whose DPD crossed a bucket boundary, found via a heap of upcoming
+    transition dates. PAR reads are O(1) lookups into the per-MFI totals.
+    """
+
+    def __init__(self, as_of: date = None):
+        self._today = (as_of or date.today()).toordinal()
+        self._loans: Dict[str, Dict] = {}
+        self._totals: Dict[str, Dict] = {}
+        self._transitions: List = []
+
+    @property
+    def as_of(self) -> date:
+        return date.fromordinal(self._today)
+
+    def _dpd(self, due: int) -> int:
+        return max(self._today - due, 0)
+
+    def _mfi_totals(self, mfi_id: str) -> Dict:
+        totals = self._totals.get(mfi_id)
+        if totals is None:
+            totals = self._totals[mfi_id] = {
+                'loans': [0] * len(DPD_BUCKETS),
+                'outstanding': [0.0] * len(DPD_BUCKETS)
+            }
+        return totals
+
+    def _add(self, loan_id: str, entry: Dict):
+        entry['bucket'] = bucket_index(self._dpd(entry['due']))
+        totals = self._mfi_totals(entry['mfi_id'])
+        totals['loans'][entry['bucket']] += 1
+        totals['outstanding'][entry['bucket']] += entry['outstanding']
+        self._loans[loan_id] = entry
+
+        # Schedule the next bucket change (none once the loan is 90+)
+        if entry['bucket'] < len(BUCKET_LIMITS):
+            change_on = entry['due'] + BUCKET_LIMITS[entry['bucket']] + 1
+            heapq.heappush(self._transitions, (change_on, loan_id, entry['due']))
+
+    def _remove(self, loan_id: str) -> Optional[Dict]:
+        entry = self._loans.pop(loan_id, None)
+        if entry is not None:
+            totals = self._totals[entry['mfi_id']]
+            totals['loans'][entry['bucket']] -= 1
+            totals['outstanding'][entry['bucket']] -= entry['outstanding']
+        return entry
+
+    def update(self, loan_id: str, loan: Dict):
+        """Track a new loan or re-age an updated one; loans that are no longer active drop out"""
+        self._remove(loan_id)
+        due = first_unpaid_due_date(loan)
+        if due is None:
+            return
+        self._add(loan_id, {
+            'mfi_id': loan.get('mfi_id'),
+            'due': due.toordinal(),
+            'outstanding': float(loan.get('outstanding_balance', 0) or 0)
+        })
+
+    def remove(self, loan_id: str):
+        self._remove(loan_id)
+
+    def rebuild(self, loans: Dict[str, Dict], as_of: date = None):
+        """Drop all state and age every loan from scratch"""
+        self._today = (as_of or date.today()).toordinal()
+        self._loans.clear()
+        self._totals.clear()
+        self._transitions = []
+        for loan_id, loan in loans.items():
+            self.update(loan_id, loan)
+
+    def advance_to(self, as_of: date = None):
+        """Move the clock and re-bucket only the loans whose DPD crossed a boundary"""
+        today = (as_of or date.today()).toordinal()
+        if today == self._today:
+            return
+        if today < self._today:
+            # Going back in time (e.g. a test clock): re-age everything tracked
+            entries = list(self._loans.items())
+            self._loans.clear()
+            self._totals.clear()
+            self._transitions = []
+            self._today = today
+            for loan_id, entry in entries:
+                self._add(loan_id, entry)
+            return
+
+        self._today = today
+        while self._transitions and self._transitions[0][0] <= today:
+            _, loan_id, due = heapq.heappop(self._transitions)
+            entry = self._loans.get(loan_id)
+            # Skip stale transitions of loans that were paid or re-aged since
+            if entry is None or entry['due'] != due or bucket_index(self._dpd(due)) == entry['bucket']:
+                continue
+            self._add(loan_id, self._remove(loan_id))
+
+    def get_state(self) -> Dict:
+        """Plain-data state for snapshots"""
+        return {'today': self._today, 'loans': self._loans, 'totals': self._totals,
+                'transitions': self._transitions}
+
+    def set_state(self, state: Dict):
+        self._today = state['today']
+        self._loans = state['loans']
+        self._totals = state['totals']
+        self._transitions = state['transitions']
+
+    def dpd(self, loan_id: str) -> int:
+        """Days past due of a tracked loan (0 if current or not tracked)"""
+        entry = self._loans.get(loan_id)
+        return self._dpd(entry['due']) if entry else 0
+
+    def summary(self, mfi_id: str) -> Dict:
+        """Bucket counts/amounts and PAR30/PAR90 for an MFI's active loans"""
+        totals = self._totals.get(mfi_id) or {'loans': [0] * len(DPD_BUCKETS), 'outstanding': [0.0] * len(DPD_BUCKETS)}
+        outstanding = totals['outstanding']
+        total_outstanding = sum(outstanding)
+        par_30 = outstanding[2] + outstanding[3] + outstanding[4]
+        par_90 = outstanding[4]
+        return {
+            'as_of': self.as_of.isoformat(),
+            'active_loans': sum(totals['loans']),
+            'total_outstanding': round(total_outstanding, 2),
+            'buckets': {
+                name: {'loans': totals['loans'][i], 'outstanding': round(outstanding[i], 2)}
+                for i, name in enumerate(DPD_BUCKETS)
+            },
+            'overdue_loans': sum(totals['loans'][1:]),
+            'overdue_amount': round(sum(outstanding[1:]), 2),
+            'par_30_amount': round(par_30, 2),
+            'par_90_amount': round(par_90, 2),
+            'par_30_rate': round(par_30 / total_outstanding * 100, 2) if total_outstanding > 0 else 0.0,
+            'par_90_rate': round(par_90 / total_outstanding * 100, 2) if total_outstanding > 0 else 0.0
+        }
+
+    def overdue_loans(self, mfi_id: str = None, min_dpd: int = 1) -> List[Dict]:
+        """Tracked loans at or beyond ``min_dpd`` days past due, most overdue first"""
+        result = [
+            {'loan_id': loan_id, 'mfi_id': entry['mfi_id'], 'dpd': self._dpd(entry['due']),
+             'bucket': DPD_BUCKETS[entry['bucket']], 'outstanding_balance': entry['outstanding'],
+             'overdue_since': date.fromordinal(entry['due']).isoformat()}
+            for loan_id, entry in self._loans.items()
+            if (mfi_id is None or entry['mfi_id'] == mfi_id) and self._dpd(entry['due']) >= min_dpd
+        ]
+        result.sort(key=lambda item: item['dpd'], reverse=True)
+        return result
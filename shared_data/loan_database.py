@@ -3,63 +3,261 @@ Shared Loan Database Management
 Handles loan applications, approvals, and EMI tracking between borrower and MFI platforms
 """
 
-import json
+import atexit
+import bisect
+import marshal
 import os
-from datetime import datetime, timedelta
+import threading
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Any
 import uuid
 
+try:
+    from shared_data.loan_storage import get_storage_backend, ConcurrentModificationError, payment_totals
+    from shared_data.loan_snapshot import LazyRecords, encode_records, read_snapshot, write_snapshot, remove_snapshot
+    from shared_data.loan_indexes import RecordIndex
+    from shared_data.loan_aging import PortfolioAging
+    from shared_data.loan_aggregates import PortfolioAggregates
+    from shared_data.payment_journal import PaymentJournal
+    from shared_data.amortization import calculate_emi, split_payment, amortization_schedule
+except ImportError:
+    from loan_storage import get_storage_backend, ConcurrentModificationError, payment_totals
+    from loan_snapshot import LazyRecords, encode_records, read_snapshot, write_snapshot, remove_snapshot
+    from loan_indexes import RecordIndex
+    from loan_aging import PortfolioAging
+    from loan_aggregates import PortfolioAggregates
+    from payment_journal import PaymentJournal
+    from amortization import calculate_emi, split_payment, amortization_schedule
+
 class LoanDatabase:
-    def __init__(self):
+    # Journaled payments are folded into the main store after this many events
+    JOURNAL_COMPACT_EVERY = 500
+    
+    def __init__(self, data_dir: str = None, backend: str = None):
         # Use absolute path to ensure it works from any directory
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.data_dir = os.path.join(base_dir, "shared_data")
+        if data_dir is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            data_dir = os.path.join(base_dir, "shared_data")
+        self.data_dir = data_dir
         os.makedirs(self.data_dir, exist_ok=True)
         
         self.applications_file = os.path.join(self.data_dir, "loan_applications.json")
         self.mfi_list_file = os.path.join(self.data_dir, "mfi_directory.json")
         self.emi_tracking_file = os.path.join(self.data_dir, "emi_tracking.json")
+        self.payment_journal_file = os.path.join(self.data_dir, "emi_payments.journal")
+        
+        # Storage backend (SQLite in WAL mode unless LOAN_DB_BACKEND=json)
+        self.storage = get_storage_backend(self.data_dir, backend)
+        
+        # EMI payments go to an append-only journal first (see pay_emi)
+        self.payment_journal = PaymentJournal(self.payment_journal_file)
+        self._journal_events = 0
+        self._journal_offset = 0
         
-        # Initialize files
-        self._initialize_files()
+        # Secondary indexes, kept in sync on submit/approve/reject/pay
+        self.application_index = RecordIndex(('mfi_id', 'borrower_id', 'status'))
+        self.emi_index = RecordIndex(('mfi_id', 'borrower_id', 'status'))
+        # Days-past-due buckets and PAR per MFI, re-aged on payments and as days pass
+        self.aging = PortfolioAging()
+        # Materialized per-MFI portfolio totals for dashboards
+        self.portfolio_aggregates = PortfolioAggregates()
         
-        # Load data
-        self.applications = self._load_json(self.applications_file)
-        self.mfi_directory = self._load_json(self.mfi_list_file)
-        self.emi_tracking = self._load_json(self.emi_tracking_file)
-    
-    def _initialize_files(self):
-        """Initialize JSON files if they don't exist"""
-        if not os.path.exists(self.applications_file):
-            with open(self.applications_file, 'w') as f:
-                json.dump({"applications": {}, "approved_loans": {}}, f, indent=2)
+        # Load data: from the last snapshot plus the changes committed since,
+        # or in full from storage (payment histories are loaded lazily)
+        restored = self._restore_snapshot()
+        if not restored:
+            self.applications = self.storage.load_applications()
+            self.mfi_directory = self.storage.load_mfi_directory()
+            self.emi_tracking = self.storage.load_emi_tracking()
+            self.rebuild_indexes()
+            # Snapshotted loans already carry their schedules
+            self._backfill_schedules()
+        
+        # Recover anything a previous run journaled but never compacted into the store
+        self.compact_payment_journal()
+        if not restored:
+            self.save_snapshot()
+        atexit.register(self.close)
+    
+    def rebuild_indexes(self):
+        """Rebuild the in-memory secondary indexes from the loaded records"""
+        self.application_index.rebuild(self.applications.get('applications', {}))
+        self.emi_index.rebuild(self.emi_tracking)
+        self.aging.rebuild(self.emi_tracking)
+        self.portfolio_aggregates.rebuild(self.emi_tracking)
+    
+    def _restore_snapshot(self) -> bool:
+        """Load derived indexes from the snapshot if it matches the store
+        
+        Records stay encoded in the snapshot and are decoded one by one on first
+        access (LazyRecords), so a warm start does not touch every loan.
+        """
+        state = read_snapshot(self.storage.snapshot_path)
+        if not state:
+            return False
+        try:
+            if not self.storage.resume_from_snapshot(state['storage']):
+                return False
+            self.applications = {
+                entity: LazyRecords(records) for entity, records in state['applications'].items()
+            }
+            self.mfi_directory = state['mfi_directory']
+            self.emi_tracking = LazyRecords(state['emi_tracking'], self._decode_emi_loan)
+            self.application_index.set_state(state['indexes']['applications'])
+            self.emi_index.set_state(state['indexes']['emi'])
+            self.aging.set_state(state['indexes']['aging'])
+            self.portfolio_aggregates.set_state(state['indexes']['aggregates'])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Loan snapshot is incompatible, loading from storage: {e}")
+            return False
         
-        if not os.path.exists(self.mfi_list_file):
-            with open(self.mfi_list_file, 'w') as f:
-                json.dump({}, f, indent=2)
+        # Catch up on everything committed after the snapshot was taken
+        self.sync_changes(force=True)
+        return True
+    
+    def save_snapshot(self) -> bool:
+        """Write a snapshot of the current state for fast restarts
+        
+        Journaled payments are compacted first, so the snapshot reflects exactly
+        what is committed up to the storage's change-feed position.
+        """
+        if not self.storage.snapshot_path:
+            return False
+        try:
+            with self.payment_journal.locked():
+                self.sync_changes(force=True)
+                self.compact_payment_journal()
+                state = {
+                    'storage': self.storage.snapshot_state(),
+                    'applications': {
+                        entity: encode_records(records) for entity, records in self.applications.items()
+                    },
+                    'mfi_directory': self.mfi_directory,
+                    'emi_tracking': encode_records(self.emi_tracking, self._encode_emi_loan),
+                    'indexes': {
+                        'applications': self.application_index.get_state(),
+                        'emi': self.emi_index.get_state(),
+                        'aging': self.aging.get_state(),
+                        'aggregates': self.portfolio_aggregates.get_state()
+                    }
+                }
+                write_snapshot(self.storage.snapshot_path, state)
+            return True
+        except Exception as e:
+            print(f"Error saving loan snapshot: {e}")
+            remove_snapshot(self.storage.snapshot_path)
+            return False
+    
+    @staticmethod
+    def _encode_emi_loan(loan: Dict) -> bytes:
+        """Snapshot blob of an EMI record: header plus payment count and total"""
+        header = {k: v for k, v in loan.items() if k != 'payments'}
+        return marshal.dumps((header, *payment_totals(loan.get('payments', []))))
+    
+    def _decode_emi_loan(self, loan_id: str, blob: bytes) -> Dict:
+        loan, count, amount = marshal.loads(blob)
+        loan['payments'] = self.storage.lazy_payments(loan_id, count, amount)
+        return loan
+    
+    def _index_emi_loan(self, loan_id: str, loan: Dict):
+        self.emi_index.add(loan_id, loan)
+        self.aging.update(loan_id, loan)
+        self.portfolio_aggregates.add(loan_id, loan)
+    
+    def _backfill_schedules(self):
+        """Generate and persist schedules for loans approved before schedules were stored"""
+        missing = [loan for loan in self.emi_tracking.values() if not loan.get('schedule')]
+        if not missing:
+            return
+        try:
+            self._attach_schedules(missing)
+            with self.storage.transaction():
+                for loan in missing:
+                    self.storage.upsert_emi_loan(loan)
+                    self.storage.replace_installments(loan)
+        except Exception as e:
+            print(f"Error backfilling EMI schedules: {e}")
+    
+    def _attach_schedules(self, loans: List[Dict]):
+        """Attach a columnar installment schedule to each EMI record
         
-        if not os.path.exists(self.emi_tracking_file):
-            with open(self.emi_tracking_file, 'w') as f:
-                json.dump({}, f, indent=2)
+        Stored as parallel lists (due_dates, principal, interest, balance), one
+        entry per installment; computed for all loans in one vectorized call.
+        """
+        schedules = amortization_schedule(
+            [loan['principal_amount'] for loan in loans],
+            [loan['interest_rate'] for loan in loans],
+            [int(loan['tenure_months']) for loan in loans],
+            emi=[loan['emi_amount'] for loan in loans]
+        )
+        principal = schedules['principal'].round(2)
+        interest = schedules['interest'].round(2)
+        balance = schedules['balance'].round(2)
+        for i, loan in enumerate(loans):
+            tenure = int(loan['tenure_months'])
+            start = self._parse_date(loan.get('disbursement_date', '')) or datetime.now()
+            loan['schedule'] = {
+                'due_dates': [(start + timedelta(days=30 * k)).date().isoformat() for k in range(1, tenure + 1)],
+                'principal': principal[i, :tenure].tolist(),
+                'interest': interest[i, :tenure].tolist(),
+                'balance': balance[i, :tenure].tolist()
+            }
     
-    def _load_json(self, filepath: str) -> Dict:
-        """Load JSON file safely"""
+    def _parse_date(self, value: str) -> Optional[datetime]:
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None) if value else None
+        except ValueError:
+            return None
     
-    def _save_json(self, data: Dict, filepath: str):
-        """Save data to JSON file"""
+    def sync_changes(self, force: bool = False) -> int:
+        """Apply changes committed by other processes (e.g. the borrower app and
+        the MFI app) since the last sync; returns the number of records updated
+        
+        Called at the start of every public operation. Only the changed records
+        are reloaded, and the payment journal is tailed from the last offset.
+        """
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            changes = self.storage.poll_changes(force)
         except Exception as e:
-            print(f"Error saving to {filepath}: {e}")
+            print(f"Error polling loan database changes: {e}")
+            return 0
+        
+        emi_changed = False
+        for entity, record_id, record in changes:
+            if entity == 'applications':
+                self.applications.setdefault('applications', {})[record_id] = record
+                self.application_index.add(record_id, record)
+            elif entity == 'approved_loans':
+                self.applications.setdefault('approved_loans', {})[record_id] = record
+            elif entity == 'mfi_directory':
+                self.mfi_directory[record_id] = record
+            elif entity == 'emi_schedules':
+                self.emi_tracking[record_id] = record
+                self._index_emi_loan(record_id, record)
+                emi_changed = True
+        
+        # Reloaded loans only reflect compacted payments; re-apply the journal
+        if emi_changed:
+            self._journal_offset = 0
+        self._sync_journal_tail()
+        return len(changes)
+    
+    def _sync_journal_tail(self):
+        """Apply payment events appended to the journal by any process"""
+        size = self.payment_journal.size()
+        if size == self._journal_offset:
+            return
+        if size < self._journal_offset:
+            # Journal was compacted by another process; its events are in the store
+            self._journal_offset = 0
+        events, self._journal_offset = self.payment_journal.read_events_from(self._journal_offset)
+        for event in events:
+            if event.get('event') == 'emi_payment':
+                self._apply_payment(event['loan_id'], event['payment'], event.get('loan_state', {}))
     
     def register_mfi(self, mfi_data: Dict) -> bool:
         """Register an MFI in the directory"""
+        self.sync_changes()
         try:
             mfi_id = mfi_data.get('mfi_id')
             if not mfi_id:
@@ -71,7 +269,7 @@ class LoanDatabase:
             target_segments = mfi_data.get('target_segments', {})
             financial_compliance = mfi_data.get('financial_compliance', {})
             
-            self.mfi_directory[mfi_id] = {
+            mfi = {
                 'name': basic_details.get('mfi_name', 'Unknown MFI'),
                 'location': f"{basic_details.get('head_office_address', '')}, {basic_details.get('operating_states', '')}".strip(', '),
                 'contact': basic_details.get('contact_person', {}).get('name', ''),
@@ -85,7 +283,9 @@ class LoanDatabase:
                 'status': 'active'
             }
             
-            self._save_json(self.mfi_directory, self.mfi_list_file)
+            with self.storage.transaction():
+                self.storage.upsert_mfi(mfi_id, mfi)
+            self.mfi_directory[mfi_id] = mfi
             return True
         except Exception as e:
             print(f"Error registering MFI: {e}")
@@ -93,6 +293,7 @@ class LoanDatabase:
     
     def get_available_mfis(self) -> List[Dict]:
         """Get list of available MFIs for borrowers"""
+        self.sync_changes()
         active_mfis = []
         for mfi_id, mfi_data in self.mfi_directory.items():
             if mfi_data.get('status') == 'active':
@@ -108,6 +309,7 @@ class LoanDatabase:
     
     def submit_loan_application(self, borrower_data: Dict, mfi_id: str, loan_details: Dict) -> str:
         """Submit a new loan application"""
+        self.sync_changes()
         try:
             app_id = f"APP_{str(uuid.uuid4())[:8]}_{datetime.now().strftime('%Y%m%d')}"
             
@@ -133,37 +335,56 @@ class LoanDatabase:
             if 'applications' not in self.applications:
                 self.applications['applications'] = {}
             
+            with self.storage.transaction():
+                self.storage.upsert_application(application)
             self.applications['applications'][app_id] = application
-            self._save_json(self.applications, self.applications_file)
+            self.application_index.add(app_id, application)
             
             return app_id
         except Exception as e:
             print(f"Error submitting application: {e}")
             return ""
     
-    def get_applications_for_mfi(self, mfi_id: str) -> List[Dict]:
-        """Get all applications for a specific MFI"""
-        applications = []
-        for app_id, app_data in self.applications.get('applications', {}).items():
-            if app_data.get('mfi_id') == mfi_id:
-                applications.append(app_data)
-        return applications
-    
-    def get_applications_for_borrower(self, borrower_id: str) -> List[Dict]:
-        """Get all applications for a specific borrower"""
-        applications = []
-        for app_id, app_data in self.applications.get('applications', {}).items():
-            if app_data.get('borrower_id') == borrower_id:
-                applications.append(app_data)
-        return applications
+    def get_applications_for_mfi(self, mfi_id: str, status: str = None) -> List[Dict]:
+        """Get all applications for a specific MFI, optionally filtered by status"""
+        self.sync_changes()
+        criteria = {'mfi_id': mfi_id}
+        if status:
+            criteria['status'] = status
+        all_apps = self.applications.get('applications', {})
+        return [all_apps[app_id] for app_id in self.application_index.lookup(**criteria)]
+    
+    def get_application(self, app_id: str) -> Optional[Dict]:
+        """Get a single application by ID"""
+        self.sync_changes()
+        return self.applications.get('applications', {}).get(app_id)
+    
+    def get_applications_for_borrower(self, borrower_id: str, status: str = None) -> List[Dict]:
+        """Get all applications for a specific borrower, optionally filtered by status"""
+        self.sync_changes()
+        criteria = {'borrower_id': borrower_id}
+        if status:
+            criteria['status'] = status
+        all_apps = self.applications.get('applications', {})
+        return [all_apps[app_id] for app_id in self.application_index.lookup(**criteria)]
+    
+    def get_emi_loans_for_mfi(self, mfi_id: str, status: str = None) -> List[Dict]:
+        """Get EMI tracking records for a specific MFI, optionally filtered by status"""
+        self.sync_changes()
+        criteria = {'mfi_id': mfi_id}
+        if status:
+            criteria['status'] = status
+        return [self.emi_tracking[loan_id] for loan_id in self.emi_index.lookup(**criteria)]
     
     def approve_loan(self, app_id: str, approval_data: Dict) -> bool:
         """Approve a loan application"""
+        self.sync_changes()
         try:
             if app_id not in self.applications.get('applications', {}):
                 return False
             
-            application = self.applications['applications'][app_id]
+            # Work on a copy so a failed or conflicting write leaves memory untouched
+            application = dict(self.applications['applications'][app_id])
             application['status'] = 'approved'
             application['approval_date'] = datetime.now().isoformat()
             application['approved_amount'] = approval_data.get('approved_amount', application['loan_amount'])
@@ -178,47 +399,60 @@ class LoanDatabase:
             # Calculate EMI
             loan_amount = application['approved_amount']
             tenure_months = application['loan_tenure']
-            monthly_rate = application['interest_rate'] / 100 / 12
-            
-            if monthly_rate > 0:
-                emi = loan_amount * monthly_rate * (1 + monthly_rate)**tenure_months / ((1 + monthly_rate)**tenure_months - 1)
-            else:
-                emi = loan_amount / tenure_months
+            emi = calculate_emi(loan_amount, application['interest_rate'], tenure_months)
             
             application['emi_amount'] = round(emi, 2)
             application['total_amount'] = round(emi * tenure_months, 2)
             
-            self.applications['approved_loans'][app_id] = application
+            # Persist application, approved loan and EMI tracking in one transaction
+            with self.storage.transaction():
+                self.storage.upsert_application(application)
+                self.storage.upsert_approved_loan(application)
+                emi_loan = self._initialize_emi_tracking(app_id, application)
             
-            # Initialize EMI tracking
-            self._initialize_emi_tracking(app_id, application)
-            
-            self._save_json(self.applications, self.applications_file)
+            self.applications['applications'][app_id] = application
+            self.applications['approved_loans'][app_id] = application
+            self.emi_tracking[app_id] = emi_loan
+            self.application_index.add(app_id, application)
+            self._index_emi_loan(app_id, emi_loan)
             return True
+        except ConcurrentModificationError as e:
+            print(f"Loan {app_id} was modified by another process, not approved: {e}")
+            self.sync_changes(force=True)
+            return False
         except Exception as e:
             print(f"Error approving loan: {e}")
             return False
     
     def reject_loan(self, app_id: str, reason: str) -> bool:
         """Reject a loan application"""
+        self.sync_changes()
         try:
             if app_id not in self.applications.get('applications', {}):
                 return False
             
-            self.applications['applications'][app_id]['status'] = 'rejected'
-            self.applications['applications'][app_id]['rejection_date'] = datetime.now().isoformat()
-            self.applications['applications'][app_id]['rejection_reason'] = reason
+            application = dict(self.applications['applications'][app_id])
+            application['status'] = 'rejected'
+            application['rejection_date'] = datetime.now().isoformat()
+            application['rejection_reason'] = reason
             
-            self._save_json(self.applications, self.applications_file)
+            with self.storage.transaction():
+                self.storage.upsert_application(application)
+            self.applications['applications'][app_id] = application
+            self.application_index.add(app_id, application)
             return True
+        except ConcurrentModificationError as e:
+            print(f"Application {app_id} was modified by another process, not rejected: {e}")
+            self.sync_changes(force=True)
+            return False
         except Exception as e:
             print(f"Error rejecting loan: {e}")
             return False
     
-    def _initialize_emi_tracking(self, app_id: str, loan_data: Dict):
-        """Initialize EMI tracking for approved loan"""
+    def _initialize_emi_tracking(self, app_id: str, loan_data: Dict) -> Dict:
+        """Initialize EMI tracking for approved loan (caller holds the transaction)"""
         try:
-            self.emi_tracking[app_id] = {
+            emi_loan = {
                 'loan_id': app_id,
                 'borrower_id': loan_data['borrower_id'],
                 'mfi_id': loan_data['mfi_id'],
@@ -232,9 +466,13 @@ class LoanDatabase:
                 'next_due_date': self._calculate_next_due_date(loan_data.get('disbursement_date', '')),
                 'status': 'active'
             }
-            self._save_json(self.emi_tracking, self.emi_tracking_file)
+            self._attach_schedules([emi_loan])
+            self.storage.upsert_emi_loan(emi_loan)
+            self.storage.replace_installments(emi_loan)
+            return emi_loan
         except Exception as e:
             print(f"Error initializing EMI tracking: {e}")
+            raise
     
     def _calculate_next_due_date(self, disbursement_date: str) -> str:
         """Calculate next EMI due date"""
@@ -250,75 +488,364 @@ class LoanDatabase:
     def pay_emi(self, loan_id: str, payment_date: str = None) -> Dict:
         """Process EMI payment"""
         try:
-            if loan_id not in self.emi_tracking:
-                return {"success": False, "message": "Loan not found"}
-            
-            loan = self.emi_tracking[loan_id]
-            if loan['status'] != 'active':
-                return {"success": False, "message": "Loan is not active"}
-            
-            payment_date = payment_date or datetime.now().isoformat()
-            emi_amount = loan['emi_amount']
-            
-            # Calculate principal and interest components
-            outstanding = loan['outstanding_balance']
-            monthly_rate = loan['interest_rate'] / 100 / 12
-            interest_component = outstanding * monthly_rate
-            principal_component = emi_amount - interest_component
-            
-            # Record payment
-            payment = {
-                'payment_id': f"PAY_{str(uuid.uuid4())[:8]}",
-                'payment_date': payment_date,
-                'emi_amount': emi_amount,
-                'principal_component': round(principal_component, 2),
-                'interest_component': round(interest_component, 2),
-                'outstanding_before': round(outstanding, 2),
-                'outstanding_after': round(outstanding - principal_component, 2)
+            # Serialize payments across processes and catch up on their journal entries first
+            with self.payment_journal.locked():
+                self.sync_changes()
+                return self._record_payment(loan_id, payment_date)
+        except Exception as e:
+            return {"success": False, "message": f"Error processing payment: {e}"}
+    
+    def pay_emis_bulk(self, payments: List[Dict]) -> Dict:
+        """Process a batch of EMI payments, e.g. a field officer's collection day
+        
+        Each item is ``{'loan_id': ..., 'payment_date': ... (optional)}``; several
+        items may target the same loan and are applied in order. Invalid items are
+        reported and skipped. All valid payments are journaled in a single write
+        and persisted to the store in one transaction.
+        """
+        try:
+            with self.payment_journal.locked():
+                self.sync_changes()
+                
+                results, events, pending = [], [], {}
+                default_date = datetime.now().isoformat()
+                for item in payments:
+                    loan_id = item.get('loan_id') if isinstance(item, dict) else None
+                    if not loan_id:
+                        results.append({"success": False, "loan_id": loan_id, "message": "Missing loan_id"})
+                        continue
+                    event, error = self._prepare_payment(loan_id, item.get('payment_date') or default_date, pending)
+                    if error:
+                        results.append({"success": False, "loan_id": loan_id, "message": error})
+                        continue
+                    events.append(event)
+                    results.append(self._payment_result(event))
+                
+                # Write-ahead: one journal write for the whole batch, then apply and persist
+                backlog = self.payment_journal.size()
+                self.payment_journal.append(events)
+                self.payment_journal.sync()
+                for event in events:
+                    self._apply_payment(event['loan_id'], event['payment'], event['loan_state'],
+                                        check_duplicate=False)
+                
+                if backlog:
+                    # Earlier single payments are still journaled; fold everything in order
+                    self._journal_events += len(events)
+                    self.compact_payment_journal()
+                elif events:
+                    self._persist_payments(events)
+                    self.payment_journal.truncate()
+                    self._journal_offset = 0
+                
+                return {
+                    "success": True,
+                    "processed": len(events),
+                    "failed": len(results) - len(events),
+                    "results": results
+                }
+        except Exception as e:
+            return {"success": False, "message": f"Error processing bulk payments: {e}"}
+    
+    def _record_payment(self, loan_id: str, payment_date: str = None) -> Dict:
+        """Compute, journal and apply one EMI payment (caller holds the journal lock)"""
+        event, error = self._prepare_payment(loan_id, payment_date)
+        if error:
+            return {"success": False, "message": error}
+        
+        # Write-ahead: journal the event, then apply it in memory
+        self.payment_journal.append([event])
+        self._journal_offset = self.payment_journal.size()
+        self._apply_payment(loan_id, event['payment'], event['loan_state'], check_duplicate=False)
+        self._journal_events += 1
+        if self._journal_events >= self.JOURNAL_COMPACT_EVERY:
+            self.compact_payment_journal()
+        
+        return self._payment_result(event)
+    
+    def _prepare_payment(self, loan_id: str, payment_date: str = None, pending: Dict = None):
+        """Validate and compute one EMI payment without applying it
+        
+        ``pending`` carries per-loan state of earlier, not yet applied payments
+        in the same batch. Returns ``(event, None)`` or ``(None, error message)``.
+        """
+        if loan_id not in self.emi_tracking:
+            return None, "Loan not found"
+        
+        loan = self.emi_tracking[loan_id]
+        state = pending.get(loan_id) if pending is not None else None
+        if state is None:
+            state = {
+                'outstanding_balance': loan['outstanding_balance'],
+                'status': loan['status'],
+                'payments_made': len(loan.get('payments', []))
             }
-            
-            loan['payments'].append(payment)
-            loan['outstanding_balance'] = round(outstanding - principal_component, 2)
-            
-            # Check if loan is fully paid
-            if loan['outstanding_balance'] <= 0:
-                loan['status'] = 'completed'
-                loan['completion_date'] = payment_date
+        if state['status'] != 'active':
+            return None, "Loan is not active"
+        
+        payment_date = payment_date or datetime.now().isoformat()
+        emi_amount = loan['emi_amount']
+        
+        # Calculate principal and interest components
+        outstanding = state['outstanding_balance']
+        interest_component, principal_component = split_payment(outstanding, loan['interest_rate'], emi_amount)
+        
+        # Record payment
+        payment = {
+            'payment_id': f"PAY_{str(uuid.uuid4())[:8]}",
+            'payment_date': payment_date,
+            'emi_amount': emi_amount,
+            'principal_component': round(principal_component, 2),
+            'interest_component': round(interest_component, 2),
+            'outstanding_before': round(outstanding, 2),
+            'outstanding_after': round(outstanding - principal_component, 2)
+        }
+        
+        loan_state = {'outstanding_balance': round(outstanding - principal_component, 2)}
+        
+        # Check if loan is fully paid
+        if loan_state['outstanding_balance'] <= 0:
+            loan_state['status'] = 'completed'
+            loan_state['completion_date'] = payment_date
+        else:
+            # Next due date comes from the precomputed schedule
+            due_dates = loan.get('schedule', {}).get('due_dates', [])
+            paid = state['payments_made'] + 1
+            if paid < len(due_dates):
+                loan_state['next_due_date'] = f"{due_dates[paid]}T00:00:00"
             else:
-                # Calculate next due date
                 last_payment = datetime.fromisoformat(payment_date.replace('Z', '+00:00'))
-                next_due = last_payment + timedelta(days=30)
-                loan['next_due_date'] = next_due.isoformat()
+                loan_state['next_due_date'] = (last_payment + timedelta(days=30)).isoformat()
+        
+        if pending is not None:
+            pending[loan_id] = {
+                'outstanding_balance': loan_state['outstanding_balance'],
+                'status': loan_state.get('status', state['status']),
+                'payments_made': state['payments_made'] + 1
+            }
+        return self._payment_event(loan_id, payment, loan_state), None
+    
+    def _payment_result(self, event: Dict) -> Dict:
+        """Caller-facing result for a recorded payment event"""
+        loan = self.emi_tracking[event['loan_id']]
+        loan_state = event['loan_state']
+        return {
+            "success": True,
+            "loan_id": event['loan_id'],
+            "message": "Payment recorded successfully",
+            "payment_details": event['payment'],
+            "remaining_balance": loan_state['outstanding_balance'],
+            "next_due_date": loan_state.get('next_due_date', loan.get('next_due_date', '')),
+            "status": loan_state.get('status', loan['status'])
+        }
+    
+    def _payment_event(self, loan_id: str, payment: Dict, loan_state: Dict) -> Dict:
+        """Journal record for one EMI payment"""
+        return {
+            'event': 'emi_payment',
+            'loan_id': loan_id,
+            'payment': payment,
+            'loan_state': loan_state
+        }
+    
+    def _apply_payment(self, loan_id: str, payment: Dict, loan_state: Dict,
+                       check_duplicate: bool = True) -> bool:
+        """Apply a payment to the in-memory loan; returns False if already applied
+        
+        ``check_duplicate=False`` is for events just created in this process,
+        which skips reading a lazily loaded payment history.
+        """
+        loan = self.emi_tracking.get(loan_id)
+        if loan is None:
+            return False
+        payments = loan.setdefault('payments', [])
+        if check_duplicate and self._has_payment(payments, payment['payment_id']):
+            return False
+        payments.append(payment)
+        loan.update(loan_state)
+        self._index_emi_loan(loan_id, loan)
+        return True
+    
+    def _has_payment(self, payments, payment_id: str) -> bool:
+        has_payment = getattr(payments, 'has_payment', None)
+        if has_payment:
+            return has_payment(payment_id)
+        return any(p.get('payment_id') == payment_id for p in reversed(payments))
+    
+    def compact_payment_journal(self) -> int:
+        """Fold journaled payments into the main store and truncate the journal
+        
+        Also used at startup for crash recovery: events not yet reflected in
+        memory are replayed first. Returns the number of events compacted.
+        """
+        with self.payment_journal.locked():
+            # Pick up loans other processes compacted so our versions are current
+            self.sync_changes()
+            events = self.payment_journal.read_events()
+            if not events:
+                self._journal_events = 0
+                return 0
             
-            self._save_json(self.emi_tracking, self.emi_tracking_file)
+            events = [event for event in events if event.get('event') == 'emi_payment']
+            for event in events:
+                self._apply_payment(event['loan_id'], event['payment'], event.get('loan_state', {}))
+            self._persist_payments(events)
             
-            return {
-                "success": True,
-                "message": "Payment recorded successfully",
-                "payment_details": payment,
-                "remaining_balance": loan['outstanding_balance'],
-                "next_due_date": loan.get('next_due_date', ''),
-                "status": loan['status']
-            }
+            self.payment_journal.truncate()
+            self._journal_events = 0
+            self._journal_offset = 0
+            return len(events)
+    
+    def _persist_payments(self, events: List[Dict]):
+        """Write already-applied payment events to the main store in one transaction"""
+        touched = {}
+        for event in events:
+            if event['loan_id'] in self.emi_tracking:
+                touched.setdefault(event['loan_id'], []).append(event['payment'])
+        
+        with self.storage.transaction():
+            for loan_id, payments in touched.items():
+                for payment in payments:
+                    self.storage.insert_payment(loan_id, payment)
+                self.storage.update_emi_state(self.emi_tracking[loan_id])
+    
+    def close(self):
+        """Compact the payment journal, snapshot the state and release storage handles"""
+        try:
+            if not self.payment_journal.closed:
+                self.compact_payment_journal()
+                self.save_snapshot()
+                self.payment_journal.close()
+            self.storage.close()
         except Exception as e:
-            return {"success": False, "message": f"Error processing payment: {e}"}
+            print(f"Error closing loan database: {e}")
+    
+    def get_installments_due(self, start_date: str, end_date: str, mfi_id: str = None,
+                             borrower_id: str = None, include_paid: bool = False) -> List[Dict]:
+        """Installments falling due between two ISO dates (inclusive), from the stored schedules
+        
+        Uses the backend's installment index when available, otherwise a
+        bisect over each candidate loan's sorted due dates.
+        """
+        self.sync_changes()
+        start_date, end_date = start_date[:10], end_date[:10]
+        rows = self.storage.query_installments(start_date, end_date, mfi_id, borrower_id)
+        
+        if rows is None:
+            if mfi_id or borrower_id:
+                criteria = {k: v for k, v in (('mfi_id', mfi_id), ('borrower_id', borrower_id)) if v}
+                loan_ids = self.emi_index.lookup(**criteria)
+            else:
+                loan_ids = list(self.emi_tracking)
+            rows = []
+            for loan_id in loan_ids:
+                loan = self.emi_tracking[loan_id]
+                schedule = loan.get('schedule')
+                if not schedule:
+                    continue
+                due_dates = schedule['due_dates']
+                lo = bisect.bisect_left(due_dates, start_date)
+                hi = bisect.bisect_right(due_dates, end_date)
+                for k in range(lo, hi):
+                    rows.append({
+                        'loan_id': loan_id,
+                        'installment_no': k + 1,
+                        'mfi_id': loan['mfi_id'],
+                        'borrower_id': loan['borrower_id'],
+                        'due_date': due_dates[k],
+                        'principal': schedule['principal'][k],
+                        'interest': schedule['interest'][k],
+                        'expected_balance': schedule['balance'][k]
+                    })
+            rows.sort(key=lambda row: (row['due_date'], row['loan_id']))
+        
+        result = []
+        for row in rows:
+            loan = self.emi_tracking.get(row['loan_id'])
+            if loan is None:
+                continue
+            paid = row['installment_no'] <= len(loan.get('payments', []))
+            if paid and not include_paid:
+                continue
+            row['emi_amount'] = round(row['principal'] + row['interest'], 2)
+            row['paid'] = paid
+            result.append(row)
+        return result
+    
+    def get_upcoming_installments(self, loan_id: str, count: int = 3) -> List[Dict]:
+        """Next unpaid installments of a loan from its stored schedule"""
+        loan = self.emi_tracking.get(loan_id)
+        if not loan or not loan.get('schedule'):
+            return []
+        schedule = loan['schedule']
+        first = len(loan.get('payments', []))
+        return [
+            {
+                'installment_no': k + 1,
+                'due_date': schedule['due_dates'][k],
+                'emi_amount': round(schedule['principal'][k] + schedule['interest'][k], 2),
+                'expected_balance': schedule['balance'][k]
+            }
+            for k in range(first, min(first + count, len(schedule['due_dates'])))
+        ]
+    
+    def get_portfolio_summary(self, mfi_id: str) -> Dict:
+        """Materialized portfolio totals for an MFI (counts, disbursed, outstanding, collected, cohorts)"""
+        self.sync_changes()
+        return self.portfolio_aggregates.summary(mfi_id)
+    
+    def verify_portfolio_aggregates(self) -> bool:
+        """Check the materialized aggregates against a full recomputation"""
+        self.sync_changes()
+        mismatch = self.portfolio_aggregates.verify(self.emi_tracking)
+        if mismatch:
+            print(f"Portfolio aggregates out of sync ({mismatch}), rebuilding")
+            self.portfolio_aggregates.rebuild(self.emi_tracking)
+            return False
+        return True
+    
+    def get_portfolio_aging(self, mfi_id: str, as_of: date = None) -> Dict:
+        """DPD buckets and PAR30/PAR90 for an MFI's active loans as of a date (default today)"""
+        self.sync_changes()
+        self.aging.advance_to(as_of)
+        return self.aging.summary(mfi_id)
+    
+    def get_overdue_loans(self, mfi_id: str = None, min_dpd: int = 1, as_of: date = None) -> List[Dict]:
+        """Active loans at least ``min_dpd`` days past due, most overdue first"""
+        self.sync_changes()
+        self.aging.advance_to(as_of)
+        return self.aging.overdue_loans(mfi_id, min_dpd)
     
     def get_loan_status(self, borrower_id: str) -> List[Dict]:
         """Get loan status for borrower"""
+        self.sync_changes()
+        self.aging.advance_to()
         loans = []
-        for loan_id, loan_data in self.emi_tracking.items():
-            if loan_data['borrower_id'] == borrower_id:
-                loans.append({
-                    'loan_id': loan_id,
-                    'mfi_name': self.mfi_directory.get(loan_data['mfi_id'], {}).get('name', 'Unknown MFI'),
-                    'principal_amount': loan_data['principal_amount'],
-                    'emi_amount': loan_data['emi_amount'],
-                    'outstanding_balance': loan_data['outstanding_balance'],
-                    'next_due_date': loan_data.get('next_due_date', ''),
-                    'status': loan_data['status'],
-                    'payments_made': len(loan_data['payments'])
-                })
+        for loan_id in self.emi_index.lookup(borrower_id=borrower_id):
+            loan_data = self.emi_tracking[loan_id]
+            loans.append({
+                'loan_id': loan_id,
+                'mfi_name': self.mfi_directory.get(loan_data['mfi_id'], {}).get('name', 'Unknown MFI'),
+                'principal_amount': loan_data['principal_amount'],
+                'emi_amount': loan_data['emi_amount'],
+                'outstanding_balance': loan_data['outstanding_balance'],
+                'next_due_date': loan_data.get('next_due_date', ''),
+                'status': loan_data['status'],
+                'payments_made': len(loan_data['payments']),
+                'days_past_due': self.aging.dpd(loan_id),
+                'upcoming_installments': self.get_upcoming_installments(loan_id)
+            })
         return loans
 
-# Global instance
-loan_db = LoanDatabase()
+# Global instance, created on first use (``from shared_data.loan_database import loan_db``)
+# so that importing the module alone never opens the default data directory
+_loan_db_lock = threading.Lock()
+
+def __getattr__(name: str):
+    if name == 'loan_db':
+        global loan_db
+        with _loan_db_lock:
+            if 'loan_db' not in globals():
+                loan_db = LoanDatabase()
+        return loan_db
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
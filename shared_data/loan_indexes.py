@@ -0,0 +1,97 @@
+"""
+Secondary Indexes for the shared LoanDatabase
+In-memory indexes over application and EMI records, maintained incrementally on every write
+"""
+
+from typing import Dict, List, Iterable, Tuple, Any
+
+
+class RecordIndex:
+    """Secondary indexes over a keyed collection of dict records
+
+    Each indexed field maps value -> ordered set of record ids (a dict with
+    None values, so lookups preserve insertion order like the old full scans).
+    ``add`` is idempotent and only touches the buckets whose value changed.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = tuple(fields)
+        self._values: Dict[str, Tuple[Any, ...]] = {}
+        self._buckets: Dict[str, Dict[Any, Dict[str, None]]] = {field: {} for field in self.fields}
+
+    def add(self, record_id: str, record: Dict):
+        """Index a new record or re-index an updated one"""
+        new_values = tuple(record.get(field) for field in self.fields)
+        old_values = self._values.get(record_id)
+        if old_values == new_values:
+            return
+
+        for i, field in enumerate(self.fields):
+            if old_values is not None and old_values[i] == new_values[i]:
+                continue
+            if old_values is not None:
+                self._discard(field, old_values[i], record_id)
+            self._buckets[field].setdefault(new_values[i], {})[record_id] = None
+        self._values[record_id] = new_values
+
+    def remove(self, record_id: str):
+        old_values = self._values.pop(record_id, None)
+        if old_values is None:
+            return
+        for i, field in enumerate(self.fields):
+            self._discard(field, old_values[i], record_id)
+
+    def _discard(self, field: str, value: Any, record_id: str):
+        bucket = self._buckets[field].get(value)
+        if bucket is not None:
+            bucket.pop(record_id, None)
+            if not bucket:
+                del self._buckets[field][value]
+
+    def lookup(self, **criteria) -> List[str]:
+        """Record ids matching all field=value criteria, in insertion order
+
+        Cost is proportional to the smallest matching bucket.
+        """
+        if not criteria:
+            return list(self._values)
+
+        buckets = []
+        for field, value in criteria.items():
+            if field not in self._buckets:
+                raise KeyError(f"Field '{field}' is not indexed")
+            bucket = self._buckets[field].get(value)
+            if not bucket:
+                return []
+            buckets.append(bucket)
+
+        buckets.sort(key=len)
+        smallest, others = buckets[0], buckets[1:]
+        return [record_id for record_id in smallest if all(record_id in other for other in others)]
+
+    def count(self, field: str, value: Any) -> int:
+        return len(self._buckets[field].get(value, ()))
+
+    def rebuild(self, records: Dict[str, Dict]):
+        """Drop and rebuild every index from scratch"""
+        self._values.clear()
+        for field in self.fields:
+            self._buckets[field].clear()
+        for record_id, record in records.items():
+            self.add(record_id, record)
+
+    def get_state(self) -> Dict:
+        """Plain-data state for snapshots"""
+        return {'fields': self.fields, 'values': self._values, 'buckets': self._buckets}
+
+    def set_state(self, state: Dict):
+        if tuple(state['fields']) != self.fields:
+            raise ValueError(f"Index state is for fields {state['fields']}, not {self.fields}")
+        self._values = state['values']
+        self._buckets = state['buckets']
+
+    def __contains__(self, record_id: str) -> bool:
+        return record_id in self._values
+
+    def __len__(self) -> int:
+        return len(self._values)
@@ -0,0 +1,112 @@
+"""
+LoanDatabase Snapshots
+Binary snapshot of the in-memory loan records and their derived indexes, so a restart
+skips per-record JSON decoding and index rebuilds and only catches up on what changed
+"""
+
+import marshal
+import os
+import sys
+import tempfile
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Mapping, Optional
+
+# Bump when the layout of the snapshot state changes
+SNAPSHOT_FORMAT = 2
+
+
+class LazyRecords(MutableMapping):
+    """Records restored from a snapshot, each decoded on first access
+
+    Every record is kept as its own marshal blob until it is read, so startup
+    cost does not grow with the number of records; ``decode(record_id, blob)``
+    can attach derived fields (e.g. lazy payment histories). Iterating keys,
+    ``len()`` and ``in`` never decode.
+    """
+
+    def __init__(self, encoded: Dict[str, bytes], decode: Callable[[str, bytes], Dict] = None):
+        self._records: Dict[str, Any] = encoded
+        self._decode = decode or (lambda record_id, blob: marshal.loads(blob))
+
+    def __getitem__(self, record_id: str) -> Dict:
+        record = self._records[record_id]
+        if type(record) is bytes:
+            record = self._records[record_id] = self._decode(record_id, record)
+        return record
+
+    def __setitem__(self, record_id: str, record: Dict):
+        self._records[record_id] = record
+
+    def __delitem__(self, record_id: str):
+        del self._records[record_id]
+
+    def __contains__(self, record_id) -> bool:
+        return record_id in self._records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __repr__(self) -> str:
+        return f"<LazyRecords: {len(self)} records>"
+
+
+def encode_records(records: Mapping[str, Dict], encode: Callable[[Dict], bytes] = marshal.dumps) -> Dict[str, bytes]:
+    """Per-record blobs for a snapshot; records never decoded are reused as they are"""
+    stored = records._records if isinstance(records, LazyRecords) else records
+    return {
+        record_id: record if type(record) is bytes else encode(record)
+        for record_id, record in stored.items()
+    }
+
+
+def _header() -> Dict:
+    # marshal output is only guaranteed readable by the same Python version
+    return {'format': SNAPSHOT_FORMAT, 'python': list(sys.version_info[:2])}
+
+
+def write_snapshot(path: str, state: Dict):
+    """Atomically write a snapshot (temp file + rename)
+
+    Uses marshal: it is in the standard library, reads and writes plain
+    dicts/lists/strings/numbers at C speed, and unlike pickle cannot run code
+    when a file is loaded.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or '.', prefix=f"{os.path.basename(path)}.", suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump(_header(), f)
+            f.write(marshal.dumps(state))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        remove_snapshot(tmp_path)
+        raise
+
+
+def read_snapshot(path: str) -> Optional[Dict]:
+    """Load a snapshot, or None if it is missing, unreadable or from another format/Python"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            header = marshal.load(f)
+            if header != _header():
+                return None
+            # One bulk read: marshal.load on a file object reads in tiny chunks
+            return marshal.loads(f.read())
+    except (EOFError, ValueError, TypeError, OSError) as e:
+        print(f"Ignoring unreadable loan snapshot {path}: {e}")
+        return None
+
+
+def remove_snapshot(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,1054 @@
+"""
+Loan Storage Backends
+Pluggable persistence layer for the shared LoanDatabase (SQLite in WAL mode by default,
+legacy JSON files as a fallback) plus a one-shot migrator from the JSON files
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import MutableSequence
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single-process use only
+    fcntl = None
+
+SCHEMA_VERSION = 2
+
+# Change-feed rows kept for processes and snapshots catching up; older rows are
+# pruned every CHANGE_LOG_PRUNE_EVERY writes. A reader whose position was pruned
+# reloads everything instead
+CHANGE_LOG_RETAIN = 20000
+CHANGE_LOG_PRUNE_EVERY = 1000
+
+# Attempts at switching a store to WAL, which the busy timeout does not cover
+WAL_SWITCH_ATTEMPTS = 8
+
+# Entities reported by the change feed
+VERSIONED_TABLES = {
+    'applications': 'application_id',
+    'approved_loans': 'application_id',
+    'mfi_directory': 'mfi_id',
+    'emi_schedules': 'loan_id',
+}
+
+
+# EMI record fields that change when a payment is posted
+EMI_STATE_FIELDS = ('outstanding_balance', 'status', 'next_due_date', 'completion_date')
+
+
+class ConcurrentModificationError(Exception):
+    """Raised when a record was changed by another process since it was last read"""
+
+
+class LazyPaymentList(MutableSequence):
+    """Payment history of a loan that is read from storage on first access
+
+    ``len()`` and ``amount_paid()`` are answered from counts known up front, and
+    payments appended before the first read are kept aside, so posting an EMI
+    does not load the loan's history. Any other access loads it once.
+    """
+
+    def __init__(self, loader: Callable[[], List[Dict]], count: int = 0, amount: float = 0.0):
+        self._loader = loader
+        self._count = count
+        self._amount = amount
+        self._items: Optional[List[Dict]] = None
+        self._appended: List[Dict] = []
+
+    @property
+    def loaded(self) -> bool:
+        return self._items is not None
+
+    def _load(self) -> List[Dict]:
+        if self._items is None:
+            items = self._loader()
+            stored = {p.get('payment_id') for p in items}
+            items.extend(p for p in self._appended if p.get('payment_id') not in stored)
+            self._items, self._appended = items, []
+        return self._items
+
+    def __len__(self) -> int:
+        return len(self._items) if self._items is not None else self._count + len(self._appended)
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def __setitem__(self, index, value):
+        self._load()[index] = value
+
+    def __delitem__(self, index):
+        del self._load()[index]
+
+    def insert(self, index: int, value: Dict):
+        self._load().insert(index, value)
+
+    def append(self, value: Dict):
+        if self._items is None:
+            self._appended.append(value)
+        else:
+            self._items.append(value)
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __reversed__(self):
+        return reversed(self._load())
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        if self._items is None:
+            return f"<LazyPaymentList: {len(self)} payments, not loaded>"
+        return repr(self._items)
+
+    def amount_paid(self) -> float:
+        if self._items is not None:
+            return sum(float(p.get('emi_amount', 0) or 0) for p in self._items)
+        return self._amount + sum(float(p.get('emi_amount', 0) or 0) for p in self._appended)
+
+    def has_payment(self, payment_id: str) -> bool:
+        return any(p.get('payment_id') == payment_id for p in reversed(self._load()))
+
+
+def payment_totals(payments) -> Tuple[int, float]:
+    """(count, amount paid) of a payment history without forcing a lazy load"""
+    amount_paid = getattr(payments, 'amount_paid', None)
+    if amount_paid:
+        return len(payments), amount_paid()
+    return len(payments), sum(float(p.get('emi_amount', 0) or 0) for p in payments)
+
+
+class LoanStorageBackend:
+    """Base interface for loan storage backends
+
+    Every mutating call must happen inside ``transaction()``; the backend
+    guarantees that all writes issued in one transaction are persisted
+    atomically (or not at all).
+    """
+
+    name = "base"
+
+    def load_applications(self) -> Dict:
+        """Return {"applications": {...}, "approved_loans": {...}}"""
+        raise NotImplementedError
+
+    def load_mfi_directory(self) -> Dict:
+        raise NotImplementedError
+
+    def load_emi_tracking(self) -> Dict:
+        """Return EMI tracking records keyed by loan id, with payments attached"""
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self):
+        raise NotImplementedError
+        yield
+
+    def upsert_application(self, application: Dict):
+        raise NotImplementedError
+
+    def upsert_approved_loan(self, loan: Dict):
+        raise NotImplementedError
+
+    def upsert_mfi(self, mfi_id: str, mfi_data: Dict):
+        raise NotImplementedError
+
+    def upsert_emi_loan(self, loan: Dict):
+        """Persist the EMI tracking header of a loan (payments are stored separately)"""
+        raise NotImplementedError
+
+    def update_emi_state(self, loan: Dict):
+        """Persist only the fields a payment changes (see EMI_STATE_FIELDS)"""
+        self.upsert_emi_loan(loan)
+
+    def insert_payment(self, loan_id: str, payment: Dict):
+        raise NotImplementedError
+
+    def replace_installments(self, loan: Dict):
+        """Persist a loan's precomputed installment schedule in queryable form (optional)"""
+        pass
+
+    def query_installments(self, start_date: str, end_date: str, mfi_id: str = None,
+                           borrower_id: str = None) -> Optional[List[Dict]]:
+        """Installments with start_date <= due_date <= end_date, or None if the
+        backend has no installment index and the caller must scan in memory"""
+        return None
+
+    def poll_changes(self, force: bool = False) -> List[Tuple[str, str, Dict]]:
+        """Return (entity, record_id, record) for every record another process
+        changed since the previous poll; entity is a key of VERSIONED_TABLES"""
+        return []
+
+    # Snapshots: backends that can tell which committed state a snapshot
+    # reflects let LoanDatabase start from it and catch up via poll_changes
+    snapshot_path: Optional[str] = None
+
+    def snapshot_state(self) -> Optional[Dict]:
+        """Backend state to store alongside a snapshot (None if unsupported)"""
+        return None
+
+    def resume_from_snapshot(self, state: Dict) -> bool:
+        """Adopt a snapshot's backend state if it still matches this store, so
+        the next forced poll_changes returns everything committed since"""
+        return False
+
+    def lazy_payments(self, loan_id: str, count: int, amount: float) -> List[Dict]:
+        """Payment history placeholder for a loan restored from a snapshot"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JSONLoanStorage(LoanStorageBackend):
+    """Legacy backend: whole-file JSON documents, rewritten atomically on commit
+
+    Writes are staged per record and only applied to the in-memory documents
+    once the files are written, so a failed or conflicting commit leaves them
+    untouched.
+
+    A commit holds an exclusive lock on ``loan_database.lock`` while it checks
+    and rewrites the files. If another process replaced a file in the meantime,
+    the staged records are merged into that version, unless the other process
+    changed one of them too (ConcurrentModificationError). Without ``fcntl``
+    (Windows) there is no cross-process lock; use one process per data dir.
+    """
+
+    name = "json"
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.applications_file = os.path.join(data_dir, "loan_applications.json")
+        self.mfi_list_file = os.path.join(data_dir, "mfi_directory.json")
+        self.emi_tracking_file = os.path.join(data_dir, "emi_tracking.json")
+
+        self._lock = threading.RLock()
+        self._depth = 0
+        # Staged writes: (document, *keys) -> record, plus payments per loan id
+        self._staged: Dict[Tuple[str, ...], Dict] = {}
+        self._staged_payments: Dict[str, List[Dict]] = {}
+        self._lock_fd = os.open(os.path.join(data_dir, "loan_database.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+
+        self._initialize_files()
+        # Signature of the file version the in-memory documents reflect, and
+        # (signature, text) of the version this process last read or wrote
+        self._signatures = {}
+        self._disk: Dict[str, Tuple[Optional[Tuple[int, int, int]], Optional[str]]] = {}
+        self.applications = self._load_json(self.applications_file)
+        self.mfi_directory = self._load_json(self.mfi_list_file)
+        self.emi_tracking = self._load_json(self.emi_tracking_file)
+
+    def _signature(self, filepath: str) -> Optional[Tuple[int, int, int]]:
+        """(inode, mtime_ns, size) - changes whenever any process replaces the file"""
+        try:
+            stat = os.stat(filepath)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _initialize_files(self):
+        """Initialize JSON files if they don't exist"""
+        defaults = {
+            self.applications_file: {"applications": {}, "approved_loans": {}},
+            self.mfi_list_file: {},
+            self.emi_tracking_file: {},
+        }
+        with self._file_lock():
+            for filepath, default in defaults.items():
+                if not os.path.exists(filepath):
+                    _write_json_atomic(filepath, default)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock across threads and (where supported) processes"""
+        with self._lock:
+            if fcntl:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _read_file(self, filepath: str) -> Tuple[Optional[Tuple[int, int, int]], Optional[str], Dict]:
+        """(signature, text, parsed document) of one consistent version of a file"""
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                stat = os.fstat(f.fileno())
+                text = f.read()
+        except FileNotFoundError:
+            return None, None, {}
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            data = {}
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size), text, data
+
+    def _load_json(self, filepath: str) -> Dict:
+        """Load JSON file safely"""
+        signature, text, data = self._read_file(filepath)
+        self._signatures[filepath] = signature
+        self._disk[filepath] = (signature, text)
+        return data
+
+    def load_applications(self) -> Dict:
+        self.applications.setdefault('applications', {})
+        self.applications.setdefault('approved_loans', {})
+        return self.applications
+
+    def load_mfi_directory(self) -> Dict:
+        return self.mfi_directory
+
+    def load_emi_tracking(self) -> Dict:
+        return self.emi_tracking
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._discard_staged()
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                try:
+                    self._flush()
+                finally:
+                    self._discard_staged()
+
+    def _discard_staged(self):
+        self._staged.clear()
+        self._staged_payments.clear()
+
+    def _targets(self) -> Dict[str, Tuple[Dict, str]]:
+        return {
+            'applications': (self.applications, self.applications_file),
+            'mfi_directory': (self.mfi_directory, self.mfi_list_file),
+            'emi_tracking': (self.emi_tracking, self.emi_tracking_file),
+        }
+
+    def _dirty_documents(self) -> List[str]:
+        dirty = {path[0] for path in self._staged}
+        if self._staged_payments:
+            dirty.add('emi_tracking')
+        return sorted(dirty)
+
+    def _apply_staged(self, key: str, data: Dict, copy: bool = False) -> Dict:
+        """Apply the staged records of one document to ``data``
+
+        With ``copy``, ``data`` is left as is and a copy sharing the untouched
+        records is returned.
+        """
+        if copy:
+            data = dict(data)
+            if key == 'applications':
+                for entity in ('applications', 'approved_loans'):
+                    data[entity] = dict(data.get(entity, {}))
+        for (document, *parents, record_id), record in self._staged.items():
+            if document != key:
+                continue
+            container = data
+            for parent in parents:
+                container = container.setdefault(parent, {})
+            container[record_id] = record
+        if key == 'emi_tracking':
+            for loan_id, payments in self._staged_payments.items():
+                loan = data.get(loan_id)
+                if loan is None:
+                    continue
+                history = loan.get('payments', [])
+                known = {p.get('payment_id') for p in history}
+                new = [p for p in payments if p['payment_id'] not in known]
+                if not new:
+                    continue
+                if copy:
+                    data[loan_id] = {**loan, 'payments': history + new}
+                else:
+                    loan.setdefault('payments', history).extend(new)
+        return data
+
+    def _check_conflicts(self, key: str, filepath: str, base: Dict, fresh: Dict):
+        """Raise if another process changed a record this transaction writes"""
+        paths = [path[1:] for path in self._staged if path[0] == key]
+        if key == 'emi_tracking':
+            paths.extend((loan_id,) for loan_id in self._staged_payments)
+        for path in paths:
+            if _lookup(base, path) != _lookup(fresh, path):
+                raise ConcurrentModificationError(
+                    f"{'/'.join(path)} in {filepath} was modified by another process"
+                )
+
+    def _flush(self):
+        targets = self._targets()
+        with self._file_lock():
+            for key in self._dirty_documents():
+                data, filepath = targets[key]
+                current = self._signature(filepath)
+                disk_signature, disk_text = self._disk.get(filepath, (None, None))
+                in_sync = current == disk_signature == self._signatures.get(filepath)
+                if in_sync:
+                    document = self._apply_staged(key, data, copy=True)
+                else:
+                    # The file is newer than our in-memory copy: merge into it
+                    _, _, fresh = self._read_file(filepath)
+                    if current != disk_signature:
+                        base = json.loads(disk_text) if disk_text else {}
+                        self._check_conflicts(key, filepath, base, fresh)
+                    document = self._apply_staged(key, fresh)
+                text = _write_json_atomic(filepath, document)
+                self._disk[filepath] = (self._signature(filepath), text)
+                self._apply_staged(key, data)
+                if in_sync:
+                    self._signatures[filepath] = self._disk[filepath][0]
+                # Otherwise the signatures differ and poll_changes reloads the file
+
+    def poll_changes(self, force: bool = False) -> List[Tuple[str, str, Dict]]:
+        """Reload (in place) any file another process replaced
+
+        JSON files cannot be read partially, so every record of a changed file
+        is reported.
+        """
+        changes = []
+        with self._lock:
+            for key, (data, filepath) in self._targets().items():
+                if not force and self._signature(filepath) == self._signatures.get(filepath):
+                    continue
+                fresh = self._load_json(filepath)
+                data.clear()
+                data.update(fresh)
+                if key == 'applications':
+                    for entity in ('applications', 'approved_loans'):
+                        changes.extend((entity, record_id, record)
+                                       for record_id, record in data.setdefault(entity, {}).items())
+                elif key == 'mfi_directory':
+                    changes.extend(('mfi_directory', record_id, record) for record_id, record in data.items())
+                else:
+                    changes.extend(('emi_schedules', record_id, record) for record_id, record in data.items())
+        return changes
+
+    def upsert_application(self, application: Dict):
+        self._staged[('applications', 'applications', application['application_id'])] = application
+
+    def upsert_approved_loan(self, loan: Dict):
+        self._staged[('applications', 'approved_loans', loan['application_id'])] = loan
+
+    def upsert_mfi(self, mfi_id: str, mfi_data: Dict):
+        self._staged[('mfi_directory', mfi_id)] = mfi_data
+
+    def upsert_emi_loan(self, loan: Dict):
+        self._staged[('emi_tracking', loan['loan_id'])] = loan
+
+    def insert_payment(self, loan_id: str, payment: Dict):
+        self._staged_payments.setdefault(loan_id, []).append(payment)
+
+    def close(self):
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+class SQLiteLoanStorage(LoanStorageBackend):
+    """SQLite backend in WAL mode with one row per record and indexed lookup columns"""
+
+    name = "sqlite"
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.origin = uuid.uuid4().hex
+        self._lock = threading.RLock()
+        self._depth = 0
+        # Last version of each record this process has seen, for optimistic concurrency
+        self._versions: Dict[Tuple[str, str], int] = {}
+        self._pending_versions: Dict[Tuple[str, str], int] = {}
+        self._logged_changes = 0
+        self._last_seq = 0
+        self.snapshot_path = f"{os.path.splitext(db_path)[0]}.snapshot"
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        # Processes starting together set up the file one at a time
+        with _process_lock(f"{os.path.splitext(db_path)[0]}.lock"):
+            self.conn.execute("PRAGMA busy_timeout=5000")
+            self._enable_wal()
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("PRAGMA foreign_keys=ON")
+            self._create_schema()
+        self._last_seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+        self._data_version = self._get_data_version()
+
+    def _enable_wal(self):
+        # The switch needs an exclusive lock and fails at once with "database is
+        # locked" instead of waiting out busy_timeout, so retry it with backoff
+        for attempt in range(WAL_SWITCH_ATTEMPTS):
+            try:
+                self.conn.execute("PRAGMA journal_mode=WAL")
+                return
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or attempt == WAL_SWITCH_ATTEMPTS - 1:
+                    raise
+                time.sleep(0.05 * 2 ** attempt)
+
+    def _create_schema(self):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS applications (
+                application_id TEXT PRIMARY KEY,
+                mfi_id TEXT,
+                borrower_id TEXT,
+                status TEXT,
+                application_date TEXT,
+                data TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_applications_mfi ON applications(mfi_id);
+            CREATE INDEX IF NOT EXISTS idx_applications_borrower ON applications(borrower_id);
+            CREATE INDEX IF NOT EXISTS idx_applications_status ON applications(status);
+            CREATE INDEX IF NOT EXISTS idx_applications_mfi_status ON applications(mfi_id, status);
+            CREATE INDEX IF NOT EXISTS idx_applications_borrower_status ON applications(borrower_id, status);
+
+            CREATE TABLE IF NOT EXISTS approved_loans (
+                application_id TEXT PRIMARY KEY,
+                mfi_id TEXT,
+                borrower_id TEXT,
+                approval_date TEXT,
+                data TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_approved_mfi ON approved_loans(mfi_id);
+            CREATE INDEX IF NOT EXISTS idx_approved_borrower ON approved_loans(borrower_id);
+
+            CREATE TABLE IF NOT EXISTS mfi_directory (
+                mfi_id TEXT PRIMARY KEY,
+                status TEXT,
+                data TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0
+            );
+
+            CREATE TABLE IF NOT EXISTS emi_schedules (
+                loan_id TEXT PRIMARY KEY,
+                mfi_id TEXT,
+                borrower_id TEXT,
+                status TEXT,
+                next_due_date TEXT,
+                outstanding_balance REAL,
+                data TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_emi_mfi ON emi_schedules(mfi_id);
+            CREATE INDEX IF NOT EXISTS idx_emi_borrower ON emi_schedules(borrower_id);
+            CREATE INDEX IF NOT EXISTS idx_emi_status ON emi_schedules(status);
+            CREATE INDEX IF NOT EXISTS idx_emi_mfi_status ON emi_schedules(mfi_id, status);
+            CREATE INDEX IF NOT EXISTS idx_emi_next_due ON emi_schedules(next_due_date);
+
+            CREATE TABLE IF NOT EXISTS emi_payments (
+                payment_id TEXT PRIMARY KEY,
+                loan_id TEXT NOT NULL REFERENCES emi_schedules(loan_id),
+                seq INTEGER NOT NULL,
+                payment_date TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_payments_loan ON emi_payments(loan_id, seq);
+            CREATE INDEX IF NOT EXISTS idx_payments_date ON emi_payments(payment_date);
+
+            CREATE TABLE IF NOT EXISTS emi_installments (
+                loan_id TEXT NOT NULL REFERENCES emi_schedules(loan_id),
+                installment_no INTEGER NOT NULL,
+                mfi_id TEXT,
+                borrower_id TEXT,
+                due_date TEXT NOT NULL,
+                principal REAL,
+                interest REAL,
+                expected_balance REAL,
+                PRIMARY KEY (loan_id, installment_no)
+            );
+            CREATE INDEX IF NOT EXISTS idx_installments_due ON emi_installments(due_date);
+            CREATE INDEX IF NOT EXISTS idx_installments_mfi_due ON emi_installments(mfi_id, due_date);
+            CREATE INDEX IF NOT EXISTS idx_installments_borrower_due ON emi_installments(borrower_id, due_date);
+
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity TEXT NOT NULL,
+                record_id TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                origin TEXT NOT NULL
+            );
+        """)
+        # Upgrade stores created before schema v2 (no per-record version counters).
+        # Checked and altered under the write lock, so concurrent starts cannot
+        # both add the column
+        with self.transaction():
+            for table in VERSIONED_TABLES:
+                columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+                if 'version' not in columns:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                (str(SCHEMA_VERSION),)
+            )
+            # Identifies this database file, so snapshots of another store are never applied
+            self.conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)", (uuid.uuid4().hex,)
+            )
+            self.store_id = self.conn.execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()[0]
+
+    def _get_data_version(self) -> int:
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def is_empty(self) -> bool:
+        """True when no loan or MFI data has been stored yet"""
+        for table in ("applications", "mfi_directory", "emi_schedules"):
+            if self.conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                return False
+        return True
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            outermost = self._depth == 0
+            if outermost:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if outermost:
+                    self.conn.execute("ROLLBACK")
+                    self._pending_versions.clear()
+                raise
+            self._depth -= 1
+            if outermost:
+                last_seq = self._feed_position_after_commit() if self._pending_versions else self._last_seq
+                if self._logged_changes >= CHANGE_LOG_PRUNE_EVERY:
+                    self._prune_change_log()
+                self.conn.execute("COMMIT")
+                self._last_seq = last_seq
+                self._versions.update(self._pending_versions)
+                self._pending_versions.clear()
+
+    def _load_table(self, table: str) -> Dict:
+        key_column = VERSIONED_TABLES[table]
+        records = {}
+        for record_id, data, version in self.conn.execute(
+                f"SELECT {key_column}, data, version FROM {table} ORDER BY rowid"):
+            records[record_id] = json.loads(data)
+            self._versions[(table, record_id)] = version
+        return records
+
+    def load_applications(self) -> Dict:
+        return {
+            "applications": self._load_table('applications'),
+            "approved_loans": self._load_table('approved_loans')
+        }
+
+    def load_mfi_directory(self) -> Dict:
+        return self._load_table('mfi_directory')
+
+    def load_emi_tracking(self) -> Dict:
+        """EMI records with lazily loaded payment histories (counts and totals only)"""
+        emi_tracking = self._load_table('emi_schedules')
+        stats = {
+            loan_id: (count, amount or 0.0)
+            for loan_id, count, amount in self.conn.execute(
+                "SELECT loan_id, COUNT(*), SUM(json_extract(data, '$.emi_amount')) FROM emi_payments GROUP BY loan_id"
+            )
+        }
+        for loan_id, loan in emi_tracking.items():
+            loan['payments'] = self.lazy_payments(loan_id, *stats.get(loan_id, (0, 0.0)))
+        return emi_tracking
+
+    def lazy_payments(self, loan_id: str, count: int, amount: float) -> List[Dict]:
+        return LazyPaymentList(lambda: self.load_payments(loan_id), count, amount)
+
+    def load_payments(self, loan_id: str) -> List[Dict]:
+        return [
+            json.loads(row[0])
+            for row in self.conn.execute(
+                "SELECT data FROM emi_payments WHERE loan_id = ? ORDER BY seq", (loan_id,)
+            )
+        ]
+
+    def _next_version(self, table: str, record_id: str) -> int:
+        """Check the stored version against the one this process last saw and
+        claim the next one; records a change-feed entry for other processes"""
+        key = (table, record_id)
+        row = self.conn.execute(
+            f"SELECT version FROM {table} WHERE {VERSIONED_TABLES[table]} = ?", (record_id,)
+        ).fetchone()
+        expected = self._pending_versions.get(key, self._versions.get(key))
+        if row is not None and row[0] != expected:
+            raise ConcurrentModificationError(
+                f"{table}/{record_id} is at version {row[0]}, expected {expected}"
+            )
+        version = (row[0] if row else 0) + 1
+        self._pending_versions[key] = version
+        self.conn.execute(
+            "INSERT INTO change_log (entity, record_id, version, origin) VALUES (?, ?, ?, ?)",
+            (table, record_id, version, self.origin)
+        )
+        self._logged_changes += 1
+        return version
+
+    def _feed_position_after_commit(self) -> int:
+        """Feed position once this transaction commits (caller holds the write lock)
+
+        Skips this transaction's own rows when no other process's rows are
+        waiting before them, so a process that mostly writes keeps up with the
+        feed instead of falling behind the pruned rows.
+        """
+        if self.conn.execute(
+                "SELECT 1 FROM change_log WHERE seq > ? AND origin != ? LIMIT 1", (self._last_seq, self.origin)
+        ).fetchone():
+            return self._last_seq
+        return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+
+    def _prune_change_log(self):
+        """Drop change-feed rows beyond the newest CHANGE_LOG_RETAIN (caller holds the write lock)"""
+        self._logged_changes = 0
+        cutoff = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0] - CHANGE_LOG_RETAIN
+        if cutoff <= self._pruned_seq():
+            return
+        self.conn.execute("DELETE FROM change_log WHERE seq <= ?", (cutoff,))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('change_log_pruned_seq', ?)", (str(cutoff),)
+        )
+
+    def _pruned_seq(self) -> int:
+        """Highest change-feed position that has been pruned (0 if none)"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'change_log_pruned_seq'").fetchone()
+        return int(row[0]) if row else 0
+
+    def upsert_application(self, application: Dict):
+        app_id = application['application_id']
+        self.conn.execute(
+            """INSERT INTO applications (application_id, mfi_id, borrower_id, status, application_date, data, version)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(application_id) DO UPDATE SET
+                   mfi_id = excluded.mfi_id, borrower_id = excluded.borrower_id,
+                   status = excluded.status, application_date = excluded.application_date,
+                   data = excluded.data, version = excluded.version""",
+            (
+                app_id, application.get('mfi_id'), application.get('borrower_id'),
+                application.get('status'), application.get('application_date'), _dumps(application),
+                self._next_version('applications', app_id)
+            )
+        )
+
+    def upsert_approved_loan(self, loan: Dict):
+        app_id = loan['application_id']
+        self.conn.execute(
+            """INSERT INTO approved_loans (application_id, mfi_id, borrower_id, approval_date, data, version)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(application_id) DO UPDATE SET
+                   mfi_id = excluded.mfi_id, borrower_id = excluded.borrower_id,
+                   approval_date = excluded.approval_date, data = excluded.data,
+                   version = excluded.version""",
+            (
+                app_id, loan.get('mfi_id'), loan.get('borrower_id'),
+                loan.get('approval_date'), _dumps(loan), self._next_version('approved_loans', app_id)
+            )
+        )
+
+    def upsert_mfi(self, mfi_id: str, mfi_data: Dict):
+        self.conn.execute(
+            """INSERT INTO mfi_directory (mfi_id, status, data, version) VALUES (?, ?, ?, ?)
+               ON CONFLICT(mfi_id) DO UPDATE SET
+                   status = excluded.status, data = excluded.data, version = excluded.version""",
+            (mfi_id, mfi_data.get('status'), _dumps(mfi_data), self._next_version('mfi_directory', mfi_id))
+        )
+
+    def upsert_emi_loan(self, loan: Dict):
+        header = {k: v for k, v in loan.items() if k != 'payments'}
+        self.conn.execute(
+            """INSERT INTO emi_schedules
+                   (loan_id, mfi_id, borrower_id, status, next_due_date, outstanding_balance, data, version)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(loan_id) DO UPDATE SET
+                   mfi_id = excluded.mfi_id, borrower_id = excluded.borrower_id,
+                   status = excluded.status, next_due_date = excluded.next_due_date,
+                   outstanding_balance = excluded.outstanding_balance, data = excluded.data,
+                   version = excluded.version""",
+            (
+                loan['loan_id'], loan.get('mfi_id'), loan.get('borrower_id'), loan.get('status'),
+                loan.get('next_due_date'), loan.get('outstanding_balance'), _dumps(header),
+                self._next_version('emi_schedules', loan['loan_id'])
+            )
+        )
+
+    def update_emi_state(self, loan: Dict):
+        """Patch the payment-driven fields in place with json_set instead of
+        re-serializing the whole header (which carries the schedule)"""
+        fields = [field for field in EMI_STATE_FIELDS if field in loan]
+        paths = ", ".join("'$.%s', ?" % field for field in fields)
+        self.conn.execute(
+            f"""UPDATE emi_schedules SET
+                   status = ?, next_due_date = ?, outstanding_balance = ?,
+                   data = json_set(data, {paths}), version = ?
+               WHERE loan_id = ?""",
+            (
+                loan.get('status'), loan.get('next_due_date'), loan.get('outstanding_balance'),
+                *(loan[field] for field in fields),
+                self._next_version('emi_schedules', loan['loan_id']), loan['loan_id']
+            )
+        )
+
+    def insert_payment(self, loan_id: str, payment: Dict):
+        self.conn.execute(
+            """INSERT OR IGNORE INTO emi_payments (payment_id, loan_id, seq, payment_date, data)
+               VALUES (?, ?, (SELECT COUNT(*) FROM emi_payments WHERE loan_id = ?), ?, ?)""",
+            (payment['payment_id'], loan_id, loan_id, payment.get('payment_date'), _dumps(payment))
+        )
+
+    def replace_installments(self, loan: Dict):
+        schedule = loan.get('schedule')
+        if not schedule:
+            return
+        self.conn.execute("DELETE FROM emi_installments WHERE loan_id = ?", (loan['loan_id'],))
+        self.conn.executemany(
+            """INSERT INTO emi_installments
+                   (loan_id, installment_no, mfi_id, borrower_id, due_date, principal, interest, expected_balance)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            [
+                (loan['loan_id'], number, loan.get('mfi_id'), loan.get('borrower_id'), due_date,
+                 principal, interest, balance)
+                for number, (due_date, principal, interest, balance) in enumerate(zip(
+                    schedule['due_dates'], schedule['principal'], schedule['interest'], schedule['balance']
+                ), start=1)
+            ]
+        )
+
+    def query_installments(self, start_date: str, end_date: str, mfi_id: str = None,
+                           borrower_id: str = None) -> Optional[List[Dict]]:
+        query = ("SELECT loan_id, installment_no, mfi_id, borrower_id, due_date, principal, interest, "
+                 "expected_balance FROM emi_installments WHERE due_date BETWEEN ? AND ?")
+        params = [start_date, end_date]
+        if mfi_id:
+            query += " AND mfi_id = ?"
+            params.append(mfi_id)
+        if borrower_id:
+            query += " AND borrower_id = ?"
+            params.append(borrower_id)
+        query += " ORDER BY due_date, loan_id"
+        columns = ('loan_id', 'installment_no', 'mfi_id', 'borrower_id', 'due_date',
+                   'principal', 'interest', 'expected_balance')
+        return [dict(zip(columns, row)) for row in self.conn.execute(query, params)]
+
+    def poll_changes(self, force: bool = False) -> List[Tuple[str, str, Dict]]:
+        """Fetch records other processes committed since the last poll
+
+        ``PRAGMA data_version`` only moves when another connection commits, so
+        the common no-change case costs a single pragma call.
+        """
+        with self._lock:
+            data_version = self._get_data_version()
+            if data_version == self._data_version and not force:
+                return []
+            self._data_version = data_version
+            if self._last_seq < self._pruned_seq():
+                return self._all_records()
+
+            rows = self.conn.execute(
+                "SELECT seq, entity, record_id, origin FROM change_log WHERE seq > ? ORDER BY seq",
+                (self._last_seq,)
+            ).fetchall()
+            if not rows:
+                return []
+            self._last_seq = rows[-1][0]
+
+            changed = {}
+            for _, entity, record_id, origin in rows:
+                if origin != self.origin:
+                    changed[(entity, record_id)] = None
+
+            changes = []
+            for entity, record_id in changed:
+                row = self.conn.execute(
+                    f"SELECT data, version FROM {entity} WHERE {VERSIONED_TABLES[entity]} = ?", (record_id,)
+                ).fetchone()
+                if row is None:
+                    continue
+                record = json.loads(row[0])
+                if entity == 'emi_schedules':
+                    record['payments'] = self.load_payments(record_id)
+                self._versions[(entity, record_id)] = row[1]
+                changes.append((entity, record_id, record))
+            return changes
+
+    def _all_records(self) -> List[Tuple[str, str, Dict]]:
+        """Every record as a change, for a reader whose feed position was pruned"""
+        # Position first: anything committed while loading is polled again next time
+        self._last_seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+        applications = self.load_applications()
+        documents = {
+            'applications': applications['applications'],
+            'approved_loans': applications['approved_loans'],
+            'mfi_directory': self.load_mfi_directory(),
+            'emi_schedules': self.load_emi_tracking(),
+        }
+        return [
+            (entity, record_id, record)
+            for entity, records in documents.items()
+            for record_id, record in records.items()
+        ]
+
+    def snapshot_state(self) -> Optional[Dict]:
+        with self._lock:
+            return {
+                'store_id': self.store_id,
+                'last_seq': self._last_seq,
+                'versions': self._versions
+            }
+
+    def resume_from_snapshot(self, state: Dict) -> bool:
+        with self._lock:
+            max_seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+            if state.get('store_id') != self.store_id or state.get('last_seq', -1) > max_seq:
+                return False
+            # Changes since the snapshot are no longer all in the feed
+            if state['last_seq'] < self._pruned_seq():
+                return False
+            self._versions = state['versions']
+            self._last_seq = state['last_seq']
+            return True
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def _lookup(document: Dict, path: Tuple[str, ...]) -> Any:
+    for key in path:
+        document = document.get(key) if isinstance(document, dict) else None
+    return document
+
+
+@contextmanager
+def _process_lock(path: str):
+    """Exclusive lock on the file at ``path`` across processes (no-op without fcntl)"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # also releases the lock
+
+
+def _write_json_atomic(filepath: str, data: Any) -> str:
+    """Write JSON via a temp file + rename so a crash never leaves a half-written file
+
+    The temp file gets a unique name, so concurrent writers never share one.
+    Returns the text written.
+    """
+    text = json.dumps(data, indent=2, ensure_ascii=False)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(filepath) or '.', prefix=f"{os.path.basename(filepath)}.", suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)  # mkstemp creates the file private
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return text
+
+
+def read_json_store(data_dir: str) -> Tuple[Dict, Dict, Dict]:
+    """(applications, mfi_directory, emi_tracking) documents of the legacy JSON files"""
+    source = JSONLoanStorage(data_dir)
+    try:
+        return source.load_applications(), source.load_mfi_directory(), source.load_emi_tracking()
+    finally:
+        source.close()
+
+
+def migrate_json_to_sqlite(data_dir: str, storage: SQLiteLoanStorage,
+                           documents: Optional[Tuple[Dict, Dict, Dict]] = None) -> Dict[str, int]:
+    """One-shot import of the legacy JSON files into an SQLite store
+
+    Runs in a single transaction; records already present are overwritten so the
+    migration can safely be re-run. ``documents`` are the files as returned by
+    read_json_store, read here if not given. Reading takes the JSON backend's
+    file lock, so callers already inside a transaction pass them in: waiting for
+    that lock while holding the SQLite write lock can deadlock with a process
+    setting up the store. Returns the number of records imported per table.
+    """
+    applications, mfi_directory, emi_tracking = documents or read_json_store(data_dir)
+
+    counts = {"applications": 0, "approved_loans": 0, "mfi_directory": 0, "emi_schedules": 0, "emi_payments": 0}
+    with storage.transaction():
+        for mfi_id, mfi_data in mfi_directory.items():
+            storage.upsert_mfi(mfi_id, mfi_data)
+            counts["mfi_directory"] += 1
+        for application in applications.get('applications', {}).values():
+            storage.upsert_application(application)
+            counts["applications"] += 1
+        for loan in applications.get('approved_loans', {}).values():
+            storage.upsert_approved_loan(loan)
+            counts["approved_loans"] += 1
+        for loan_id, loan in emi_tracking.items():
+            loan.setdefault('loan_id', loan_id)
+            storage.upsert_emi_loan(loan)
+            storage.replace_installments(loan)
+            counts["emi_schedules"] += 1
+            for payment in loan.get('payments', []):
+                storage.insert_payment(loan_id, payment)
+                counts["emi_payments"] += 1
+        storage.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+            (data_dir,)
+        )
+    return counts
+
+
+def get_storage_backend(data_dir: str, backend: Optional[str] = None) -> LoanStorageBackend:
+    """Create the configured storage backend
+
+    ``backend`` (or the LOAN_DB_BACKEND environment variable) selects "sqlite"
+    (default) or "json". A fresh SQLite store is seeded from the legacy JSON files
+    if they exist; the emptiness check and the import share one write transaction,
+    so when several processes start on a fresh store only the first imports.
+    """
+    backend = (backend or os.getenv('LOAN_DB_BACKEND', 'sqlite')).lower()
+    if backend == 'json':
+        return JSONLoanStorage(data_dir)
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown loan storage backend: {backend}")
+
+    db_path = os.getenv('LOAN_DB_PATH') or os.path.join(data_dir, "loan_database.db")
+    storage = SQLiteLoanStorage(db_path)
+    legacy_files = ("loan_applications.json", "mfi_directory.json", "emi_tracking.json")
+    if storage.is_empty() and any(os.path.exists(os.path.join(data_dir, f)) for f in legacy_files):
+        documents = read_json_store(data_dir)
+        with storage.transaction():
+            if storage.is_empty():
+                counts = migrate_json_to_sqlite(data_dir, storage, documents)
+                print(f"Migrated legacy JSON loan data into {db_path}: {counts}")
+    return storage
@@ -0,0 +1,129 @@
+"""
+EMI Payment Journal
+Append-only write-ahead log of EMI payment events (one JSON line per event) with
+batched fsync, used by LoanDatabase.pay_emi and replayed at startup for crash recovery
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single-process use only
+    fcntl = None
+
+
+class PaymentJournal:
+    """Append-only journal of payment events
+
+    Writes go straight to the OS with ``O_APPEND`` (so they survive a process
+    crash immediately); ``fsync`` is batched and issued every ``fsync_batch``
+    events or ``fsync_interval`` seconds, whichever comes first, plus on
+    ``sync()`` / ``truncate()``.
+    """
+
+    def __init__(self, path: str, fsync_batch: int = 64, fsync_interval: float = 1.0):
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self._lock = threading.RLock()
+        self._fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._lock_depth = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @contextmanager
+    def locked(self):
+        """Exclusive, re-entrant lock across threads and (where supported) processes"""
+        with self._lock:
+            outermost = self._lock_depth == 0
+            if outermost and fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield self
+            finally:
+                self._lock_depth -= 1
+                if outermost and fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def append(self, events: List[Dict]):
+        """Append events as a single write, fsyncing when the batch is due"""
+        if not events:
+            return
+        data = "".join(
+            json.dumps(event, ensure_ascii=False, separators=(',', ':')) + "\n" for event in events
+        ).encode('utf-8')
+        with self.locked():
+            # A writer that crashed mid-write leaves a line without its newline; start a
+            # fresh line so these events are not joined onto it and skipped as corrupt
+            size = os.lseek(self._fd, 0, os.SEEK_END)
+            if size:
+                os.lseek(self._fd, size - 1, os.SEEK_SET)
+                if os.read(self._fd, 1) != b"\n":
+                    data = b"\n" + data
+            os.write(self._fd, data)
+            self._unsynced += len(events)
+            if (self._unsynced >= self.fsync_batch
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._fsync()
+
+    def sync(self):
+        with self._lock:
+            if self._unsynced:
+                self._fsync()
+
+    def _fsync(self):
+        os.fsync(self._fd)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def read_events(self) -> List[Dict]:
+        """Read all complete events; a torn trailing line from a crash is ignored"""
+        return self.read_events_from(0)[0]
+
+    def read_events_from(self, offset: int) -> Tuple[List[Dict], int]:
+        """Read complete events starting at byte ``offset``
+
+        Returns the events and the offset just past the last complete line, so
+        other processes can tail the journal incrementally.
+        """
+        events = []
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    try:
+                        events.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        print(f"Skipping corrupt journal entry in {self.path}")
+        except FileNotFoundError:
+            pass
+        return events, offset
+
+    def truncate(self):
+        """Discard all events (call only after they are persisted in the main store)"""
+        with self._lock:
+            os.ftruncate(self._fd, 0)
+            self._fsync()
+
+    @property
+    def closed(self) -> bool:
+        return self._fd is None
+
+    def size(self) -> int:
+        return os.fstat(self._fd).st_size
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                self._fsync()
+                os.close(self._fd)
+                self._fd = None
@@ -0,0 +1,307 @@
+"""
+Prompt Builder
+Measures prompts locally and fits them into per-agent token budgets: profile data is
+compacted (empty and irrelevant fields dropped), retrieved chunks are deduplicated,
+chat history is cut down newest-first, and when a prompt is still over budget its
+flexible sections are trimmed in order. Prompt sizes are counted per agent.
+
+Budgets can be overridden per agent with PROMPT_BUDGET_<AGENT> (e.g. PROMPT_BUDGET_RAGCHATSYSTEM=1500).
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+# Prompt token budgets per agent (prompt only; the response has its own max_tokens)
+PROMPT_BUDGETS = {
+    "RAGChatSystem": 900,
+    "LoanRiskAdvisorAgent": 2500,
+    "CreditSenseAnalyst": 700,
+    # Batched prompts (see llm_batching.py): batches are packed to fit these
+    "CreditSenseAnalystBatch": 3000,
+    "CreditScoringAgentBatch": 4000
+}
+DEFAULT_PROMPT_BUDGET = 3000
+
+# Values that carry no information for the model
+EMPTY_VALUES = ("", "n/a", "na", "null", "unknown", "not provided", "not specified", "not available")
+
+# Identifiers and bookkeeping that never help an assessment (and should not leave the
+# platform needlessly)
+DEFAULT_DROP_FIELDS = frozenset({
+    "user_id", "phone_number", "aadhaar_number", "voter_id", "patta_or_katha_number",
+    "password", "password_hash", "session_id", "created_at", "updated_at", "last_updated",
+    "timestamp", "preferred_language", "preferred_mode_of_communication", "owns_smartphone",
+    "knows_how_to_use_apps", "internet_availability", "chat_history"
+})
+
+# One token per word piece, number group, non-Latin pair, punctuation mark or line break,
+# roughly what a BPE tokenizer produces for this kind of text
+_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\x00-\x7f]+|\s+|[^\sA-Za-z\d]")
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+|\n")
+
+
+def _piece_tokens(piece: str) -> int:
+    first = piece[0]
+    if first.isascii() and first.isalpha():
+        return (len(piece) + 5) // 6
+    if first.isdigit():
+        return (len(piece) + 2) // 3
+    if first.isspace():
+        # A single space is part of the next word's token
+        return 0 if piece == " " else 1
+    if not first.isascii():
+        return (len(piece) + 1) // 2
+    return 1
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count of ``text`` (no tokenizer download or API call)"""
+    if not text:
+        return 0
+    return sum(_piece_tokens(piece) for piece in _PIECES.findall(text))
+
+
+def truncate_text(text: str, max_tokens: int, ellipsis: str = " ...") -> str:
+    """``text`` cut to about ``max_tokens``, at a sentence end if one is near"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    used = 0
+    cut = 0
+    for match in _PIECES.finditer(text):
+        used += _piece_tokens(match.group())
+        if used > max_tokens - 1:
+            break
+        cut = match.end()
+    head = text[:cut]
+    # Prefer a whole sentence unless that loses more than a third of the room
+    ends = [m.start() for m in _SENTENCE_END.finditer(head)]
+    if ends and ends[-1] >= 2 * len(head) // 3:
+        head = head[:ends[-1]]
+    return head.rstrip() + ellipsis
+
+
+def _is_empty(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in EMPTY_VALUES
+    if isinstance(value, (list, tuple, dict, set)):
+        return not value
+    return False
+
+
+def compact_data(data: Any, drop: Iterable[str] = DEFAULT_DROP_FIELDS, max_items: int = 10,
+                 max_chars: int = 400) -> Any:
+    """Copy of ``data`` without empty values or ``drop`` keys, with long lists and strings shortened
+
+    Zeros and False are kept: they are answers, not gaps.
+    """
+    drop = drop if isinstance(drop, (set, frozenset)) else frozenset(drop)
+    if isinstance(data, dict):
+        compacted = {}
+        for key, value in data.items():
+            if key in drop:
+                continue
+            value = compact_data(value, drop, max_items, max_chars)
+            if not _is_empty(value):
+                compacted[key] = value
+        return compacted
+    if isinstance(data, (list, tuple)):
+        items = [compact_data(value, drop, max_items, max_chars) for value in data[:max_items]]
+        items = [value for value in items if not _is_empty(value)]
+        if len(data) > max_items:
+            items.append(f"... {len(data) - max_items} more")
+        return items
+    if isinstance(data, str):
+        text = data.strip()
+        return text if len(text) <= max_chars else text[:max_chars].rstrip() + "..."
+    if hasattr(data, 'item'):
+        # NumPy scalars
+        return data.item()
+    return data
+
+
+def compact_json(data: Any, drop: Iterable[str] = DEFAULT_DROP_FIELDS, **kwargs) -> str:
+    """compact_data as single-line JSON (about half the tokens of indent=2)"""
+    return json.dumps(compact_data(data, drop, **kwargs), ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def format_fields(fields: Dict[str, Any]) -> str:
+    """'- Label: value' lines for the fields that have a value"""
+    return "\n".join(f"- {label}: {value}" for label, value in fields.items() if not _is_empty(value))
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 3:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def dedupe_chunks(chunks: List[Any], threshold: float = 0.8, key: Callable[[Any], str] = None) -> List[Any]:
+    """Chunks in their original (rank) order, minus any that mostly repeat an earlier one
+
+    Two chunks are duplicates when at least ``threshold`` of the smaller one's
+    word 3-grams also occur in the other (overlapping chunk windows, the same
+    passage in two documents).
+    """
+    kept, kept_shingles = [], []
+    for chunk in chunks:
+        shingles = _shingles(key(chunk) if key else chunk)
+        if not shingles:
+            continue
+        if any(len(shingles & seen) >= threshold * min(len(shingles), len(seen)) for seen in kept_shingles):
+            continue
+        kept.append(chunk)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def truncate_history(exchanges: List[Dict[str, Any]], max_tokens: int, latest_tokens: int = 150,
+                     older_tokens: int = 50) -> str:
+    """Recent exchanges ({'query', 'response'}) that fit in ``max_tokens``, oldest first
+
+    The newest answer keeps up to ``latest_tokens``, older ones ``older_tokens``;
+    exchanges are added newest-first until the budget is used.
+    """
+    entries = []
+    used = 0
+    for age, exchange in enumerate(reversed(exchanges)):
+        response = truncate_text(exchange.get('response', ''), latest_tokens if age == 0 else older_tokens)
+        entry = f"User: {exchange.get('query', '')}\nAssistant: {response}"
+        cost = count_tokens(entry) + 1
+        if used + cost > max_tokens:
+            break
+        entries.append(entry)
+        used += cost
+    return "\n\n".join(reversed(entries))
+
+
+def prompt_budget(agent: str) -> int:
+    """Prompt token budget for an agent (PROMPT_BUDGET_<AGENT> overrides the default)"""
+    default = PROMPT_BUDGETS.get(agent, DEFAULT_PROMPT_BUDGET)
+    try:
+        return int(os.getenv(f"PROMPT_BUDGET_{agent.upper()}", default))
+    except ValueError:
+        return default
+
+
+class _Section:
+    def __init__(self, content: Union[str, List[str]], heading: str, trim_order: Optional[int],
+                 min_tokens: int, empty: str):
+        self.content = list(content) if isinstance(content, list) else content
+        self.heading = heading
+        self.trim_order = trim_order
+        self.min_tokens = min_tokens
+        self.empty = empty
+
+    def text(self) -> str:
+        body = "\n\n".join(self.content) if isinstance(self.content, list) else self.content
+        body = body or self.empty
+        if not self.heading:
+            return body
+        return f"{self.heading}\n{body}" if body else ""
+
+    def tokens(self) -> int:
+        return count_tokens(self.text())
+
+    def trim(self, excess: int) -> int:
+        """Shrink by about ``excess`` tokens; returns the tokens removed"""
+        before = self.tokens()
+        if isinstance(self.content, list):
+            # Items are in rank order: the last one is worth least
+            while self.content and before - self.tokens() < excess:
+                self.content.pop()
+        else:
+            body_tokens = count_tokens(self.content)
+            self.content = truncate_text(self.content, max(self.min_tokens, body_tokens - excess))
+        return before - self.tokens()
+
+
+class PromptBuilder:
+    """Prompt assembled from sections and fitted into the agent's token budget
+
+    ``add`` sections are always kept whole. ``add_flexible`` sections (text, or
+    a list of items such as retrieved chunks, best first) are trimmed when the
+    prompt is over budget, lowest ``trim_order`` first: lists lose their last
+    items, text is cut at a sentence. Built prompts are counted per agent
+    (see prompt_metrics).
+    """
+
+    def __init__(self, agent: str, budget: int = None):
+        self.agent = agent
+        self.budget = budget or prompt_budget(agent)
+        self.tokens = 0
+        self.trimmed_tokens = 0
+        self._sections: List[_Section] = []
+
+    def add(self, text: str, heading: str = "") -> 'PromptBuilder':
+        self._sections.append(_Section(text, heading, None, 0, ""))
+        return self
+
+    def add_flexible(self, content: Union[str, List[str]], heading: str = "", trim_order: int = 0,
+                     min_tokens: int = 0, empty: str = "") -> 'PromptBuilder':
+        """Section that may be trimmed (``empty`` stands in if nothing is left)"""
+        self._sections.append(_Section(content, heading, trim_order, min_tokens, empty))
+        return self
+
+    def remaining(self) -> int:
+        """Tokens left in the budget after the sections added so far"""
+        return self.budget - sum(section.tokens() for section in self._sections)
+
+    def build(self) -> str:
+        excess = -self.remaining()
+        for section in sorted((s for s in self._sections if s.trim_order is not None), key=lambda s: s.trim_order):
+            if excess <= 0:
+                break
+            removed = section.trim(excess)
+            excess -= removed
+            self.trimmed_tokens += removed
+        prompt = "\n\n".join(text for text in (section.text() for section in self._sections) if text)
+        self.tokens = count_tokens(prompt)
+        _record_prompt(self.agent, self.tokens, self.trimmed_tokens, self.tokens > self.budget)
+        return prompt
+
+
+class _PromptStats:
+    def __init__(self):
+        self.prompts = 0
+        self.tokens = 0
+        self.max_tokens = 0
+        self.trimmed_tokens = 0
+        self.over_budget = 0
+
+    def as_dict(self, budget: int) -> Dict[str, Any]:
+        return {
+            "prompts": self.prompts,
+            "budget": budget,
+            "avg_tokens": round(self.tokens / self.prompts, 1) if self.prompts else 0.0,
+            "max_tokens": self.max_tokens,
+            "trimmed_tokens": self.trimmed_tokens,
+            "over_budget": self.over_budget
+        }
+
+
+_prompt_stats: Dict[str, _PromptStats] = {}
+_prompt_stats_lock = threading.Lock()
+
+
+def _record_prompt(agent: str, tokens: int, trimmed: int, over_budget: bool):
+    with _prompt_stats_lock:
+        stats = _prompt_stats.setdefault(agent, _PromptStats())
+        stats.prompts += 1
+        stats.tokens += tokens
+        stats.max_tokens = max(stats.max_tokens, tokens)
+        stats.trimmed_tokens += trimmed
+        stats.over_budget += over_budget
+
+
+def prompt_metrics() -> Dict[str, Dict[str, Any]]:
+    """Built prompts per agent: count, average and largest size, tokens trimmed, budget overruns"""
+    with _prompt_stats_lock:
+        return {agent: stats.as_dict(prompt_budget(agent)) for agent, stats in _prompt_stats.items()}
@@ -5,15 +5,21 @@ Provides intelligent responses using the vector database and AI
 
 import os
 import sys
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Iterator
 from datetime import datetime
-from groq import Groq
 from dotenv import load_dotenv
 
 # Add current directory to Python path for imports
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 
+try:
+    from shared_data.llm_gateway import get_llm_client
+    from shared_data.prompt_builder import PromptBuilder, dedupe_chunks, truncate_history
+except ImportError:
+    from llm_gateway import get_llm_client
+    from prompt_builder import PromptBuilder, dedupe_chunks, truncate_history
+
 try:
     from vector_database import get_vector_database
 except ImportError:
@@ -28,7 +34,7 @@ class RAGChatSystem:
         if not self.groq_api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables")
             
-        self.client = Groq(api_key=self.groq_api_key)
+        self.client = get_llm_client("RAGChatSystem", self.groq_api_key, priority="interactive")
         self.model = os.getenv('MODEL_NAME', "meta-llama/llama-4-maverick-17b-128e-instruct")
         
         # Initialize vector database
@@ -64,24 +70,50 @@ class RAGChatSystem:
         except Exception as e:
             return f"I apologize, but I'm having trouble processing your question right now. Please try again. Error: {str(e)}"
     
-    def _get_relevant_context(self, query: str) -> str:
-        """Get relevant context from the vector database"""
+    def stream_response(self, user_query: str, user_type: str = "borrower") -> Iterator[str]:
+        """get_response as a stream: yields pieces of the response as they are generated"""
+        context = self._get_relevant_context(user_query)
+        
+        pieces = []
+        try:
+            for delta in self.client.stream_text(**self._response_request(user_query, context, user_type)):
+                # Like get_response, skip leading whitespace
+                if not pieces:
+                    delta = delta.lstrip()
+                if delta:
+                    pieces.append(delta)
+                    yield delta
+        except Exception as e:
+            if not pieces:
+                yield f"I'm experiencing technical difficulties. Please try again in a moment. ({str(e)})"
+            return
+        
+        self._update_chat_history(user_query, "".join(pieces).strip())
+    
+    def _get_relevant_context(self, query: str) -> List[str]:
+        """Relevant chunks from the vector database, best first, without near-duplicates"""
         if not self.vector_db:
-            return "Vector database not available. I can still help based on my general knowledge."
+            return []
         
         try:
-            context = self.vector_db.get_context_for_query(query, max_context_length=1500)
-            return context
+            # Over-fetch: duplicates are dropped here and the prompt builder keeps what fits
+            results = dedupe_chunks(self.vector_db.search(query, top_k=6), key=lambda result: result['content'])
+            return [f"{result['content']}\n[Source: {result['file_name']}]" for result in results]
         except Exception as e:
             print(f"Error retrieving context: {e}")
-            return "Context retrieval temporarily unavailable."
+            return []
     
-    def _generate_ai_response(self, query: str, context: str, user_type: str) -> str:
+    def _generate_ai_response(self, query: str, context: List[str], user_type: str) -> str:
         """Generate AI response using the context and query"""
-        
-        # Get recent chat history for context
-        history_context = self._get_chat_history_context()
-        
+        try:
+            response = self.client.chat.completions.create(**self._response_request(query, context, user_type))
+            return response.choices[0].message.content.strip()
+            
+        except Exception as e:
+            return f"I'm experiencing technical difficulties. Please try again in a moment. ({str(e)})"
+    
+    def _response_request(self, query: str, context: List[str], user_type: str) -> Dict:
+        """Chat completion arguments for a question with its context and recent history, within the prompt budget"""
         # Create appropriate system prompt based on user type
         if user_type == "borrower":
             system_role = """You are a helpful financial advisor assistant for microfinance borrowers in India. 
@@ -94,18 +126,15 @@ class RAGChatSystem:
             and operational efficiency. Your responses should be professional and data-driven, helping MFIs make 
             informed decisions about their lending operations."""
         
-        prompt = f"""
-{system_role}
-
-KNOWLEDGE BASE CONTEXT:
-{context}
-
-RECENT CONVERSATION HISTORY:
-{history_context}
-
-USER QUESTION: {query}
-
-Based on the knowledge base context and your expertise, provide a helpful, accurate, and practical response. 
+        builder = PromptBuilder("RAGChatSystem")
+        builder.add(system_role)
+        # Lowest-ranked chunks go first if the prompt is over budget, then older history
+        builder.add_flexible(context, heading="KNOWLEDGE BASE CONTEXT:", trim_order=0,
+                             empty="No relevant information found in the knowledge base.")
+        builder.add_flexible(self._get_chat_history_context(builder.budget // 4),
+                             heading="RECENT CONVERSATION HISTORY:", trim_order=1, empty="No previous conversation.")
+        builder.add(f"USER QUESTION: {query}")
+        builder.add("""Based on the knowledge base context and your expertise, provide a helpful, accurate, and practical response. 
 If the knowledge base doesn't contain specific information, use your general knowledge about Indian microfinance 
 and financial services. Always be honest if you're not certain about specific details.
 
@@ -117,33 +146,18 @@ Guidelines:
 - Be encouraging and supportive
 - If suggesting financial products, mention the need to verify current terms and conditions
 
-Response:"""
+Response:""")
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=800,
-                temperature=0.7
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            return f"I'm experiencing technical difficulties. Please try again in a moment. ({str(e)})"
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": builder.build()}],
+            "max_tokens": 800,
+            "temperature": 0.7
+        }
     
-    def _get_chat_history_context(self) -> str:
-        """Get formatted chat history for context"""
-        if not self.chat_history:
-            return "No previous conversation."
-        
-        recent_history = self.chat_history[-3:]  # Last 3 exchanges
-        history_text = ""
-        
-        for exchange in recent_history:
-            history_text += f"User: {exchange['query']}\nAssistant: {exchange['response'][:200]}...\n\n"
-        
-        return history_text.strip()
+    def _get_chat_history_context(self, max_tokens: int = 250) -> str:
+        """Recent exchanges that fit in max_tokens, the latest answer kept longest"""
+        return truncate_history(self.chat_history, max_tokens)
     
     def _update_chat_history(self, query: str, response: str):
         """Update chat history with new exchange"""
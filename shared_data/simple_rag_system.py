@@ -6,11 +6,15 @@ Fallback implementation when full vector database is not available
 import os
 import json
 import re
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Iterator
 from datetime import datetime
-from groq import Groq
 from dotenv import load_dotenv
 
+try:
+    from shared_data.llm_gateway import get_llm_client
+except ImportError:
+    from llm_gateway import get_llm_client
+
 # Try to import PDF processing
 try:
     import PyPDF2
@@ -33,7 +37,7 @@ class SimpleRAGSystem:
         # Initialize Groq client
         self.groq_api_key = os.getenv('GROQ_API_KEY')
         if self.groq_api_key:
-            self.client = Groq(api_key=self.groq_api_key)
+            self.client = get_llm_client("SimpleRAGSystem", self.groq_api_key, priority="interactive")
             self.model = os.getenv('MODEL_NAME', "meta-llama/llama-4-maverick-17b-128e-instruct")
         else:
             self.client = None
@@ -231,6 +235,33 @@ class SimpleRAGSystem:
         except Exception as e:
             return f"I apologize, but I'm having trouble processing your question. Please try again. Error: {str(e)}"
     
+    def stream_response(self, user_query: str, user_type: str = "borrower") -> Iterator[str]:
+        """get_response as a stream: yields pieces of the response as they are generated"""
+        search_results = self.search_knowledge_base(user_query)
+        context = self._build_context(search_results)
+        
+        pieces = []
+        if self.client:
+            try:
+                for delta in self.client.stream_text(**self._response_request(user_query, context, user_type)):
+                    # Like get_response, skip leading whitespace
+                    if not pieces:
+                        delta = delta.lstrip()
+                    if delta:
+                        pieces.append(delta)
+                        yield delta
+            except Exception as e:
+                print(f"Error streaming response: {e}")
+                if pieces:
+                    return
+        
+        if not pieces:
+            fallback = self._generate_fallback_response(user_query, search_results, user_type)
+            pieces.append(fallback)
+            yield fallback
+        
+        self._update_chat_history(user_query, "".join(pieces).strip())
+    
     def _build_context(self, search_results: List[Dict]) -> str:
         """Build context from search results"""
         if not search_results:
@@ -244,6 +275,14 @@ class SimpleRAGSystem:
     
     def _generate_ai_response(self, query: str, context: str, user_type: str) -> str:
         """Generate AI response using context"""
+        try:
+            response = self.client.chat.completions.create(**self._response_request(query, context, user_type))
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            return self._generate_fallback_response(query, [], user_type)
+    
+    def _response_request(self, query: str, context: str, user_type: str) -> Dict:
+        """Chat completion arguments for a question with its knowledge base context"""
         if user_type == "borrower":
             system_role = """You are a helpful financial advisor for microfinance borrowers in India. 
             Provide clear, practical advice in simple language about loans, savings, and financial planning."""
@@ -264,16 +303,12 @@ Keep it clear and actionable.
 
 Response:"""
         
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=600,
-                temperature=0.7
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            return self._generate_fallback_response(query, [], user_type)
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 600,
+            "temperature": 0.7
+        }
     
     def _generate_fallback_response(self, query: str, search_results: List[Dict], user_type: str) -> str:
         """Generate fallback response when AI is not available"""
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test script for lender recommendations
+Checks that the batch recommender ranks the same top lenders as recommend_lenders
+for every borrower, and that ranking ties are broken deterministically
+"""
+
+import os
+import sys
+
+import numpy as np
+
+# Add paths
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(os.path.dirname(os.path.abspath(__file__)))  # the agent reads the register from the repo root
+os.environ.setdefault('GROQ_API_KEY', 'test-key')  # no LLM call is made by these checks
+
+from borrower_platform.agents.lender_recommendation_agent import LenderRecommendationAgent
+
+BORROWERS = [
+    {'village_name': 'Kavali', 'district': 'Nellore', 'state': 'Andhra Pradesh'},
+    {'city': 'Bangalore', 'pincode': '560001'},
+    {'village_name': 'Tiptur', 'district': 'Tumkur', 'state': 'Karnataka'},
+    {'district': 'Mysore', 'pincode': '570001'},
+    {'city': 'Chennai', 'state': 'Tamil Nadu'},
+    {'district': 'Guntur'},
+    {'city': 'Hyderabad', 'state': 'Telangana', 'pincode': '500001'},
+]
+
+LOAN_REQUESTS = [
+    {'type': 'personal', 'amount': 50000},
+    {'type': 'agriculture', 'amount': 150000},
+    {'type': 'micro_business', 'amount': 25000},
+    {'type': 'gold', 'amount': 5000000},
+]
+
+_agent = None
+
+
+def get_agent() -> LenderRecommendationAgent:
+    global _agent
+    if _agent is None:
+        _agent = LenderRecommendationAgent()
+    return _agent
+
+
+def lender_ids(result, k=10):
+    return [lender['lender_id'] for lender in result['recommendations'][:k]]
+
+
+def test_batch_matches_single():
+    """recommend_lenders_batch returns the same top 10 as recommend_lenders"""
+    agent = get_agent()
+    mismatches = []
+    for loan_request in LOAN_REQUESTS:
+        batch = agent.recommend_lenders_batch(BORROWERS, loan_request, top_k=10)
+        for borrower, batch_result in zip(BORROWERS, batch):
+            single = agent.recommend_lenders(borrower, loan_request)
+            if lender_ids(single) != lender_ids(batch_result):
+                mismatches.append((loan_request['type'], borrower))
+    assert not mismatches, f"batch and single rankings differ for {mismatches}"
+
+
+def test_rank_ties_use_lender_row():
+    """Lenders tied on distance and score are ordered by lender row, in any input order"""
+    rows = np.array([42, 7, 19, 3, 25])
+    distances = np.array([1.0, 1.0, 1.002, 0.5, 1.0])
+    scores = np.array([80, 80, 80, 60, 90])
+    expected = [3, 25, 7, 19, 42]
+
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        shuffle = rng.permutation(len(rows))
+        for k in (None, 2, 3):
+            order = LenderRecommendationAgent._rank_lenders(rows[shuffle], distances[shuffle], scores[shuffle], k)
+            assert rows[shuffle][order].tolist() == expected[:k]
+
+
+def main():
+    """Run all lender recommendation checks"""
+    print("🏦 LENDER RECOMMENDATION TESTS")
+    print("=" * 40)
+    tests = [
+        test_rank_ties_use_lender_row,
+        test_batch_matches_single,
+    ]
+    failed = 0
+    for test in tests:
+        print(f"\n🔍 {test.__doc__}")
+        try:
+            test()
+            print("✅ Passed")
+        except Exception as e:
+            failed += 1
+            print(f"❌ Failed: {e}")
+    print("\n" + "=" * 40)
+    print(f"{len(tests) - failed}/{len(tests)} checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Test script for the LLM request scheduler
+Drives the scheduling core with a fake clock and checks priority order, queueing
+deadlines, the batch reserve of the rate budget and provider pauses
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from shared_data.llm_gateway import _Schedule
+from shared_data.llm_scheduler import (DROPPED, QUEUED, RUNNING, LLMDeadlineExceeded, LLMScheduler)
+
+
+class FakeClock:
+    """Monotonic time that only moves when told to"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def test_priority_order():
+    """Queued requests start interactive first, then default, then batch, each in arrival order"""
+    scheduler = LLMScheduler(max_concurrency=1, clock=FakeClock())
+    running = scheduler.submit("batch")
+    assert running.state == RUNNING
+
+    queued = [scheduler.submit(priority) for priority in
+              ("batch", "default", "interactive", "batch", "interactive", "default")]
+    assert all(ticket.state == QUEUED for ticket in queued)
+
+    order = []
+    for _ in queued:
+        scheduler.release(running)
+        (running,) = [ticket for ticket in queued if ticket.state == RUNNING]
+        order.append(queued.index(running))
+    assert order == [2, 4, 1, 5, 0, 3], order
+
+
+def test_deadline_drops_queued_request():
+    """A request still queued at its deadline is dropped; one without a deadline keeps waiting"""
+    clock = FakeClock()
+    scheduler = LLMScheduler(max_concurrency=1, clock=clock)
+    running = scheduler.submit("default")
+    interactive = scheduler.submit("interactive", deadline=scheduler.deadline_for("interactive"))
+    batch = scheduler.submit("batch", deadline=scheduler.deadline_for("batch"))
+    assert interactive.deadline == clock() + 30.0
+    assert batch.deadline is None
+    assert scheduler.next_change() == 30.0
+
+    clock.advance(29.9)
+    scheduler.dispatch()
+    assert interactive.state == QUEUED
+
+    clock.advance(0.1)
+    scheduler.dispatch()
+    assert interactive.state == DROPPED
+    assert scheduler.metrics()["classes"]["interactive"]["dropped"] == 1
+
+    scheduler.release(running)
+    assert batch.state == RUNNING
+
+
+def test_acquire_raises_past_deadline():
+    """acquire() raises LLMDeadlineExceeded and frees its place when the deadline has passed"""
+    clock = FakeClock()
+    scheduler = LLMScheduler(max_concurrency=1, clock=clock)
+    try:
+        scheduler.acquire("interactive", deadline=clock())
+    except LLMDeadlineExceeded:
+        pass
+    else:
+        raise AssertionError("acquire() admitted a request past its deadline")
+    assert scheduler.metrics()["classes"]["interactive"]["queued"] == 0
+    assert scheduler.submit("default").state == RUNNING
+
+
+def test_batch_leaves_reserve_for_interactive():
+    """Batch work stops at three quarters of the request budget; interactive may use the rest"""
+    clock = FakeClock()
+    scheduler = LLMScheduler(max_concurrency=10, requests_per_minute=4, clock=clock)
+    batch = [scheduler.submit("batch") for _ in range(4)]
+    assert [ticket.state for ticket in batch] == [RUNNING, RUNNING, RUNNING, QUEUED]
+
+    interactive = scheduler.submit("interactive")
+    assert interactive.state == RUNNING
+
+    # One request refills every 15 s, but batch needs the reserve back as well
+    clock.advance(15)
+    scheduler.dispatch()
+    assert batch[3].state == QUEUED
+    clock.advance(15)
+    scheduler.dispatch()
+    assert batch[3].state == RUNNING
+
+
+def test_waiting_head_blocks_lower_priorities():
+    """While the head of the queue waits for budget, nothing behind it starts"""
+    clock = FakeClock()
+    scheduler = LLMScheduler(max_concurrency=10, tokens_per_minute=1000, clock=clock)
+    big = scheduler.submit("default", tokens=900)
+    assert big.state == RUNNING
+    waiting = scheduler.submit("interactive", tokens=500)
+    small = scheduler.submit("batch", tokens=10)
+    assert waiting.state == QUEUED and small.state == QUEUED
+
+    clock.advance(scheduler.next_change())
+    scheduler.dispatch()
+    assert waiting.state == RUNNING
+    assert small.state == QUEUED
+
+
+def test_pause_holds_the_queue():
+    """pause() starts nothing until it ends, but deadlines still drop requests meanwhile"""
+    clock = FakeClock()
+    scheduler = LLMScheduler(max_concurrency=10, clock=clock)
+    scheduler.pause(10)
+    short = scheduler.submit("interactive", deadline=clock() + 5)
+    later = scheduler.submit("default")
+    assert short.state == QUEUED and later.state == QUEUED
+    assert scheduler.next_change() == 5
+
+    clock.advance(5)
+    scheduler.dispatch()
+    assert short.state == DROPPED and later.state == QUEUED
+
+    clock.advance(5)
+    scheduler.dispatch()
+    assert later.state == RUNNING
+
+
+def test_promote_raises_priority_and_deadline():
+    """promote() moves a queued request up a class and extends its deadline, never the reverse"""
+    clock = FakeClock()
+    scheduler = LLMScheduler(max_concurrency=1, clock=clock)
+    running = scheduler.submit("default")
+    default = scheduler.submit("default")
+    batch = scheduler.submit("batch", deadline=scheduler.deadline_for("batch"))
+    interactive = scheduler.submit("interactive", deadline=scheduler.deadline_for("interactive"))
+
+    scheduler.promote(batch, "interactive", clock() + 30.0)
+    assert batch.priority == "interactive" and batch.deadline is None
+    scheduler.promote(interactive, "batch", None)
+    assert interactive.priority == "interactive" and interactive.deadline is None
+
+    # Promoted, the batch request keeps its place in arrival order
+    clock.advance(60)
+    scheduler.release(running)
+    assert batch.state == RUNNING and default.state == QUEUED
+    scheduler.release(batch)
+    assert interactive.state == RUNNING and default.state == QUEUED
+
+    # A request that already started keeps its class
+    scheduler.promote(batch, "batch", None)
+    assert batch.priority == "interactive"
+
+
+def test_joining_caller_raises_shared_call():
+    """An interactive caller joining a queued batch call lifts it ahead of default work"""
+    clock = FakeClock()
+    scheduler = LLMScheduler(max_concurrency=1, clock=clock)
+    running = scheduler.submit("default")
+    default = scheduler.submit("default")
+
+    schedule = _Schedule(scheduler, "batch", scheduler.deadline_for("batch"))
+    shared = scheduler.submit(schedule.priority, deadline=schedule.until)
+    schedule.attach(shared)
+    schedule.join("interactive", scheduler.deadline_for("interactive"))
+    assert shared.priority == "interactive" and shared.deadline is None
+
+    clock.advance(60)
+    scheduler.release(running)
+    assert shared.state == RUNNING and default.state == QUEUED
+
+    # A retry queues again under the joined terms
+    scheduler.release(shared)
+    retry = scheduler.submit("batch", deadline=clock() + 1.0)
+    schedule.attach(retry)
+    assert retry.priority == "interactive" and retry.deadline is None
+
+
+def main():
+    """Run all scheduler checks"""
+    print("⏱️ LLM SCHEDULER TESTS")
+    print("=" * 40)
+    tests = [
+        test_priority_order,
+        test_deadline_drops_queued_request,
+        test_acquire_raises_past_deadline,
+        test_batch_leaves_reserve_for_interactive,
+        test_waiting_head_blocks_lower_priorities,
+        test_pause_holds_the_queue,
+        test_promote_raises_priority_and_deadline,
+        test_joining_caller_raises_shared_call,
+    ]
+    failed = 0
+    for test in tests:
+        print(f"\n🔍 {test.__doc__}")
+        try:
+            test()
+            print("✅ Passed")
+        except Exception as e:
+            failed += 1
+            print(f"❌ Failed: {e}")
+    print("\n" + "=" * 40)
+    print(f"{len(tests) - failed}/{len(tests)} checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test script for the EMI payment journal
+Crashes a process after journaling payments, tears the last journal record and
+checks that the next start replays every complete payment exactly once
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+
+from shared_data.loan_database import LoanDatabase
+from shared_data.payment_journal import PaymentJournal
+
+# Pays EMIs and dies without running atexit, so nothing is compacted
+CRASH_SCRIPT = """
+import os, sys
+sys.path.insert(0, {root!r})
+from shared_data.loan_database import LoanDatabase
+db = LoanDatabase({data_dir!r}, 'sqlite')
+for _ in range({payments!r}):
+    assert db.pay_emi({loan_id!r})['success']
+db.payment_journal.sync()
+os._exit(0)
+"""
+
+TORN_RECORD = b'{"event":"emi_payment","loan_id":"'
+
+
+def test_read_events_skips_torn_record():
+    """A torn trailing record is ignored and the tail offset stops before it"""
+    path = os.path.join(tempfile.mkdtemp(prefix="journal_test_"), "emi_payments.journal")
+    journal = PaymentJournal(path)
+    journal.append([{'event': 'emi_payment', 'n': 1}, {'event': 'emi_payment', 'n': 2}])
+    complete = journal.size()
+    with open(path, 'ab') as f:
+        f.write(TORN_RECORD)
+
+    events, offset = journal.read_events_from(0)
+    assert [event['n'] for event in events] == [1, 2]
+    assert offset == complete
+    journal.close()
+
+
+def test_append_after_torn_record():
+    """An event appended after a torn record starts its own line and is read back"""
+    path = os.path.join(tempfile.mkdtemp(prefix="journal_test_"), "emi_payments.journal")
+    with open(path, 'wb') as f:
+        f.write(TORN_RECORD)
+    journal = PaymentJournal(path)
+    journal.append([{'event': 'emi_payment', 'n': 1}])
+
+    events, offset = journal.read_events_from(0)
+    assert [event['n'] for event in events] == [1]
+    assert offset == journal.size()
+    journal.close()
+
+
+def create_approved_loan(data_dir: str) -> str:
+    db = LoanDatabase(data_dir, 'sqlite')
+    db.register_mfi({'mfi_id': 'MFI_1', 'basic_details': {'mfi_name': 'Test MFI'}})
+    loan_id = db.submit_loan_application({'phone_number': '9000000001'}, 'MFI_1',
+                                         {'amount': 12000, 'tenure_months': 12})
+    assert db.approve_loan(loan_id, {'interest_rate': 12.0, 'disbursement_date': '2026-01-01'})
+    db.close()
+    return loan_id
+
+
+def test_payment_after_torn_record_survives_compaction():
+    """A payment made after another writer left a torn record is persisted by compaction"""
+    data_dir = tempfile.mkdtemp(prefix="journal_test_")
+    loan_id = create_approved_loan(data_dir)
+
+    db = LoanDatabase(data_dir, 'sqlite')
+    with open(os.path.join(data_dir, "emi_payments.journal"), 'ab') as f:
+        f.write(TORN_RECORD)
+    assert db.pay_emi(loan_id)['success']
+    assert db.compact_payment_journal() == 1
+    db.close()
+
+    os.remove(os.path.join(data_dir, "loan_database.snapshot"))
+    db = LoanDatabase(data_dir, 'sqlite')
+    payments = list(db.emi_tracking[loan_id]['payments'])
+    assert len(payments) == 1, f"expected 1 persisted payment, found {len(payments)}"
+    db.close()
+
+
+def test_replay_after_crash_with_torn_record():
+    """Payments journaled before a crash are recovered on the next start"""
+    data_dir = tempfile.mkdtemp(prefix="journal_test_")
+    loan_id = create_approved_loan(data_dir)
+
+    env = {k: v for k, v in os.environ.items() if k not in ('LOAN_DB_PATH', 'LOAN_DB_BACKEND')}
+    result = subprocess.run(
+        [sys.executable, "-c", CRASH_SCRIPT.format(root=ROOT, data_dir=data_dir, loan_id=loan_id, payments=3)],
+        capture_output=True, text=True, env=env
+    )
+    assert result.returncode == 0, result.stderr
+    journal_path = os.path.join(data_dir, "emi_payments.journal")
+    with open(journal_path, 'ab') as f:
+        f.write(TORN_RECORD)
+
+    db = LoanDatabase(data_dir, 'sqlite')
+    loan = db.emi_tracking[loan_id]
+    payments = list(loan['payments'])
+    assert len(payments) == 3, f"expected 3 replayed payments, found {len(payments)}"
+    assert len({p['payment_id'] for p in payments}) == 3
+    assert loan['outstanding_balance'] == payments[-1]['outstanding_after']
+    assert os.path.getsize(journal_path) == 0, "journal was not compacted after replay"
+    db.close()
+
+    # The replayed payments were persisted: a start without the snapshot sees them too
+    os.remove(os.path.join(data_dir, "loan_database.snapshot"))
+    db = LoanDatabase(data_dir, 'sqlite')
+    assert len(db.emi_tracking[loan_id]['payments']) == 3
+    db.close()
+
+
+def main():
+    """Run all journal checks"""
+    print("🧾 PAYMENT JOURNAL TESTS")
+    print("=" * 40)
+    tests = [
+        test_read_events_skips_torn_record,
+        test_append_after_torn_record,
+        test_payment_after_torn_record_survives_compaction,
+        test_replay_after_crash_with_torn_record,
+    ]
+    failed = 0
+    for test in tests:
+        print(f"\n🔍 {test.__doc__}")
+        try:
+            test()
+            print("✅ Passed")
+        except Exception as e:
+            failed += 1
+            print(f"❌ Failed: {e}")
+    print("\n" + "=" * 40)
+    print(f"{len(tests) - failed}/{len(tests)} checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()